@@ -0,0 +1,61 @@
+# core/asgi.py
+"""ASGI wrapper that can run the job worker inside the web process.
+
+With ``PROCESSING_IN_ASGI`` the server's event loop also runs
+``arun_worker``, so one ASGI process serves requests and keeps many
+extractions in flight without a thread per document. The worker is started
+and cancelled through the ASGI lifespan protocol (``uvicorn --lifespan on``);
+every other scope goes straight to Django, which has no lifespan support of
+its own.
+"""
+import asyncio
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerLifespan:
+    def __init__(self, app):
+        self.app = app
+        self.worker = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'lifespan':
+            return await self.app(scope, receive, send)
+
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if settings.PROCESSING_IN_ASGI:
+                    self.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def start(self):
+        from .tasks import arun_worker
+
+        self.worker = asyncio.create_task(arun_worker())
+        self.worker.add_done_callback(self._worker_done)
+        logger.info("Started the job worker on the ASGI event loop")
+
+    def _worker_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Job worker on the ASGI event loop stopped", exc_info=task.exception())
+
+    async def stop(self):
+        if self.worker is None:
+            return
+        self.worker.cancel()
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # Already logged by _worker_done
+            pass
+        self.worker = None
@@ -0,0 +1,104 @@
+# core/benchmarks/corpus.py
+"""Synthetic case-report PDFs for tests and benchmarks.
+
+``make_pdf`` writes a minimal but valid PDF by hand (Helvetica text, no
+compression), so the corpus needs nothing beyond the standard library and
+pypdf can read its text layer back. ``synthetic_case_report`` builds a
+meningioma case report of a given size whose title, DOI and clinical
+details depend on ``index``, so every document in a corpus hashes
+differently and misses the extraction cache.
+"""
+import random
+
+# name: (pages, padding bytes, has text layer)
+SIZES = {
+    'small': (4, 0, True),
+    'medium': (16, 0, True),
+    'large': (60, 2 * 1024 * 1024, True),
+    'scanned': (8, 1024 * 1024, False),
+}
+
+FILLER = 'The tumour was examined by the neurosurgical team and findings were recorded in detail.'
+LOCATIONS = ['parasagittal', 'falcine', 'sphenoid wing', 'olfactory groove', 'thoracic spine', 'convexity']
+SUBTYPES = ['meningothelial', 'fibrous', 'transitional', 'psammomatous', 'atypical', 'clear cell']
+
+
+def _escape(line):
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def make_pdf(pages, padding=0):
+    """Build a minimal PDF with one Helvetica text line per entry of each page.
+
+    ``padding`` adds an unreferenced binary stream of that many bytes,
+    standing in for embedded images.
+    """
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for lines in pages:
+        stream = 'BT /F1 10 Tf 12 TL 50 780 Td ' + ' '.join(f'({_escape(line)}) Tj T*' for line in lines) + ' ET'
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+        objects.append(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>'
+        )
+        kids.append(f'{len(objects)} 0 R')
+    objects[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f'{number} 0 obj\n{body}\nendobj\n'.encode('latin-1')
+    if padding:
+        offsets.append(len(output))
+        output += f'{len(objects) + 1} 0 obj\n<< /Length {padding} >>\nstream\n'.encode('latin-1')
+        output += random.Random(padding).randbytes(padding)
+        output += b'\nendstream\nendobj\n'
+    count = len(offsets) + 1
+    xref = len(output)
+    output += f'xref\n0 {count}\n0000000000 65535 f \n'.encode('latin-1')
+    output += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode('latin-1')
+    output += f'trailer\n<< /Size {count} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1')
+    return bytes(output)
+
+
+def case_report_pages(index, pages=4):
+    """Text of a case report: title page, case, pathology, discussion and references."""
+    rng = random.Random(index)
+    age = rng.randint(18, 85)
+    sex = rng.choice(['man', 'woman'])
+    location = rng.choice(LOCATIONS)
+    title = [
+        f'{location.capitalize()} meningioma: case report {index}',
+        f'doi: 10.1000/synthetic.{index}',
+        f'Author{index} A, Coauthor B ({rng.randint(1990, 2024)})',
+        'Introduction',
+    ] + [f'Meningiomas are common tumours of the meninges. {FILLER}'] * 4
+    case = [
+        'Case presentation',
+        f'A {age}-year-old {sex} presented with headaches for {rng.randint(1, 36)} months.',
+        f'Imaging showed a {location} mass; a {rng.choice(["total", "subtotal"])} resection was performed.',
+    ] + [FILLER] * 4
+    pathology = [
+        'Table 1 Histopathology',
+        f'WHO Grade {rng.choice(["I", "II", "III"])} {rng.choice(SUBTYPES)} meningioma',
+        f'Follow-up of {rng.randint(3, 120)} months without recurrence.',
+    ]
+    discussion = ['Discussion'] + [f'Prior series differ. {FILLER}'] * 6
+    references = ['References'] + [f'{n}. Someone {chr(65 + n % 26)}. Meningioma review. {2000 + n}.' for n in range(1, 7)]
+
+    body = [title, case, pathology]
+    while len(body) < pages - 1:
+        body.append(discussion)
+    return (body + [references])[:max(pages, 1)]
+
+
+def synthetic_case_report(index, size='small'):
+    """PDF bytes for case report ``index`` at one of the ``SIZES``."""
+    pages, padding, has_text = SIZES[size]
+    content = case_report_pages(index, pages) if has_text else [[] for _ in range(pages)]
+    if not has_text:
+        # Keep scanned documents distinct so they do not share a cache entry
+        padding += index % 1024
+    return make_pdf(content, padding=padding)
@@ -0,0 +1,197 @@
+# core/benchmarks/pipeline.py
+"""End-to-end benchmark of the upload -> extract -> store -> render pipeline.
+
+``run_pipeline`` uploads a synthetic corpus through the real form view,
+drains the job queue with an in-process worker against whatever LLM
+backend is configured (normally the stub with simulated latency and
+errors), then times the results page and JSON API. It works on the
+current database; ``manage.py benchmark_pipeline`` runs it against a
+throwaway test database and prints the report.
+"""
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client
+from django.urls import reverse
+
+from .. import tasks
+from ..models import ExtractedCase, PDFDocument
+from ..services.metrics import STAGE_SECONDS
+from .corpus import SIZES, synthetic_case_report
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of ``values`` (``q`` in 0-100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(values):
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values),
+    }
+
+
+def max_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def build_corpus(documents, sizes, seed=0):
+    """``[(name, size, bytes)]`` with the sizes assigned round-robin."""
+    corpus = []
+    for i in range(documents):
+        size = sizes[i % len(sizes)]
+        corpus.append((f'case{seed + i:05d}-{size}.pdf', size, synthetic_case_report(seed + i, size)))
+    return corpus
+
+
+class _ExtractionTimer:
+    """Wraps ``tasks.process_pdf_with_gemini`` to time every attempt per document."""
+
+    def __init__(self):
+        self.started = {}
+        self.finished = {}
+        self.attempts = 0
+        self.errors = 0
+        self.original = None
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        self.original = tasks.process_pdf_with_gemini
+
+        def timed_extract(pdf_doc, *args, **kwargs):
+            # Runs on the pool threads
+            with self.lock:
+                self.started.setdefault(pdf_doc.id, time.perf_counter())
+                self.attempts += 1
+            result = {}
+            try:
+                result = self.original(pdf_doc, *args, **kwargs)
+                return result
+            finally:
+                with self.lock:
+                    self.finished[pdf_doc.id] = time.perf_counter()
+                    self.errors += not result.get('success')
+
+        tasks.process_pdf_with_gemini = timed_extract
+        return self
+
+    def __exit__(self, *exc_info):
+        tasks.process_pdf_with_gemini = self.original
+
+    def latencies(self):
+        # First attempt to final result, so retries and backoff are included
+        return [self.finished[doc_id] - started for doc_id, started in self.started.items()]
+
+
+def stage_totals():
+    return {key[0]: value for key, value in STAGE_SECONDS.totals().items()}
+
+
+def run_pipeline(documents=20, sizes=('small',), jobs=1, workers=None, renders=20, seed=0, trace_memory=False):
+    """Run the pipeline once and return a report dict."""
+    sizes = list(sizes)
+    unknown = set(sizes) - set(SIZES)
+    if unknown:
+        raise ValueError(f"Unknown corpus sizes: {', '.join(sorted(unknown))}")
+
+    client = Client()
+    stages_before = stage_totals()
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        corpus = build_corpus(documents, sizes, seed)
+
+        # Upload, one request per job
+        upload_times, job_ids = [], []
+        for j in range(jobs):
+            files = [SimpleUploadedFile(name, data, 'application/pdf') for name, _, data in corpus[j::jobs]]
+            if not files:
+                continue
+            started = time.perf_counter()
+            response = client.post(reverse('core:home'), {
+                'name': f'benchmark {j + 1}',
+                'pdf_file': files,
+                'max_concurrency': workers or '',
+            })
+            upload_times.append(time.perf_counter() - started)
+            if response.status_code != 202:
+                raise RuntimeError(f"Upload failed with status {response.status_code}: {response.content[:200]!r}")
+            job_ids.append(response.json()['job_id'])
+
+        # Extract and store
+        started = time.perf_counter()
+        with _ExtractionTimer() as timer:
+            tasks.run_worker(worker_id='benchmark', once=True)
+        extract_seconds = time.perf_counter() - started
+
+        statuses = Counter(PDFDocument.objects.filter(job_id__in=job_ids).values_list('status', flat=True))
+        cases = ExtractedCase.objects.filter(job_id__in=job_ids).count()
+
+        # Render
+        home_times, results_times, queries = [], [], {}
+        for i in range(renders):
+            for name, url, times in (
+                ('home', reverse('core:home'), home_times),
+                ('results', reverse('core:job_results', args=[job_ids[i % len(job_ids)]]), results_times),
+            ):
+                started = time.perf_counter()
+                response = client.get(url)
+                times.append(time.perf_counter() - started)
+                queries[name] = int(response.get('X-DB-Queries', 0))
+
+        python_peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+
+    stages = {}
+    for stage, (count, total) in sorted(stage_totals().items()):
+        before_count, before_total = stages_before.get(stage, (0, 0.0))
+        if count > before_count:
+            stages[stage] = {'count': count - before_count, 'seconds': total - before_total}
+
+    completed = statuses.get('completed', 0)
+    return {
+        'corpus': {
+            'documents': len(corpus),
+            'sizes': dict(Counter(size for _, size, _ in corpus)),
+            'bytes': sum(len(data) for _, _, data in corpus),
+        },
+        'upload': {'jobs': len(job_ids), 'latency': summarize(upload_times)},
+        'extract': {
+            'seconds': extract_seconds,
+            'completed': completed,
+            'failed': statuses.get('failed', 0),
+            'cases': cases,
+            'documents_per_second': completed / extract_seconds if extract_seconds else 0.0,
+            'cases_per_second': cases / extract_seconds if extract_seconds else 0.0,
+            'attempts': timer.attempts,
+            'failed_attempts': timer.errors,
+            'latency': summarize(timer.latencies()),
+        },
+        'render': {
+            'home': summarize(home_times),
+            'results': summarize(results_times),
+            'queries': queries,
+        },
+        'memory': {'max_rss_bytes': max_rss_bytes(), 'python_peak_bytes': python_peak},
+        'stages': stages,
+    }
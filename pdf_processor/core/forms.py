@@ -1,16 +1,41 @@
 # core/forms.py
 from django import forms
 from .models import ProcessingJob
+from .services.prompt_registry import DEFAULT_TEMPLATE, get_template, job_template, template_choices
+
+
+class MultipleFileInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
+
+
+class MultipleFileField(forms.FileField):
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', MultipleFileInput())
+        super().__init__(*args, **kwargs)
+
+    def clean(self, data, initial=None):
+        single_file_clean = super().clean
+        if isinstance(data, (list, tuple)):
+            return [single_file_clean(d, initial) for d in data]
+        return [single_file_clean(data, initial)]
+
 
 class ProcessingForm(forms.ModelForm):
-    pdf_file = forms.FileField(
-        widget=forms.ClearableFileInput(attrs={'accept': '.pdf'}),
-        help_text='Select a PDF file'
+    pdf_file = MultipleFileField(
+        widget=MultipleFileInput(attrs={'accept': '.pdf'}),
+        help_text='Select one or more PDF files'
+    )
+    prompt_template = forms.ChoiceField(
+        choices=template_choices,
+        initial=DEFAULT_TEMPLATE,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        help_text='Fields to extract; a prompt entered below replaces the template text'
     )
-    
+
     class Meta:
         model = ProcessingJob
-        fields = ['name', 'prompt']
+        fields = ['name', 'prompt_template', 'prompt', 'max_concurrency']
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -20,12 +45,28 @@ class ProcessingForm(forms.ModelForm):
                 'class': 'form-control',
                 'rows': 5,
                 'placeholder': 'Enter your prompt here'
+            }),
+            'max_concurrency': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'min': 1,
+                'placeholder': 'Parallel extractions (leave blank for the default)'
             })
         }
 
     def clean_pdf_file(self):
-        file = self.cleaned_data['pdf_file']
-        if not file.name.endswith('.pdf'):
-            raise forms.ValidationError('Only PDF files are allowed.')
-        return file
-    
+        files = self.cleaned_data['pdf_file']
+        for file in files:
+            if not file.name.endswith('.pdf'):
+                raise forms.ValidationError(f'Only PDF files are allowed ({file.name}).')
+        return files
+
+    def clean_prompt_template(self):
+        return self.cleaned_data['prompt_template'] or DEFAULT_TEMPLATE
+
+    def save(self, commit=True):
+        # Pin the template version and record the columns it extracts
+        job = self.instance
+        job.prompt_version = get_template(job.prompt_template).version
+        job.columns = job_template(job).columns
+        return super().save(commit)
+
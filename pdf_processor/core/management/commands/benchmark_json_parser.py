@@ -0,0 +1,71 @@
+# core/management/commands/benchmark_json_parser.py
+import json
+import re
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from core.services.json_repair import parse_json
+
+CORPUS = Path(__file__).resolve().parents[2] / 'benchmarks' / 'malformed_responses.json'
+
+
+def legacy_parse(text):
+    """The previous pipeline: find/rfind on braces, regex clean-up, json.loads."""
+    text = text.replace('```json\n', '').replace('\n```', '')
+    start_idx = text.find('{')
+    end_idx = text.rfind('}') + 1
+    if start_idx < 0 or end_idx <= start_idx:
+        raise ValueError("No valid JSON found in response")
+    json_str = text[start_idx:end_idx]
+    json_str = re.sub(r',(\s*[}\]])', r'\1', json_str)
+    json_str = re.sub(r'//.*?\n|/\*.*?\*/', '', json_str, flags=re.S)
+    json_str = re.sub(r'([{,]\s*)(\w+)(\s*:)', r'\1"\2"\3', json_str)
+    json_str = json_str.replace('...', '')
+    return json.loads(json_str)
+
+
+class Command(BaseCommand):
+    help = 'Compare the JSON repair parser with the old extraction on a corpus of malformed replies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', default=str(CORPUS))
+        parser.add_argument('--repeat', type=int, default=200, help='Parses per reply when timing')
+
+    def time_parser(self, parse, entries, repeat):
+        recovered, elapsed = 0, 0.0
+        for entry in entries:
+            try:
+                recovered += parse(entry['text']) == entry['expected']
+            except ValueError:
+                pass
+            started = time.perf_counter()
+            for _ in range(repeat):
+                try:
+                    parse(entry['text'])
+                except ValueError:
+                    pass
+            elapsed += time.perf_counter() - started
+        return recovered, elapsed / (repeat * len(entries)) * 1e6
+
+    def handle(self, *args, **options):
+        with open(options['corpus'], encoding='utf-8') as f:
+            entries = json.load(f)
+
+        parsers = [
+            ('legacy', legacy_parse),
+            ('repair', lambda text: parse_json(text)[0]),
+        ]
+        self.stdout.write(f"{len(entries)} replies, {sum(len(e['text']) for e in entries)} characters")
+        for name, parse in parsers:
+            recovered, per_parse = self.time_parser(parse, entries, options['repeat'])
+            self.stdout.write(f"{name:8} recovered {recovered}/{len(entries)}  {per_parse:8.1f} us/reply")
+
+        for entry in entries:
+            try:
+                ok = legacy_parse(entry['text']) == entry['expected']
+            except ValueError:
+                ok = False
+            if not ok:
+                self.stdout.write(f"  legacy fails: {entry['name']} ({entry['description']})")
@@ -0,0 +1,117 @@
+# core/management/commands/benchmark_pipeline.py
+import json
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from core.benchmarks.corpus import SIZES
+from core.benchmarks.pipeline import run_pipeline
+from core.services.llm_service import reset_llm_client
+
+
+def _ms(value):
+    return f'{value * 1000:8.1f}' if value is not None else '       -'
+
+
+def _mb(value):
+    return f'{value / (1024 * 1024):.1f} MB' if value is not None else '-'
+
+
+class Command(BaseCommand):
+    help = ('Benchmark upload, extraction, storage and rendering on a synthetic corpus '
+            'against a throwaway database and a simulated LLM')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=20)
+        parser.add_argument('--sizes', default='small,medium',
+                            help=f"Comma-separated corpus sizes: {', '.join(SIZES)}")
+        parser.add_argument('--jobs', type=int, default=1, help='Split the corpus over this many uploads')
+        parser.add_argument('--workers', type=int, default=None, help='Extraction concurrency per job')
+        parser.add_argument('--backend', default='stub', choices=['stub', 'http'],
+                            help="'http' talks to a running run_llm_stub, which has its own latency options")
+        parser.add_argument('--latency', type=float, default=0.5, help='Stub seconds per LLM call')
+        parser.add_argument('--jitter', type=float, default=0.3, help='Stub latency spread as a fraction')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of stub calls failing with 503')
+        parser.add_argument('--retry-delay', type=float, default=0.1, help='Base retry backoff in seconds')
+        parser.add_argument('--rpm', type=int, default=0, help='Requests-per-minute quota (0 disables)')
+        parser.add_argument('--renders', type=int, default=20, help='Requests per page when timing rendering')
+        parser.add_argument('--trace-memory', action='store_true',
+                            help='Also report the Python heap peak (slows the run down)')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        sizes = [size.strip() for size in options['sizes'].split(',') if size.strip()]
+        if not sizes or set(sizes) - set(SIZES):
+            raise CommandError(f"--sizes must be a comma-separated subset of {', '.join(SIZES)}")
+
+        media_root = tempfile.mkdtemp(prefix='pdf-benchmark-')
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(
+                MEDIA_ROOT=media_root,
+                LLM_BACKEND=options['backend'],
+                LLM_STUB_LATENCY=options['latency'],
+                LLM_STUB_JITTER=options['jitter'],
+                LLM_STUB_ERROR_RATE=options['error_rate'],
+                LLM_RETRY_BASE_DELAY=options['retry_delay'],
+                LLM_REQUESTS_PER_MINUTE=options['rpm'],
+                LLM_TOKENS_PER_MINUTE=0,
+            ):
+                reset_llm_client()
+                report = run_pipeline(
+                    documents=options['documents'],
+                    sizes=sizes,
+                    jobs=options['jobs'],
+                    workers=options['workers'],
+                    renders=options['renders'],
+                    trace_memory=options['trace_memory'],
+                )
+        finally:
+            reset_llm_client()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+    def print_report(self, report):
+        corpus, extract, render = report['corpus'], report['extract'], report['render']
+        sizes = ', '.join(f'{count} {size}' for size, count in corpus['sizes'].items())
+        self.stdout.write(f"Corpus   {corpus['documents']} documents ({sizes}), {_mb(corpus['bytes'])}")
+        self.stdout.write(
+            f"Extract  {extract['completed']} completed, {extract['failed']} failed, {extract['cases']} cases "
+            f"in {extract['seconds']:.2f}s: {extract['documents_per_second']:.2f} docs/s, "
+            f"{extract['cases_per_second']:.2f} cases/s "
+            f"({extract['attempts']} attempts, {extract['failed_attempts']} failed)"
+        )
+
+        self.stdout.write(f"\n{'latency (ms)':22} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+        rows = [
+            ('upload', report['upload']['latency']),
+            ('document', extract['latency']),
+            (f"home ({render['queries'].get('home', 0)} queries)", render['home']),
+            (f"results ({render['queries'].get('results', 0)} queries)", render['results']),
+        ]
+        for name, summary in rows:
+            self.stdout.write(
+                f"{name:22} {_ms(summary.get('p50'))} {_ms(summary.get('p95'))} "
+                f"{_ms(summary.get('p99'))} {_ms(summary.get('max'))}"
+            )
+
+        self.stdout.write(f"\n{'stage':22} {'count':>8} {'total s':>8} {'mean ms':>8}")
+        for stage, totals in report['stages'].items():
+            self.stdout.write(
+                f"{stage:22} {totals['count']:8d} {totals['seconds']:8.2f} {_ms(totals['seconds'] / totals['count'])}"
+            )
+
+        memory = report['memory']
+        self.stdout.write(
+            f"\nMemory   max RSS {_mb(memory['max_rss_bytes'])}, Python peak {_mb(memory['python_peak_bytes'])}"
+        )
@@ -0,0 +1,33 @@
+# core/management/commands/build_dedupe_index.py
+from django.core.management.base import BaseCommand
+
+from core.models import PDFDocument
+from core.services import dedupe_service
+from core.services.pdf_service import document_pages, document_sha256, store_pages
+from core.services.prompt_registry import job_template
+
+
+class Command(BaseCommand):
+    help = 'Fingerprint completed documents processed before duplicate detection, so new uploads match them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Documents loaded per query')
+
+    def handle(self, *args, **options):
+        documents = (
+            PDFDocument.objects.filter(status='completed', fingerprint__isnull=True)
+            .select_related('job', 'result').order_by('id')
+        )
+        indexed = 0
+        for pdf_doc in documents.iterator(chunk_size=options['batch_size']):
+            document_sha256(pdf_doc)
+            pages = document_pages(pdf_doc)
+            store_pages(pdf_doc, pages)
+            dedupe_service.fingerprint_document(pdf_doc, pages)
+            result = getattr(pdf_doc, 'result', None)
+            if result is not None:
+                dedupe_service.record_identifiers(
+                    pdf_doc, result.result_data.get('case_results', []), job_template(pdf_doc.job)
+                )
+            indexed += 1
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} document(s)'))
@@ -0,0 +1,198 @@
+# core/management/commands/ingest_pdfs.py
+import asyncio
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import ExtractedCase, ProcessingJob
+from core.services.ingest_service import ingest
+from core.services.progress_service import job_summary
+from core.services.prompt_registry import DEFAULT_TEMPLATE, get_template, job_template, latest_templates
+from core.tasks import aprocess_job, default_worker_id, enqueue_job, process_job
+
+
+def _duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return f'{minutes}m{seconds:02d}s' if minutes else f'{seconds}s'
+
+
+class Progress:
+    """One status line, redrawn in place on a terminal and printed every few seconds otherwise."""
+
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self.tty = stdout.isatty()
+        self.interval = 0.2 if self.tty else 10
+        self.shown = 0
+        self.width = 0
+
+    def show(self, describe, force=False):
+        """Write ``describe()`` unless the last line went out less than ``interval`` ago."""
+        now = time.monotonic()
+        if not force and now - self.shown < self.interval:
+            return
+        self.shown = now
+        line = describe()
+        if self.tty:
+            self.stdout.write('\r' + line.ljust(self.width), ending='')
+            self.stdout.flush()
+            self.width = len(line)
+        else:
+            self.stdout.write(line)
+
+    def end(self, describe):
+        self.show(describe, force=True)
+        if self.tty:
+            self.stdout.write('')
+        self.shown = self.width = 0
+
+
+class Command(BaseCommand):
+    help = ('Add the PDFs of directories, glob patterns or ZIP archives to a job and extract them. '
+            'An interrupted run continues with --resume JOB_ID.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='*', help='Directories, glob patterns ("papers/**/*.pdf") or ZIP files')
+        parser.add_argument('--name', default=None, help='Job name (default: after the first source)')
+        parser.add_argument('--template', default=DEFAULT_TEMPLATE,
+                            choices=[template.key for template in latest_templates()],
+                            help='Prompt template to extract with')
+        parser.add_argument('--max-concurrency', type=int, default=None, help='Parallel extractions for the job')
+        parser.add_argument('--resume', type=int, default=None, metavar='JOB_ID',
+                            help='Add only the files the job lacks, then extract its unfinished documents')
+        parser.add_argument('--queue', action='store_true',
+                            help='Queue the job for run_worker instead of extracting here')
+        parser.add_argument('--async', dest='use_async', action='store_true',
+                            help='Run extractions as asyncio tasks instead of a thread pool')
+        parser.add_argument('--json', action='store_true', help='Print the summary report as JSON')
+
+    def handle(self, *args, **options):
+        if not options['sources'] and not options['resume']:
+            raise CommandError('Give at least one source, or --resume a job')
+        job = self.resume_job(options['resume']) if options['resume'] else self.create_job(options)
+        progress = Progress(self.stdout)
+        started = time.monotonic()
+
+        def copied(source, outcome):
+            seen[outcome] += 1
+            progress.show(lambda: f"Job {job.id}: {counts_line(seen)} ({os.path.basename(source)})")
+
+        def counts_line(counts):
+            return f"added {counts['added']}, already present {counts['present']}, not PDFs {counts['skipped']}"
+
+        seen = {'added': 0, 'present': 0, 'skipped': 0}
+        try:
+            files = ingest(job, options['sources'], on_file=copied)
+            if not job.documents.exists():
+                raise ValueError('No PDFs found')
+        except ValueError as e:
+            if not job.documents.exists():
+                job.delete()
+            raise CommandError(str(e))
+        except KeyboardInterrupt:
+            raise CommandError(f"Interrupted; continue with --resume {job.id}")
+        progress.end(lambda: f"Job {job.id}: {counts_line(files)}")
+
+        if options['queue']:
+            enqueue_job(job)
+            self.stdout.write(self.style.SUCCESS(f'Queued job {job.id}; start run_worker to extract it'))
+            return
+
+        ProcessingJob.objects.filter(pk=job.pk).update(
+            status='processing', worker_id=f'ingest:{default_worker_id()}',
+            started_at=timezone.now(), completed_at=None, error_message='', updated_at=timezone.now(),
+        )
+        job.refresh_from_db()
+        extract_started = time.monotonic()
+        at_start = job_summary(job)['processed']
+
+        def extracting():
+            summary = job_summary(job)
+            done = summary['processed'] - at_start
+            rate = done / max(time.monotonic() - extract_started, 1e-9)
+            left = summary['total'] - summary['processed']
+            eta = f', ETA {_duration(left / rate)}' if rate and left else ''
+            return (f"Extracting: {summary['processed']}/{summary['total']} document(s), "
+                    f"{summary['failed']} failed, {rate:.2f} docs/s{eta}")
+
+        def on_result(pdf_doc, result):
+            progress.show(extracting)
+
+        try:
+            if options['use_async']:
+                asyncio.run(aprocess_job(job, on_result=on_result))
+            else:
+                process_job(job, on_result=on_result)
+        except KeyboardInterrupt:
+            ProcessingJob.objects.filter(pk=job.pk).update(status='uploading', worker_id='', started_at=None)
+            raise CommandError(f"Interrupted; continue with --resume {job.id}")
+        progress.end(extracting)
+
+        report = self.report(job, files, time.monotonic() - started)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+    def create_job(self, options):
+        # As ProcessingForm.save: pin the template version and its columns
+        template = get_template(options['template'])
+        job = ProcessingJob(
+            name=options['name'] or f"Ingest of {os.path.basename(options['sources'][0].rstrip('/'))}"[:200],
+            status='uploading',
+            prompt_template=template.key,
+            prompt_version=template.version,
+            max_concurrency=options['max_concurrency'],
+        )
+        job.columns = job_template(job).columns
+        job.save()
+        return job
+
+    def resume_job(self, job_id):
+        job = ProcessingJob.objects.filter(pk=job_id).first()
+        if job is None:
+            raise CommandError(f'Job {job_id} does not exist')
+        # A job a worker is running must not gain documents under its feet
+        if not ProcessingJob.objects.filter(pk=job_id).exclude(status='processing').update(status='uploading'):
+            raise CommandError(f'Job {job_id} is being processed by {job.worker_id or "a worker"}')
+        job.refresh_from_db()
+        return job
+
+    def report(self, job, files, seconds):
+        job.refresh_from_db()
+        summary = job_summary(job)
+        failures = job.documents.filter(status='failed').order_by('id').values_list('source', 'file', 'error_message')
+        return {
+            'job_id': job.id,
+            'name': job.name,
+            'status': job.status,
+            'files': files,
+            'documents': summary['total'],
+            'completed': summary['processed'] - summary['failed'],
+            'failed': summary['failed'],
+            'duplicates': job.documents.filter(duplicate_of__isnull=False).count(),
+            'cases': ExtractedCase.objects.filter(job=job).count(),
+            'seconds': round(seconds, 2),
+            'failures': [{'source': source or name, 'error': error} for source, name, error in failures],
+        }
+
+    def print_report(self, report):
+        files = report['files']
+        self.stdout.write(
+            f"Job {report['job_id']} ({report['name']}): {report['status']} in {_duration(report['seconds'])}"
+        )
+        self.stdout.write(
+            f"Files    {files['added']} added, {files['present']} already in the job, {files['skipped']} not PDFs"
+        )
+        self.stdout.write(
+            f"Results  {report['completed']} of {report['documents']} document(s) completed "
+            f"({report['duplicates']} duplicates of earlier uploads), {report['failed']} failed, "
+            f"{report['cases']} cases"
+        )
+        for failure in report['failures']:
+            self.stdout.write(self.style.ERROR(f"Failed   {failure['source']}: {failure['error']}"))
+        if report['failed']:
+            self.stdout.write(f"Retry the failed documents with --resume {report['job_id']}")
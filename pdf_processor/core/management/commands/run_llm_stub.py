@@ -0,0 +1,133 @@
+# core/management/commands/run_llm_stub.py
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+from core.services.llm_service import UploadedFile, estimate_tokens, stub_response_text
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive between calls
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    files = {}
+    # Simulated quota: more than this many calls per rolling minute get a 429
+    requests_per_minute = 0
+    error_rate = 0.0
+    calls = []
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _over_quota(self):
+        if not self.requests_per_minute:
+            return None
+        with self.lock:
+            now = time.monotonic()
+            self.calls[:] = [t for t in self.calls if now - t < 60]
+            if len(self.calls) >= self.requests_per_minute:
+                return 60 - (now - self.calls[0])
+            self.calls.append(now)
+        return None
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def _deserialize(self, part):
+        if 'text' in part:
+            return part['text']
+        if 'file_uri' in part:
+            name = part['file_uri'].split('://', 1)[-1]
+            return UploadedFile(name, part['file_uri'], part.get('mime_type'))
+        return {'mime_type': part['mime_type'], 'data': base64.b64decode(part['data'])}
+
+    def do_POST(self):
+        if self.path.endswith('/v1/files'):
+            digest = hashlib.sha256(self._read_body()).hexdigest()
+            name = f"files/{digest[:16]}"
+            self.files[name] = self.headers.get('Content-Type')
+            self._send_json(200, {'name': name, 'uri': f"stub://{name}"})
+            return
+
+        if not self.path.endswith('/v1/generate'):
+            self._send_json(404, {'error': 'Not found'})
+            return
+
+        try:
+            request = json.loads(self._read_body())
+            messages = [
+                {'role': message['role'], 'parts': [self._deserialize(part) for part in message['parts']]}
+                for message in request['messages']
+            ]
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {'error': f"Bad request: {str(e)}"})
+            return
+
+        retry_after = self._over_quota()
+        if retry_after is not None:
+            self._send_json(429, {'error': 'Resource exhausted'}, headers={'Retry-After': f"{retry_after:.1f}"})
+            return
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self._send_json(503, {'error': 'Simulated server error'})
+            return
+        model = request.get('model', 'stub')
+        text = stub_response_text(messages, model, request.get('generation_config'))
+        self._send_json(200, {
+            'text': text,
+            'model': model,
+            'prompt_tokens': estimate_tokens(messages),
+            'output_tokens': len(text) // 4,
+        })
+
+    def do_DELETE(self):
+        name = self.path.split('/v1/', 1)[-1]
+        self.files.pop(name, None)
+        self._send_json(200, {})
+
+
+class Command(BaseCommand):
+    help = 'Serve the deterministic stub LLM over HTTP for offline tests and load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before each reply')
+        parser.add_argument('--rpm', type=int, default=0, help='Answer 429 above this many requests per minute')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of calls that fail with 503')
+
+    def handle(self, *args, **options):
+        handler = type('ConfiguredStubHandler', (StubHandler,), {
+            'latency': options['latency'],
+            'requests_per_minute': options['rpm'],
+            'error_rate': options['error_rate'],
+            'files': {},
+            'calls': [],
+        })
+        server = ThreadingHTTPServer((options['host'], options['port']), handler)
+        self.stdout.write(f"Stub LLM listening on http://{options['host']}:{options['port']}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
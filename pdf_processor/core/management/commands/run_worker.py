@@ -0,0 +1,40 @@
+# core/management/commands/run_worker.py
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from core.services.metrics import serve_metrics
+from core.tasks import arun_worker, run_worker
+
+
+class Command(BaseCommand):
+    help = 'Process pending PDF jobs from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--worker-id', default=None, help='Identifier recorded on claimed jobs')
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Seconds to wait between polls when the queue is empty')
+        parser.add_argument('--max-jobs', type=int, default=None, help='Exit after this many jobs')
+        parser.add_argument('--metrics-port', type=int, default=None,
+                            help='Serve Prometheus metrics for this worker on this port')
+        parser.add_argument('--async', dest='use_async', action='store_true',
+                            help='Run extractions as asyncio tasks instead of a thread pool')
+        parser.add_argument('--max-concurrent-jobs', type=int, default=None,
+                            help='Jobs processed at once with --async (default PROCESSING_ASYNC_MAX_JOBS)')
+
+    def handle(self, *args, **options):
+        if options['metrics_port']:
+            serve_metrics(options['metrics_port'])
+            self.stdout.write(f"Serving metrics on port {options['metrics_port']}")
+        worker_options = {
+            'worker_id': options['worker_id'],
+            'once': options['once'],
+            'poll_interval': options['poll_interval'],
+            'max_jobs': options['max_jobs'],
+        }
+        if options['use_async']:
+            processed = asyncio.run(arun_worker(max_concurrent_jobs=options['max_concurrent_jobs'], **worker_options))
+        else:
+            processed = run_worker(**worker_options)
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} job(s)'))
@@ -1,14 +1,30 @@
 # middleware.py
 import json
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connection
 from django.http import JsonResponse
 
+from .services.metrics import REQUEST_QUERIES, REQUEST_SECONDS
+
 class JSONErrorMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        response = self.get_response(request)
-        return response
+        if self.is_async:
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
 
     def process_exception(self, request, exception):
         if request.headers.get('Accept') == 'application/json':
@@ -17,5 +33,59 @@ class JSONErrorMiddleware:
                 'error': str(exception)
             }, status=500)
         return None
-    
 
+
+class MetricsMiddleware:
+    """Record latency and database query count per view.
+
+    The query count is also returned in an ``X-DB-Queries`` header so N+1
+    regressions show up in the browser's network panel.
+
+    Both sync and async capable: under ASGI a sync-only middleware makes
+    Django run the whole chain, async views included, on a worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        queries = [0]
+        started = time.perf_counter()
+        with connection.execute_wrapper(self.query_counter(queries)):
+            response = self.get_response(request)
+        return self.record(request, response, time.perf_counter() - started, queries[0])
+
+    async def __acall__(self, request):
+        queries = [0]
+        count_query = self.query_counter(queries)
+        started = time.perf_counter()
+        # Connections are per thread: the wrapper goes on the one in the
+        # thread the request's sync_to_async database calls run in
+        await sync_to_async(lambda: connection.execute_wrappers.append(count_query))()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(lambda: connection.execute_wrappers.remove(count_query))()
+        return self.record(request, response, time.perf_counter() - started, queries[0])
+
+    @staticmethod
+    def query_counter(queries):
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+        return count_query
+
+    def record(self, request, response, elapsed, queries):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        REQUEST_SECONDS.observe(elapsed, view=view, method=request.method, status=response.status_code)
+        REQUEST_QUERIES.observe(queries, view=view, method=request.method)
+        response['X-DB-Queries'] = str(queries)
+        return response
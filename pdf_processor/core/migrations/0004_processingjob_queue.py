@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_processingjob_prompt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='error_message',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='worker_id',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='processingresult',
+            name='raw_text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddIndex(
+            model_name='processingjob',
+            index=models.Index(fields=['status', 'created_at'], name='core_proces_status_c7a5c5_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_processed_documents(apps, schema_editor):
+    PDFDocument = apps.get_model('core', 'PDFDocument')
+    PDFDocument.objects.filter(processed=True).update(status='completed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_processingjob_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='error_message',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='max_concurrency',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='pdfdocument',
+            name='job',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='core.processingjob'),
+        ),
+        migrations.RunPython(mark_processed_documents, migrations.RunPython.noop),
+    ]
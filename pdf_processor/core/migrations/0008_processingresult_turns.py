@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_rate_limit_bucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingresult',
+            name='complete',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='processingresult',
+            name='turns',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
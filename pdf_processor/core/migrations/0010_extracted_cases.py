@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:53
+
+import django.db.models.deletion
+import json
+
+from django.db import migrations, models
+
+
+def backfill_cases(apps, schema_editor):
+    ProcessingResult = apps.get_model('core', 'ProcessingResult')
+    ExtractedCase = apps.get_model('core', 'ExtractedCase')
+    ExtractedField = apps.get_model('core', 'ExtractedField')
+
+    for result in ProcessingResult.objects.select_related('document').iterator():
+        data = result.result_data if isinstance(result.result_data, dict) else {}
+        cases = [case for case in data.get('case_results', []) if isinstance(case, dict)]
+        fields = []
+        for i, case in enumerate(cases):
+            extracted = ExtractedCase.objects.create(job_id=result.document.job_id, document_id=result.document_id, case_index=i)
+            for key, entry in case.items():
+                value, confidence = (entry.get('value', ''), entry.get('confidence')) if isinstance(entry, dict) else (entry, None)
+                if value is None:
+                    value = ''
+                elif isinstance(value, (dict, list)):
+                    value = json.dumps(value)
+                try:
+                    confidence = int(confidence) if confidence is not None else None
+                except (TypeError, ValueError):
+                    confidence = None
+                fields.append(ExtractedField(
+                    case=extracted, job_id=result.document.job_id, field_key=str(key)[:100],
+                    value=str(value), confidence=confidence
+                ))
+        ExtractedField.objects.bulk_create(fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_progress_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractedCase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('case_index', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cases', to='core.pdfdocument')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cases', to='core.processingjob')),
+            ],
+            options={
+                'ordering': ['document_id', 'case_index'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExtractedField',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field_key', models.CharField(max_length=100)),
+                ('value', models.TextField(blank=True)),
+                ('confidence', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fields', to='core.extractedcase')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.processingjob')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='extractedcase',
+            index=models.Index(fields=['job', 'document', 'case_index'], name='core_extrac_job_id_b30759_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='extractedcase',
+            constraint=models.UniqueConstraint(fields=('document', 'case_index'), name='unique_case_per_document'),
+        ),
+        migrations.AddIndex(
+            model_name='extractedfield',
+            index=models.Index(fields=['job', 'field_key', 'confidence'], name='core_extrac_job_id_3b0024_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='extractedfield',
+            index=models.Index(fields=['field_key', 'confidence'], name='core_extrac_field_k_03ef51_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='extractedfield',
+            constraint=models.UniqueConstraint(fields=('case', 'field_key'), name='unique_field_per_case'),
+        ),
+        migrations.RunPython(backfill_cases, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_extracted_cases'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractedfield',
+            name='model',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_extractedfield_model'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingresult',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='DocumentPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('text', models.TextField(blank=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='core.pdfdocument')),
+            ],
+            options={
+                'ordering': ['document_id', 'number'],
+                'constraints': [models.UniqueConstraint(fields=('document', 'number'), name='unique_page_per_document')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResultRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('case_index', models.PositiveIntegerField()),
+                ('changes', models.JSONField()),
+                ('model_name', models.CharField(max_length=100)),
+                ('raw_text', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='core.processingresult')),
+            ],
+            options={
+                'ordering': ['result_id', 'version'],
+                'constraints': [models.UniqueConstraint(fields=('result', 'version'), name='unique_result_version')],
+            },
+        ),
+    ]
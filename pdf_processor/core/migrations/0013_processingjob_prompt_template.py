@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:10
+
+from django.db import migrations, models
+
+
+def pin_existing_jobs(apps, schema_editor):
+    # Jobs created before the registry used version 1 of the default template
+    ProcessingJob = apps.get_model('core', 'ProcessingJob')
+    ProcessingJob.objects.update(prompt_version=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_result_revisions_and_pages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='prompt_template',
+            field=models.CharField(default='medical_review', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='prompt_version',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(pin_existing_jobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:34
+
+from django.db import OperationalError, migrations, models
+
+# Full-text index of DocumentPage.text for core/services/evidence_service.py.
+# External content table: the text is stored once, in core_documentpage.
+PAGE_INDEX_SQL = [
+    "CREATE VIRTUAL TABLE core_documentpage_fts USING fts5(text, content='core_documentpage', content_rowid='id')",
+    "CREATE TRIGGER core_documentpage_fts_insert AFTER INSERT ON core_documentpage BEGIN "
+    "INSERT INTO core_documentpage_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER core_documentpage_fts_delete AFTER DELETE ON core_documentpage BEGIN "
+    "INSERT INTO core_documentpage_fts(core_documentpage_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER core_documentpage_fts_update AFTER UPDATE ON core_documentpage BEGIN "
+    "INSERT INTO core_documentpage_fts(core_documentpage_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+    "INSERT INTO core_documentpage_fts(rowid, text) VALUES (new.id, new.text); END",
+    "INSERT INTO core_documentpage_fts(core_documentpage_fts) VALUES ('rebuild')",
+]
+DROP_PAGE_INDEX_SQL = [
+    "DROP TRIGGER IF EXISTS core_documentpage_fts_insert",
+    "DROP TRIGGER IF EXISTS core_documentpage_fts_delete",
+    "DROP TRIGGER IF EXISTS core_documentpage_fts_update",
+    "DROP TABLE IF EXISTS core_documentpage_fts",
+]
+
+
+def create_page_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(text)")
+            cursor.execute("DROP TABLE temp.fts5_probe")
+        except OperationalError:
+            # SQLite built without FTS5: evidence search is unavailable
+            return
+        for statement in PAGE_INDEX_SQL:
+            cursor.execute(statement)
+
+
+def drop_page_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for statement in DROP_PAGE_INDEX_SQL:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_bulk_ingest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractedfield',
+            name='page',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='extractedfield',
+            name='span_end',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='extractedfield',
+            name='span_start',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(create_page_index, drop_page_index),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:48
+
+import re
+
+from django.db import migrations, models
+
+# As results_service.value_sort_key when this migration was written
+LEADING_NUMBER_RE = re.compile(r'\s*(-?\d+(?:[.,]\d+)?)')
+
+
+def sort_key(value):
+    match = LEADING_NUMBER_RE.match(value)
+    if match:
+        number = float(match.group(1).replace(',', '.'))
+        if abs(number) < 1e9:
+            return f'1{number + 1e9:018.6f}'
+    text = value.strip().casefold()
+    return f'2{text}'[:255] if text else ''
+
+
+def backfill_sort_keys(apps, schema_editor):
+    ExtractedField = apps.get_model('core', 'ExtractedField')
+    batch = []
+    for field in ExtractedField.objects.only('id', 'value').iterator(chunk_size=2000):
+        field.sort_key = sort_key(field.value)
+        batch.append(field)
+        if len(batch) == 2000:
+            ExtractedField.objects.bulk_update(batch, ['sort_key'])
+            batch = []
+    ExtractedField.objects.bulk_update(batch, ['sort_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_cache_lookup_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractedfield',
+            name='sort_key',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.RunPython(backfill_sort_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+# PostgreSQL counterpart of the FTS5 table of migration 0016, for
+# core/services/evidence_service.py. The expression must stay the one
+# SearchVector('text', config='simple') generates, or queries won't use it.
+CREATE_PAGE_INDEX_SQL = (
+    "CREATE INDEX IF NOT EXISTS core_documentpage_text_search ON core_documentpage "
+    "USING GIN (to_tsvector('simple'::regconfig, COALESCE(text, '')))"
+)
+DROP_PAGE_INDEX_SQL = "DROP INDEX IF EXISTS core_documentpage_text_search"
+
+
+def create_page_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_PAGE_INDEX_SQL)
+
+
+def drop_page_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_PAGE_INDEX_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_field_sort_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_page_index, drop_page_index),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_postgres_page_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='extractedfield',
+            name='core_extrac_job_id_3b0024_idx',
+        ),
+        migrations.AddIndex(
+            model_name='extractedfield',
+            index=models.Index(fields=['job', 'field_key', 'sort_key', 'case'], name='core_extrac_job_id_33e869_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='extractedfield',
+            index=models.Index(fields=['job', 'field_key', 'confidence', 'case'], name='core_extrac_job_id_5aa349_idx'),
+        ),
+    ]
@@ -2,30 +2,61 @@
 from django.db import models
 
 
+STATUS_CHOICES = [
+    # Jobs only: files are still being added by ``manage.py ingest_pdfs``,
+    # so workers leave the job alone
+    ('uploading', 'Uploading'),
+    ('pending', 'Pending'),
+    ('processing', 'Processing'),
+    ('completed', 'Completed'),
+    ('failed', 'Failed')
+]
+
 
 class ProcessingJob(models.Model):
     name = models.CharField(max_length=200)
     prompt = models.TextField(blank=True)  # Make prompt optional since we'll generate it
     created_at = models.DateTimeField(auto_now_add=True)
-    status = models.CharField(
-        max_length=20,
-        choices=[
-            ('pending', 'Pending'),
-            ('processing', 'Processing'),
-            ('completed', 'Completed'),
-            ('failed', 'Failed')
-        ],
-        default='pending'
-    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     columns = models.JSONField(null=True, blank=True)  # Add this field
+    # Registered template (core/services/prompt_registry.py) the job was
+    # created with; a non-empty ``prompt`` overrides its text
+    prompt_template = models.CharField(max_length=100, default='medical_review')
+    prompt_version = models.PositiveSmallIntegerField(null=True, blank=True)
+    # Queue bookkeeping, written by the workers in core/tasks.py
+    worker_id = models.CharField(max_length=100, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    error_message = models.TextField(blank=True)
+    # Upper bound on concurrent LLM calls for this job's documents;
+    # falls back to settings.PROCESSING_MAX_CONCURRENCY when unset
+    max_concurrency = models.PositiveSmallIntegerField(null=True, blank=True)
+    # Bumped whenever the job or one of its documents changes; the progress
+    # stream compares it to decide which jobs to reload
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
 
     def __str__(self):
         return self.name
 
 class PDFDocument(models.Model):
-    job = models.OneToOneField(ProcessingJob, on_delete=models.CASCADE, related_name='document')
+    job = models.ForeignKey(ProcessingJob, on_delete=models.CASCADE, related_name='documents')
     file = models.FileField(upload_to='pdfs/')
     processed = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error_message = models.TextField(blank=True)
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    # Path (or ``archive.zip:member``) a bulk ingest read the file from
+    source = models.CharField(max_length=1000, blank=True)
+    # Earlier upload of the same paper whose result this document reuses,
+    # see core/services/dedupe_service.py
+    duplicate_of = models.ForeignKey(
+        'self', null=True, blank=True, on_delete=models.SET_NULL, related_name='duplicates'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -34,7 +65,171 @@ class PDFDocument(models.Model):
 class ProcessingResult(models.Model):
     document = models.OneToOneField(PDFDocument, on_delete=models.CASCADE, related_name='result')
     result_data = models.JSONField()
+    raw_text = models.TextField(blank=True)
+    # Model replies of a multi-turn case-series extraction, kept so an
+    # interrupted run can resume the conversation
+    turns = models.JSONField(default=list, blank=True)
+    complete = models.BooleanField(default=True)
+    # Bumped by each targeted re-extraction, see ResultRevision
+    version = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Result for {self.document}"
+
+
+class ResultRevision(models.Model):
+    """Fields of one case re-extracted after the fact, with their values before and after."""
+    result = models.ForeignKey(ProcessingResult, on_delete=models.CASCADE, related_name='revisions')
+    version = models.PositiveIntegerField()
+    case_index = models.PositiveIntegerField()
+    # {field_key: {"before": entry, "after": entry}}
+    changes = models.JSONField()
+    model_name = models.CharField(max_length=100)
+    raw_text = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['result_id', 'version']
+        constraints = [
+            models.UniqueConstraint(fields=['result', 'version'], name='unique_result_version'),
+        ]
+
+    def __str__(self):
+        return f"Version {self.version} of {self.result}"
+
+
+class DocumentPage(models.Model):
+    """Text layer of one PDF page, kept so later requests skip pypdf.
+
+    On SQLite the text is also indexed in the FTS5 table
+    ``core_documentpage_fts``, maintained by triggers (migration 0016).
+    A migration that rebuilds this table must recreate them.
+    """
+    document = models.ForeignKey(PDFDocument, on_delete=models.CASCADE, related_name='pages')
+    number = models.PositiveIntegerField()
+    text = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['document_id', 'number']
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'number'], name='unique_page_per_document'),
+        ]
+
+    def __str__(self):
+        return f"Page {self.number} of {self.document}"
+
+
+class DocumentFingerprint(models.Model):
+    """What identifies a document as a paper: its DOI, title and a MinHash of its text."""
+    document = models.OneToOneField(PDFDocument, on_delete=models.CASCADE, related_name='fingerprint')
+    doi = models.CharField(max_length=255, blank=True, db_index=True)
+    title_key = models.CharField(max_length=255, blank=True, db_index=True)
+    # MinHash signature of the text's word shingles; None without a text layer
+    minhash = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Fingerprint of {self.document}"
+
+
+class FingerprintBand(models.Model):
+    """One LSH band of a MinHash signature; documents sharing a band are compared."""
+    fingerprint = models.ForeignKey(DocumentFingerprint, on_delete=models.CASCADE, related_name='bands')
+    key = models.CharField(max_length=40, db_index=True)
+
+    def __str__(self):
+        return self.key
+
+
+class ExtractedCase(models.Model):
+    """One case of a document's extraction, normalised out of ``ProcessingResult.result_data``."""
+    job = models.ForeignKey(ProcessingJob, on_delete=models.CASCADE, related_name='cases')
+    document = models.ForeignKey(PDFDocument, on_delete=models.CASCADE, related_name='cases')
+    case_index = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['document_id', 'case_index']
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'case_index'], name='unique_case_per_document'),
+        ]
+        indexes = [
+            models.Index(fields=['job', 'document', 'case_index']),
+        ]
+
+    def __str__(self):
+        return f"Case {self.case_index + 1} of {self.document}"
+
+
+class ExtractedField(models.Model):
+    """One extracted field of a case, with the model's confidence."""
+    case = models.ForeignKey(ExtractedCase, on_delete=models.CASCADE, related_name='fields')
+    # Denormalised from the case so job-wide filters need no join
+    job = models.ForeignKey(ProcessingJob, on_delete=models.CASCADE, related_name='+')
+    field_key = models.CharField(max_length=100)
+    value = models.TextField(blank=True)
+    # Orders values numerically when they start with a number, see
+    # results_service.value_sort_key
+    sort_key = models.CharField(max_length=255, blank=True, default='')
+    confidence = models.PositiveSmallIntegerField(null=True, blank=True)
+    # Model that produced the value, see core/services/routing_service.py
+    model = models.CharField(max_length=100, blank=True)
+    # Page and character span of the value in DocumentPage.text, if found,
+    # see core/services/evidence_service.py
+    page = models.PositiveIntegerField(null=True, blank=True)
+    span_start = models.PositiveIntegerField(null=True, blank=True)
+    span_end = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Its unique index on (case, field_key) also finds the cases
+            # without a field when a results page is sorted by it
+            models.UniqueConstraint(fields=['case', 'field_key'], name='unique_field_per_case'),
+        ]
+        indexes = [
+            # Seek paths for a results page sorted by a field's value or
+            # confidence, see results_service.page_cases
+            models.Index(fields=['job', 'field_key', 'sort_key', 'case']),
+            models.Index(fields=['job', 'field_key', 'confidence', 'case']),
+            models.Index(fields=['field_key', 'confidence']),
+        ]
+
+    def __str__(self):
+        return f"{self.field_key}: {self.value}"
+
+class ExtractionCache(models.Model):
+    """Extraction results keyed on PDF content, prompt, model and generation config."""
+    key = models.CharField(max_length=64, unique=True)
+    pdf_sha256 = models.CharField(max_length=64, db_index=True)
+    model_name = models.CharField(max_length=100)
+    result_data = models.JSONField()
+    raw_text = models.TextField(blank=True)
+    size_bytes = models.PositiveIntegerField(default=0)
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.model_name} cache entry for {self.pdf_sha256[:12]}"
+
+
+class CacheLookupCount(models.Model):
+    """Extraction cache hits and misses of every worker, so any process can report them."""
+    result = models.CharField(max_length=10, unique=True)  # 'hit' or 'miss'
+    count = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"cache {self.result}: {self.count}"
+
+
+class RateLimitBucket(models.Model):
+    """Token bucket state shared by every worker process through the database."""
+    name = models.CharField(max_length=100, unique=True)
+    tokens = models.FloatField()
+    updated_at = models.FloatField()  # time.time() of the last refill
+    version = models.PositiveIntegerField(default=0)
 
     def __str__(self):
-        return f"Result for {self.document}"
\ No newline at end of file
+        return f"{self.name}: {self.tokens:.1f} tokens"
@@ -0,0 +1,155 @@
+# core/services/cache_service.py
+"""Content-addressed cache of extraction results.
+
+Entries are keyed on the SHA-256 of the PDF bytes together with the prompt
+text, model name, generation config and the extraction options (case
+series turns, local text extraction), so re-uploading the same paper with
+the same settings returns the stored result without calling Gemini. Entries
+are evicted by age (since last use) and by count, least recently used first.
+
+Lookups happen in the workers but are reported by the web process, so
+hits and misses are counted in the database (``CacheLookupCount``) as
+well as in the worker's own ``pdf_processor_cache_lookups`` metric.
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from ..models import CacheLookupCount, ExtractionCache
+from .metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+
+def _count(result):
+    CACHE_LOOKUPS.inc(result=result)
+    if not CacheLookupCount.objects.filter(result=result).update(count=F('count') + 1):
+        CacheLookupCount.objects.get_or_create(result=result)
+        CacheLookupCount.objects.filter(result=result).update(count=F('count') + 1)
+
+
+def cache_key(pdf_sha256, prompt, model_name, generation_config, options=None):
+    payload = json.dumps({
+        'pdf_sha256': pdf_sha256,
+        'prompt': prompt,
+        'model': model_name,
+        'generation_config': generation_config,
+        'options': options,
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _cutoff():
+    max_age = settings.EXTRACTION_CACHE_MAX_AGE
+    return timezone.now() - timedelta(seconds=max_age) if max_age else None
+
+
+def get_cached_result(key):
+    """Return a stored result in the ``process_pdf_with_gemini`` shape, or None."""
+    if not settings.EXTRACTION_CACHE_ENABLED:
+        return None
+
+    entries = ExtractionCache.objects.filter(key=key)
+    cutoff = _cutoff()
+    if cutoff is not None:
+        entries = entries.filter(last_accessed_at__gte=cutoff)
+    entry = entries.only('id', 'result_data', 'raw_text').first()
+    if entry is None:
+        _count('miss')
+        return None
+
+    ExtractionCache.objects.filter(pk=entry.pk).update(
+        hit_count=F('hit_count') + 1,
+        last_accessed_at=timezone.now(),
+    )
+    _count('hit')
+    return {
+        'success': True,
+        'parsed_json': entry.result_data,
+        'raw_text': entry.raw_text,
+        'cached': True
+    }
+
+
+def store_result(key, pdf_sha256, model_name, result):
+    if not settings.EXTRACTION_CACHE_ENABLED or not result.get('success'):
+        return None
+
+    raw_text = result.get('raw_text', '')
+    size = len(json.dumps(result['parsed_json'])) + len(raw_text)
+    entry, _ = ExtractionCache.objects.update_or_create(
+        key=key,
+        defaults={
+            'pdf_sha256': pdf_sha256,
+            'model_name': model_name,
+            'result_data': result['parsed_json'],
+            'raw_text': raw_text,
+            'size_bytes': size,
+            'last_accessed_at': timezone.now(),
+        }
+    )
+    return entry
+
+
+def replace_result(pdf_sha256, before, after):
+    """Store ``after`` in the entries of a PDF that hold ``before``, as when a result is corrected.
+
+    Returns the number of entries changed.
+    """
+    if not pdf_sha256:
+        return 0
+    entries = ExtractionCache.objects.filter(pdf_sha256=pdf_sha256).only('id', 'result_data', 'raw_text')
+    stale = [entry for entry in entries if entry.result_data == before]
+    for entry in stale:
+        entry.result_data = after
+        entry.size_bytes = len(json.dumps(after)) + len(entry.raw_text)
+    ExtractionCache.objects.bulk_update(stale, ['result_data', 'size_bytes'])
+    return len(stale)
+
+
+def evict(max_age=None, max_entries=None):
+    """Drop expired entries, then the least recently used beyond ``max_entries``."""
+    max_age = settings.EXTRACTION_CACHE_MAX_AGE if max_age is None else max_age
+    max_entries = settings.EXTRACTION_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    removed = 0
+
+    if max_age:
+        cutoff = timezone.now() - timedelta(seconds=max_age)
+        removed += ExtractionCache.objects.filter(last_accessed_at__lt=cutoff).delete()[0]
+
+    if max_entries:
+        stale_ids = list(
+            ExtractionCache.objects.order_by('-last_accessed_at', '-id')
+            .values_list('id', flat=True)[max_entries:]
+        )
+        if stale_ids:
+            removed += ExtractionCache.objects.filter(id__in=stale_ids).delete()[0]
+
+    if removed:
+        logger.info(f"Evicted {removed} extraction cache entries")
+    return removed
+
+
+def cache_stats():
+    """Hits and misses of every worker plus totals stored in the table."""
+    totals = ExtractionCache.objects.aggregate(size_bytes=Sum('size_bytes'), stored_hits=Sum('hit_count'))
+    counts = dict(CacheLookupCount.objects.values_list('result', 'count'))
+    hits, misses = counts.get('hit', 0), counts.get('miss', 0)
+    lookups = hits + misses
+    return {
+        'entries': ExtractionCache.objects.count(),
+        'size_bytes': totals['size_bytes'] or 0,
+        'stored_hits': totals['stored_hits'] or 0,
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / lookups if lookups else 0.0,
+    }
+
+
+def reset_stats():
+    CacheLookupCount.objects.all().delete()
@@ -0,0 +1,254 @@
+# core/services/dedupe_service.py
+"""Recognising a paper that was uploaded before.
+
+The same article often arrives again under another file name, or as a
+different download of the same PDF. Before a document is sent to the LLM
+it is looked up, cheapest test first, by:
+
+``file``   the SHA-256 of its bytes
+``doi``    the normalised DOI printed on its first page
+``title``  lines of its first page against the normalised titles of
+           earlier results
+``text``   a MinHash signature of its word shingles. Signatures are split
+           into LSH bands stored as ``FingerprintBand`` rows, so only
+           documents sharing a band are compared, and the match needs an
+           estimated similarity of ``DEDUPE_TEXT_THRESHOLD``.
+
+Two documents printing different DOIs are never duplicates. A match only
+counts if the earlier document was extracted with the same prompt, since
+its result is reused as is. DOIs and titles of results are added to the
+index as documents complete (``record_identifiers``).
+"""
+import hashlib
+import logging
+import random
+import re
+import unicodedata
+
+import numpy as np
+from django.conf import settings
+
+from ..models import DocumentFingerprint, FingerprintBand, PDFDocument, ProcessingResult
+from .metrics import DUPLICATES
+from .prompt_registry import job_template
+
+logger = logging.getLogger(__name__)
+
+DOI_RE = re.compile(r'\b(10\.\d{4,9}/[^\s"<>]+)', re.IGNORECASE)
+DOI_PREFIX_RE = re.compile(r'^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)', re.IGNORECASE)
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+# Words per shingle, and signature length split into bands of rows. With
+# 16 bands of 4 rows, papers sharing about half their shingles already
+# become candidates; the threshold then decides.
+SHINGLE_WORDS = 5
+BANDS = 16
+ROWS_PER_BAND = 4
+MIN_SHINGLES = 20
+# Lines of the first page searched for the title, and its minimum length
+TITLE_LINES = 12
+TITLE_MIN_WORDS = 4
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240611)
+PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(BANDS * ROWS_PER_BAND)]
+# The permutations as uint64 columns, ``a`` split into 30 and 31 bit halves
+# for ``_mulmod``; shingles are hashed against them in blocks of this many
+_A = np.array([a for a, _ in PERMUTATIONS], dtype=np.uint64)[:, None]
+_A_HIGH, _A_LOW = _A >> np.uint64(31), _A & np.uint64((1 << 31) - 1)
+_B = np.array([b for _, b in PERMUTATIONS], dtype=np.uint64)[:, None]
+_P = np.uint64(_PRIME)
+MINHASH_BLOCK = 4096
+
+
+def normalize_doi(value):
+    """Lower-cased bare DOI, without resolver prefix or trailing punctuation."""
+    value = DOI_PREFIX_RE.sub('', str(value or '').strip())
+    match = DOI_RE.search(value)
+    return match.group(1).rstrip('.,;:)]').lower()[:255] if match else ''
+
+
+def normalize_title(value):
+    """Title reduced to lower-case ASCII words, or '' if too short to identify a paper."""
+    text = unicodedata.normalize('NFKD', str(value or '')).encode('ascii', 'ignore').decode('ascii')
+    words = WORD_RE.findall(text.lower())
+    return ' '.join(words)[:255] if len(words) >= TITLE_MIN_WORDS else ''
+
+
+def first_page_text(pages):
+    return pages[0]['text'] if pages else ''
+
+
+def title_candidates(pages):
+    """Normalised first-page lines, alone and joined with the next, that could be the title."""
+    lines = [line for line in first_page_text(pages).splitlines() if line.strip()][:TITLE_LINES]
+    candidates = {normalize_title(line) for line in lines}
+    candidates.update(normalize_title(f'{first} {second}') for first, second in zip(lines, lines[1:]))
+    candidates.discard('')
+    return candidates
+
+
+def _mulmod(x):
+    """``(a * x + b) % _PRIME`` for every permutation (rows) and ``x`` (columns), exactly.
+
+    ``x`` must be below 2**61. The 122-bit product is built from 31-bit
+    halves, folding multiples of 2**61 back in as 1 (2**61 = 1 mod _PRIME),
+    so no intermediate leaves uint64.
+    """
+    x_high, x_low = x >> np.uint64(31), x & np.uint64((1 << 31) - 1)
+    middle = _A_HIGH * x_low + _A_LOW * x_high
+    total = (
+        np.uint64(2) * _A_HIGH * x_high
+        + (middle >> np.uint64(30))
+        + ((middle & np.uint64((1 << 30) - 1)) << np.uint64(31))
+        + _A_LOW * x_low
+        + _B
+    )
+    return total % _P
+
+
+def minhash(pages):
+    """MinHash signature of the text's word shingles, or None if there is too little text."""
+    words = WORD_RE.findall(' '.join(page['text'] for page in pages or []).lower())
+    shingles = {
+        hashlib.blake2b(' '.join(words[i:i + SHINGLE_WORDS]).encode(), digest_size=8).digest()
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    }
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    hashes = np.frombuffer(b''.join(shingles), dtype='>u8').astype(np.uint64) % _P
+    signature = np.full(len(PERMUTATIONS), _PRIME, dtype=np.uint64)
+    for start in range(0, len(hashes), MINHASH_BLOCK):
+        signature = np.minimum(signature, _mulmod(hashes[None, start:start + MINHASH_BLOCK]).min(axis=1))
+    return signature.tolist()
+
+
+def band_keys(signature):
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(repr(rows).encode(), digest_size=12).hexdigest()
+        keys.append(f'{band:02d}:{digest}')
+    return keys
+
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(a == b for a, b in zip(first, second)) / len(first)
+
+
+def compute_fingerprint(pages):
+    """``{'doi', 'minhash'}`` of page texts. No database access, so it can run in a pool thread."""
+    return {'doi': normalize_doi(first_page_text(pages)), 'minhash': minhash(pages)}
+
+
+def fingerprint_document(pdf_doc, pages, computed=None):
+    """Create the document's fingerprint from its page texts, or return the saved one.
+
+    ``computed`` is the ``compute_fingerprint`` of the pages, if the caller
+    worked it out already.
+    """
+    fingerprint = DocumentFingerprint.objects.filter(document=pdf_doc).first()
+    if fingerprint is not None:
+        return fingerprint
+    computed = computed or compute_fingerprint(pages)
+    fingerprint = DocumentFingerprint.objects.create(document=pdf_doc, **computed)
+    signature = computed['minhash']
+    if signature is not None:
+        FingerprintBand.objects.bulk_create(
+            [FingerprintBand(fingerprint=fingerprint, key=key) for key in band_keys(signature)]
+        )
+    return fingerprint
+
+
+def record_identifiers(pdf_doc, case_results, template):
+    """Add the DOI and title the model extracted to the document's fingerprint."""
+    case = next((case for case in case_results if isinstance(case, dict)), None)
+    if case is None:
+        return
+
+    def value(role):
+        entry = case.get(template.roles.get(role))
+        return entry.get('value') if isinstance(entry, dict) else entry
+
+    fingerprint, _ = DocumentFingerprint.objects.get_or_create(document=pdf_doc)
+    # A DOI printed on the paper wins over the model's reading of it
+    doi = fingerprint.doi or normalize_doi(value('doi'))
+    title_key = normalize_title(value('title')) or fingerprint.title_key
+    if (doi, title_key) != (fingerprint.doi, fingerprint.title_key):
+        fingerprint.doi, fingerprint.title_key = doi, title_key
+        fingerprint.save(update_fields=['doi', 'title_key'])
+
+
+def _text_matches(fingerprint):
+    if fingerprint.minhash is None:
+        return {}
+    threshold = settings.DEDUPE_TEXT_THRESHOLD
+    candidates = (
+        FingerprintBand.objects.filter(key__in=band_keys(fingerprint.minhash))
+        .exclude(fingerprint=fingerprint)
+        .values_list('fingerprint__document_id', 'fingerprint__doi', 'fingerprint__minhash')
+        .distinct()
+    )
+    matches = {}
+    for document_id, doi, signature in candidates:
+        if fingerprint.doi and doi and doi != fingerprint.doi:
+            continue
+        score = similarity(fingerprint.minhash, signature)
+        if score >= threshold:
+            matches[document_id] = score
+    return matches
+
+
+def _lookups(pdf_doc, fingerprint, pages):
+    # Cheapest first; the text comparison only runs if nothing else matched
+    if pdf_doc.sha256:
+        yield 'file', {'sha256': pdf_doc.sha256}, lambda candidate: 'identical file'
+    if fingerprint.doi:
+        yield 'doi', {'fingerprint__doi': fingerprint.doi}, lambda candidate: f'same DOI {fingerprint.doi}'
+    titles = title_candidates(pages)
+    if titles:
+        yield 'title', {'fingerprint__title_key__in': titles}, lambda candidate: 'same title'
+    scores = _text_matches(fingerprint)
+    if scores:
+        yield 'text', {'pk__in': list(scores)}, lambda candidate: f'{scores[candidate.id]:.0%} similar text'
+
+
+def find_duplicate(pdf_doc, fingerprint, pages, template, accept=None):
+    """Return ``(document, reason)`` for an earlier upload of the same paper, or None.
+
+    ``accept(document)`` can turn down a match, for instance one whose own
+    extraction has not run yet. Finished documents are tried first.
+    """
+    for kind, lookup, reason in _lookups(pdf_doc, fingerprint, pages):
+        candidates = (
+            PDFDocument.objects.filter(**lookup).exclude(pk=pdf_doc.pk).exclude(status='failed')
+            .select_related('job', 'fingerprint').order_by('-processed', 'id')
+        )
+        for candidate in candidates:
+            other_doi = getattr(getattr(candidate, 'fingerprint', None), 'doi', '')
+            if fingerprint.doi and other_doi and other_doi != fingerprint.doi:
+                continue
+            if job_template(candidate.job).prompt != template.prompt:
+                continue
+            if accept is not None and not accept(candidate):
+                continue
+            DUPLICATES.inc(match=kind)
+            logger.info(f"{pdf_doc.file.name} is a duplicate of document {candidate.id} ({reason(candidate)})")
+            return candidate, reason(candidate)
+    return None
+
+
+def duplicate_result(original, reason):
+    """The finished result of ``original`` in the ``process_pdf_with_gemini`` shape, or None."""
+    result = ProcessingResult.objects.filter(document=original, complete=True).first()
+    if original.status != 'completed' or result is None:
+        return None
+    return {
+        'success': True,
+        'parsed_json': result.result_data,
+        'raw_text': result.raw_text,
+        'turns': result.turns,
+        'duplicate_of': original.duplicate_of_id or original.id,
+        'duplicate_reason': reason,
+    }
@@ -0,0 +1,182 @@
+# core/services/evidence_service.py
+"""Where in a paper an extracted value comes from.
+
+Reviewers check every value against the PDF. To spare them the hunt:
+
+``locate``        finds the page and character span of a value in the saved
+                  page texts (``DocumentPage``). Values are matched word by
+                  word, ignoring case and punctuation between words; when a
+                  value occurs more than once, the occurrence with most words
+                  of the field label nearby wins. The result is stored on
+                  the ``ExtractedField`` as ``page``, ``span_start`` and
+                  ``span_end`` when the case is saved.
+``search_pages``  full-text search over the page texts of some documents,
+                  always answered from an index. On SQLite it is the FTS5
+                  table ``core_documentpage_fts`` (migration 0016, kept in
+                  step with ``DocumentPage`` by triggers); on PostgreSQL a
+                  GIN index on ``to_tsvector('simple', text)`` (migration
+                  0019). Other databases, and SQLite built without FTS5,
+                  have no page index: ``has_page_index()`` is False and
+                  search is unavailable rather than a scan of every page.
+
+Neither reads the PDF again.
+"""
+import re
+from functools import lru_cache
+
+from django.db import connection
+
+from ..models import DocumentPage
+
+try:
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+except ImportError:  # needs psycopg, only installed for PostgreSQL
+    SearchQuery = SearchRank = SearchVector = None
+
+FTS_TABLE = 'core_documentpage_fts'
+PG_INDEX = 'core_documentpage_text_search'
+# No stemming, as the FTS5 default tokenizer
+PG_SEARCH_CONFIG = 'simple'
+
+TOKEN_RE = re.compile(r'\w+')
+# Values shorter than this are not located ("y", "M"), and values shorter
+# than SHORT_VALUE_CHARS need a word of the field label nearby ("II", "no")
+MIN_VALUE_CHARS = 2
+SHORT_VALUE_CHARS = 4
+CONTEXT_CHARS = 120
+SNIPPET_CHARS = 80
+MAX_CANDIDATES = 50
+STOP_WORDS = frozenset({'the', 'and', 'for', 'from', 'with', 'last', 'name', 'first', 'total', 'most'})
+
+
+def value_pattern(value):
+    """Regex matching the words of ``value`` in order, or None if it is too short to look for."""
+    tokens = TOKEN_RE.findall(str(value or ''))
+    if sum(len(token) for token in tokens) < MIN_VALUE_CHARS:
+        return None
+    return re.compile(r'(?<!\w)' + r'\W{1,10}'.join(re.escape(token) for token in tokens) + r'(?!\w)', re.I)
+
+
+def label_words(label):
+    return {
+        word for word in TOKEN_RE.findall(str(label or '').lower())
+        if len(word) >= 3 and not word.isdigit() and word not in STOP_WORDS
+    }
+
+
+def locate(value, pages, label=''):
+    """``{'page', 'start', 'end'}`` of ``value`` in ``pages``, or None if it is not found."""
+    pattern = value_pattern(value)
+    if pattern is None or not pages:
+        return None
+    words = label_words(label)
+    short = len(str(value).strip()) < SHORT_VALUE_CHARS
+    best, candidates = None, 0
+    for page in pages:
+        text = page['text']
+        for match in pattern.finditer(text):
+            window = text[max(0, match.start() - CONTEXT_CHARS):match.end() + CONTEXT_CHARS].lower()
+            score = sum(word in window for word in words)
+            if (best is None or score > best[0]) and (score or not short):
+                best = (score, page['number'], match.start(), match.end())
+            candidates += 1
+            if candidates >= MAX_CANDIDATES:
+                break
+        if candidates >= MAX_CANDIDATES:
+            break
+    if best is None:
+        return None
+    _, number, start, end = best
+    return {'page': number, 'start': start, 'end': end}
+
+
+def snippet(text, start, end):
+    """The span with some text either side, on one line."""
+    before = text[max(0, start - SNIPPET_CHARS):start]
+    after = text[end:end + SNIPPET_CHARS]
+    return ' '.join(f'{before}[[{text[start:end]}]]{after}'.split())
+
+
+@lru_cache(maxsize=None)
+def page_index():
+    """``'fts5'`` or ``'postgres'`` for the page index of the database, or None if it has none.
+
+    Looked up once per process; ``forget_page_index`` clears it after ``migrate``.
+    """
+    if connection.vendor == 'sqlite':
+        return 'fts5' if FTS_TABLE in connection.introspection.table_names() else None
+    if connection.vendor == 'postgresql' and SearchVector is not None:
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(cursor, DocumentPage._meta.db_table)
+        return 'postgres' if PG_INDEX in indexes else None
+    return None
+
+
+def has_page_index():
+    return page_index() is not None
+
+
+def forget_page_index(**kwargs):
+    """``post_migrate`` receiver: migrations may have added or dropped the index."""
+    page_index.cache_clear()
+
+
+def _fts_query(tokens):
+    # Each word quoted, so FTS5 operators typed by the user stay plain words
+    return ' '.join(f'"{token}"' for token in tokens)
+
+
+def matching_pages(documents, query, limit=20):
+    """``DocumentPage`` rows of ``documents`` containing every word of ``query``, best first.
+
+    Raises RuntimeError when the database has no page index.
+    """
+    tokens = TOKEN_RE.findall(query)
+    if not tokens:
+        return []
+    index = page_index()
+    if index is None:
+        raise RuntimeError('Evidence search needs SQLite with FTS5 or PostgreSQL')
+    document_ids = documents.values('id')
+    if index == 'postgres':
+        # Same expression as the GIN index, so the planner can use it
+        vector = SearchVector('text', config=PG_SEARCH_CONFIG)
+        search = SearchQuery(' '.join(tokens), config=PG_SEARCH_CONFIG, search_type='plain')
+        pages = (
+            DocumentPage.objects.filter(document__in=document_ids)
+            .annotate(search=vector, rank=SearchRank(vector, search)).filter(search=search)
+        )
+        return list(pages.order_by('-rank', 'document_id', 'number')[:limit])
+    subquery, params = document_ids.query.sql_with_params()
+    return list(DocumentPage.objects.raw(
+        f'SELECT page.id, page.document_id, page.number, page.text FROM {FTS_TABLE} '
+        f'JOIN core_documentpage page ON page.id = {FTS_TABLE}.rowid '
+        f'WHERE {FTS_TABLE} MATCH %s AND page.document_id IN ({subquery}) '
+        f'ORDER BY bm25({FTS_TABLE}), page.document_id, page.number LIMIT %s',
+        [_fts_query(tokens), *params, limit],
+    ))
+
+
+def search_pages(documents, query, limit=20):
+    """Evidence for ``query`` in ``documents`` as ``{document_id, page, start, end, snippet}`` dicts.
+
+    The span is the first place the words occur together on the page, or
+    the first of them when they are spread over it.
+    """
+    tokens = TOKEN_RE.findall(query)
+    if not tokens:
+        return []
+    together = value_pattern(query) or re.compile(re.escape(tokens[0]), re.I)
+    first_word = re.compile(r'(?<!\w)' + re.escape(tokens[0]), re.I)
+    results = []
+    for page in matching_pages(documents, query, limit):
+        match = together.search(page.text) or first_word.search(page.text)
+        start, end = (match.start(), match.end()) if match else (0, 0)
+        results.append({
+            'document_id': page.document_id,
+            'page': page.number,
+            'start': start,
+            'end': end,
+            'snippet': snippet(page.text, start, end),
+        })
+    return results
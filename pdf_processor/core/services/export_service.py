@@ -0,0 +1,250 @@
+# core/services/export_service.py
+"""Streaming exports of extracted cases.
+
+Each exporter takes the rows from ``results_service.iter_cases``, which
+reads cases from the database in chunks, and returns an iterator of bytes
+suitable for ``StreamingHttpResponse``. Neither the table nor the output
+file is ever held in memory whole:
+
+``csv``      written row by row.
+``xlsx``     a minimal SpreadsheetML workbook with inline strings. It is
+             zipped on the fly into a non-seekable stream, so the output
+             needs no temporary file or shared-string table.
+``parquet``  one row group per chunk, through pyarrow (optional).
+
+Every case is one row: job, document and case number, then a value and a
+confidence column for each field key. Exports may span several jobs. With
+``normalized`` the typed columns of ``normalization_service`` follow,
+parsed a chunk of rows at a time.
+"""
+import codecs
+import csv
+import zipfile
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from .normalization_service import derived_columns, normalize_chunk
+from .prompt_registry import job_template
+from .results_service import iter_cases, job_columns
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pq = None
+
+CHUNK_ROWS = 500
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+class _StreamBuffer:
+    """Write-only file object whose contents are drained by the exporter."""
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+PARQUET_TYPES = {
+    'float64': 'float64',
+    'Int64': 'int64',
+    'boolean': 'bool_',
+    'string': 'string',
+}
+
+
+def export_header(columns, derived=()):
+    header = ['job_id', 'document', 'case']
+    for key in columns:
+        header.extend([key, f'{key} confidence'])
+    header.extend(name for name, _ in derived)
+    return header
+
+
+def export_rows(jobs, columns, derived=()):
+    cases = iter_cases(jobs, columns=columns, chunk_size=CHUNK_ROWS)
+    templates = {job.id: job_template(job) for job in jobs} if derived else {}
+    while True:
+        chunk = list(islice(cases, CHUNK_ROWS))
+        if not chunk:
+            return
+        if derived:
+            normalized = normalize_chunk(
+                [case.job_id for case, _, _ in chunk],
+                [{key: field['value'] for key, field in fields.items()} for _, _, fields in chunk],
+                templates, columns,
+            )
+        else:
+            normalized = [[]] * len(chunk)
+        for (case, document_name, fields), extra in zip(chunk, normalized):
+            row = [case.job_id, document_name, case.case_index + 1]
+            for key in columns:
+                field = fields.get(key, {})
+                row.extend([field.get('value', ''), field.get('confidence')])
+            yield row + extra
+
+
+class _TextBuffer:
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def write(self, text):
+        return self.buffer.write(text.encode('utf-8'))
+
+
+def stream_csv(jobs, columns, derived=()):
+    buffer = _StreamBuffer()
+    # BOM so Excel detects UTF-8
+    buffer.write(codecs.BOM_UTF8)
+    writer = csv.writer(_TextBuffer(buffer))
+    writer.writerow(export_header(columns, derived))
+    for i, row in enumerate(export_rows(jobs, columns, derived), 1):
+        writer.writerow(row)
+        if i % CHUNK_ROWS == 0:
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Cases" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def _xlsx_cell(value):
+    if value is None or value == '':
+        return '<c/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    # Control characters are not allowed in XML
+    text = ''.join(ch for ch in str(value) if ch in '\t\n\r' or ch >= ' ')
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return '<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>'
+
+
+def stream_xlsx(jobs, columns, derived=()):
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', XLSX_WORKBOOK)
+        archive.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        yield buffer.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', mode='w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(export_header(columns, derived)).encode('utf-8'))
+            for i, row in enumerate(export_rows(jobs, columns, derived), 1):
+                sheet.write(_xlsx_row(row).encode('utf-8'))
+                if i % CHUNK_ROWS == 0:
+                    yield buffer.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.drain()
+
+
+def stream_parquet(jobs, columns, derived=()):
+    # Checked before the first chunk so the view can still answer with an error
+    if pa is None:
+        raise ValueError("Parquet export requires pyarrow")
+
+    fields = [pa.field('job_id', pa.int64()), pa.field('document', pa.string()), pa.field('case', pa.int64())]
+    for key in columns:
+        fields.extend([pa.field(key, pa.string()), pa.field(f'{key} confidence', pa.int64())])
+    fields.extend(pa.field(name, getattr(pa, PARQUET_TYPES[dtype])()) for name, dtype in derived)
+    schema = pa.schema(fields)
+    names = schema.names
+
+    def table(rows):
+        return pa.Table.from_pydict({name: [row[i] for row in rows] for i, name in enumerate(names)}, schema=schema)
+
+    buffer = _StreamBuffer()
+
+    def generate():
+        writer = pq.ParquetWriter(buffer, schema)
+        rows = []
+        for row in export_rows(jobs, columns, derived):
+            rows.append(row)
+            if len(rows) == CHUNK_ROWS:
+                writer.write_table(table(rows))
+                rows = []
+                yield buffer.drain()
+        if rows:
+            writer.write_table(table(rows))
+        writer.close()
+        yield buffer.drain()
+
+    return generate()
+
+
+EXPORTERS = {
+    'csv': stream_csv,
+    'xlsx': stream_xlsx,
+    'parquet': stream_parquet,
+}
+
+
+def export_cases(jobs, export_format, columns=None, normalized=False):
+    """Return ``(chunks, content_type, extension)`` for an export of ``jobs``.
+
+    ``normalized`` appends the parsed columns of the fields whose template
+    declares a kind.
+    """
+    if export_format not in EXPORTERS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    columns = columns or job_columns(jobs)
+    derived = derived_columns(list(dict.fromkeys(job_template(job) for job in jobs)), columns) if normalized else ()
+    content_type, extension = FORMATS[export_format]
+    return EXPORTERS[export_format](jobs, columns, derived), content_type, extension
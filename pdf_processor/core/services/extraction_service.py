@@ -0,0 +1,306 @@
+# core/services/extraction_service.py
+"""Per-document extraction: build the request, talk to the LLM, parse the reply.
+
+Case series longer than ``CASE_SERIES_CASES_PER_TURN`` are extracted over
+several turns of one conversation following the "Request the next cases"
+protocol. The document part from the first turn stays in the history, so
+follow-up turns need no re-upload through the file API. After each turn
+that leaves cases outstanding ``on_turn`` receives the replies and cases so
+far, which lets the caller persist partial results; passing those replies back as ``resume_turns``
+continues the conversation where it stopped.
+
+Documents go to the fast model first and are re-extracted with the strong
+one only when ``routing_service`` finds the result unreliable.
+
+The conversation itself is written as a generator of requests, driven by
+blocking calls in ``process_pdf_with_gemini`` (worker threads) and by
+awaited calls in ``aprocess_pdf_with_gemini`` (the asyncio pipeline).
+
+With ``LLM_STRUCTURED_OUTPUT`` the prompt template's JSON schema is sent as
+the response format, so replies are plain JSON checked by the template's
+compiled validator rather than text the JSON has to be dug out of.
+
+With ``LLM_STREAMING`` replies of the first model are read as they are
+generated: each case is passed to ``on_turn`` with the cases before it as
+soon as its object closes, so callers can save and show it without waiting
+for the whole reply.
+"""
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from ..utils import CASE_SERIES_PROMPT, NEXT_CASES_PROMPT, CaseStream, parse_extraction
+from .llm_service import DEFAULT_GENERATION_CONFIG, LLMError, get_llm_client
+from .metrics import FIRST_ROW_SECONDS
+from .pdf_service import PdfReader, build_text_context, pdf_part, read_pages
+from .prompt_registry import as_template
+from .rate_limiter import is_retryable
+from .routing_service import escalation_reasons, merge_cases, routing_models, tag_model
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def document_parts(pdf_doc, client, pages=None):
+    """Yield the parts that carry the document: relevant text or the PDF itself."""
+    context = build_text_context(pdf_doc, pages)
+    if context is not None:
+        logger.info(
+            f"Sending {context['selected_chars']} of {context['total_chars']} characters "
+            f"from pages {context['pages']} of {pdf_doc.file.name}"
+        )
+        yield [f"Relevant excerpts from the article:\n\n{context['text']}"]
+        return
+
+    with pdf_part(pdf_doc, client=client) as part:
+        yield [part]
+
+
+def generation_config(template, field_keys=None):
+    """Generation config for a request answered in ``template``'s format.
+
+    ``field_keys`` narrows the schema to a bare object of those fields, the
+    shape of a field re-extraction reply.
+    """
+    if not settings.LLM_STRUCTURED_OUTPUT:
+        return DEFAULT_GENERATION_CONFIG
+    schema = template.response_schema if field_keys is None else template.case_schema(field_keys)
+    return {**DEFAULT_GENERATION_CONFIG, 'response_mime_type': 'application/json', 'response_schema': schema}
+
+
+def extraction_options():
+    """Settings besides prompt, model and config that change an extraction's result, for cache keys."""
+    text_extraction = settings.PDF_TEXT_EXTRACTION_ENABLED and PdfReader is not None
+    return {
+        'cases_per_turn': settings.CASE_SERIES_CASES_PER_TURN,
+        'max_turns': settings.CASE_SERIES_MAX_TURNS,
+        'text_extraction': text_extraction and {
+            'min_chars_per_page': settings.PDF_TEXT_MIN_CHARS_PER_PAGE,
+            'min_confidence': settings.PDF_TEXT_MIN_CONFIDENCE,
+        },
+    }
+
+
+def case_series_prompt(prompt):
+    per_turn = settings.CASE_SERIES_CASES_PER_TURN
+    if not per_turn:
+        return prompt
+    return prompt + CASE_SERIES_PROMPT.format(per_turn=per_turn)
+
+
+def _merge_cases(case_results, new_cases):
+    # Models sometimes repeat the last case of the previous turn
+    for case in new_cases:
+        if case not in case_results:
+            case_results.append(case)
+
+
+def _conversation(pdf_doc, parts, template, model_name, turns, replies, on_turn=None):
+    """The case-series conversation with one model, as a generator of requests.
+
+    Yields ``(messages, model_name, generation_config, on_text)`` for each
+    call and is sent back the ``LLMResponse``, so the same steps run under
+    blocking ``chat`` and under ``achat`` (see ``_run`` and ``_arun``).
+    ``on_text`` is None unless the reply should be streamed to it. ``turns``
+    holds the parsed replies to resume from and receives new ones; every raw
+    reply is also appended to ``replies``. Returns ``(case_results, missing_fields)``.
+    """
+    case_results, missing = [], set()
+    config = generation_config(template)
+    structured = 'response_schema' in config
+    streaming = settings.LLM_STREAMING and on_turn is not None
+    started = time.monotonic() if on_turn is not None and not turns else None
+
+    def first_row(mode):
+        nonlocal started
+        if started is not None:
+            FIRST_ROW_SECONDS.observe(time.monotonic() - started, mode=mode)
+            started = None
+    messages = [{'role': 'user', 'parts': parts + [case_series_prompt(template.prompt)]}]
+
+    def next_cases():
+        return {'role': 'user', 'parts': [NEXT_CASES_PROMPT.format(next_case=len(case_results) + 1)]}
+
+    more = True
+    for text in turns:
+        data, more = parse_extraction(text, missing, template, structured)
+        _merge_cases(case_results, data['case_results'])
+        messages += [{'role': 'model', 'parts': [text]}, next_cases()]
+    if turns:
+        logger.info(f"Resuming {pdf_doc.file.name} after {len(turns)} turn(s), {len(case_results)} case(s)")
+
+    while more and len(turns) < settings.CASE_SERIES_MAX_TURNS:
+        on_text = None
+        if streaming:
+            streamed = list(case_results)
+
+            def on_case(case):
+                if case not in streamed:
+                    streamed.append(case)
+                    first_row('streamed')
+                    on_turn(list(turns), list(streamed))
+            on_text = CaseStream(template, on_case).feed
+
+        response = yield messages, model_name, config, on_text
+        replies.append(response.text)
+        data, more = parse_extraction(response.text, missing, template, structured)
+        turns.append(response.text)
+        _merge_cases(case_results, data['case_results'])
+        if case_results:
+            first_row('whole')
+
+        if more:
+            if on_turn is not None:
+                on_turn(list(turns), list(case_results))
+            logger.info(f"{pdf_doc.file.name}: {len(case_results)} case(s) so far, requesting the next cases")
+            messages += [{'role': 'model', 'parts': [response.text]}, next_cases()]
+
+    if more:
+        logger.warning(f"{pdf_doc.file.name}: stopped after {len(turns)} turns with cases remaining")
+    return case_results, missing
+
+
+def _extraction(pdf_doc, parts, template, turns, replies, on_turn=None):
+    """Fast model first, strong model if needed; a request generator like ``_conversation``.
+
+    Returns ``(case_results, model_name, escalation_reasons)``.
+    """
+    model_name, *fallback = routing_models()
+    try:
+        case_results, missing = yield from _conversation(pdf_doc, parts, template, model_name, turns, replies, on_turn)
+        reasons = escalation_reasons(case_results, missing) if fallback else []
+    except ValueError as e:
+        if not fallback:
+            raise
+        case_results, reasons = [], [f"unparseable reply ({str(e)})"]
+    case_results = tag_model(case_results, model_name)
+
+    if reasons:
+        model_name = fallback[0]
+        logger.info(f"{pdf_doc.file.name}: re-extracting with {model_name}: {'; '.join(reasons)}")
+        escalated, _ = yield from _conversation(pdf_doc, parts, template, model_name, [], replies)
+        case_results = merge_cases(case_results, tag_model(escalated, model_name))
+    return case_results, model_name, reasons
+
+
+def _run(steps, client):
+    """Drive a request generator with blocking ``chat`` calls and return its result."""
+    try:
+        request = next(steps)
+        while True:
+            messages, model_name, config, on_text = request
+            response = client.chat(messages, model_name=model_name, generation_config=config, on_text=on_text)
+            request = steps.send(response)
+    except StopIteration as done:
+        return done.value
+
+
+async def _arun(steps, client):
+    """Drive a request generator with awaited ``achat`` calls and return its result."""
+    try:
+        request = next(steps)
+        while True:
+            messages, model_name, config, on_text = request
+            response = await client.achat(messages, model_name=model_name, generation_config=config, on_text=on_text)
+            request = steps.send(response)
+    except StopIteration as done:
+        return done.value
+
+
+def _success(template, outcome, turns, replies, pages):
+    case_results, model_name, reasons = outcome
+    return {
+        'success': True,
+        'parsed_json': {'case_results': case_results},
+        'raw_text': '\n\n'.join(replies),
+        'turns': turns,
+        'model': model_name,
+        'escalation': reasons,
+        'warnings': template.validate(case_results),
+        'pages': pages,
+    }
+
+
+def _failure(error, turns, replies):
+    result = {
+        'success': False,
+        'error': str(error),
+        'raw_text': replies[-1] if replies else 'No response text available',
+        'turns': turns
+    }
+    if isinstance(error, ValueError):
+        logger.error(f"JSON parsing error: {error}")
+        result['error'] = f"Failed to parse response as JSON: {str(error)}"
+    elif isinstance(error, LLMError):
+        logger.error(f"LLM call failed in process_pdf_with_gemini: {str(error)}")
+        result.update(retryable=is_retryable(error.status), retry_after=error.retry_after)
+    else:
+        logger.error(f"Error in process_pdf_with_gemini: {str(error)}")
+    return result
+
+
+def process_pdf_with_gemini(pdf_doc, prompt=None, on_turn=None, resume_turns=None, pages=None):
+    """Extract a document, escalating from the fast to the strong model when needed.
+
+    ``turns``, ``on_turn`` and ``resume_turns`` cover the first model's
+    conversation only; an escalation is cheap to repeat from scratch.
+    ``pages`` are saved page texts loaded by the caller; otherwise the PDF
+    is read here and the result carries the texts for the caller to save.
+    ``prompt`` is a ``PromptTemplate`` or prompt text; values failing the
+    template's validators are listed under ``warnings``.
+    """
+    turns = list(resume_turns or [])
+    replies = list(turns)
+    try:
+        client = get_llm_client()
+        template = as_template(prompt)
+        if pages is None:
+            pages = read_pages(pdf_doc)
+
+        with document_parts(pdf_doc, client, pages) as parts:
+            outcome = _run(_extraction(pdf_doc, parts, template, turns, replies, on_turn), client)
+        return _success(template, outcome, turns, replies, pages)
+    except Exception as e:
+        return _failure(e, turns, replies)
+    finally:
+        # Pool threads touch the ORM through the rate limiter; don't leak their connections
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+
+
+@asynccontextmanager
+async def adocument_parts(pdf_doc, client, pages=None):
+    """``document_parts`` with reading, text extraction and uploads run in a thread."""
+    parts = document_parts(pdf_doc, client, pages)
+    value = await asyncio.to_thread(parts.__enter__)
+    try:
+        yield value
+    finally:
+        await asyncio.to_thread(parts.__exit__, None, None, None)
+
+
+async def aprocess_pdf_with_gemini(pdf_doc, prompt=None, on_turn=None, resume_turns=None, pages=None):
+    """``process_pdf_with_gemini`` for the event loop.
+
+    Model calls are awaited through ``LLMClient.achat`` and file work is
+    offloaded to threads, so one loop keeps many documents in flight.
+    ``on_turn`` is called on the loop and must not block.
+    """
+    turns = list(resume_turns or [])
+    replies = list(turns)
+    try:
+        client = get_llm_client()
+        template = as_template(prompt)
+        if pages is None:
+            pages = await asyncio.to_thread(read_pages, pdf_doc)
+
+        async with adocument_parts(pdf_doc, client, pages) as parts:
+            outcome = await _arun(_extraction(pdf_doc, parts, template, turns, replies, on_turn), client)
+        return _success(template, outcome, turns, replies, pages)
+    except Exception as e:
+        return _failure(e, turns, replies)
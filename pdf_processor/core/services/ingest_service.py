@@ -0,0 +1,134 @@
+# core/services/ingest_service.py
+"""Adding PDFs to a job from the file system, for ``manage.py ingest_pdfs``.
+
+A source is a directory (searched recursively), a glob pattern or a ZIP
+archive. Files are found lazily and copied into ``PDFDocument`` storage
+one at a time in chunks, so an archive of a thousand papers is never
+held in memory. The SHA-256 the extraction cache and duplicate detection
+need is computed during the copy rather than by reading the file again,
+and the page texts are read and saved (``DocumentPage``) once, here, so
+they are indexed for evidence search before extraction starts. The
+duplicate-detection fingerprint is made from them at the same time, so
+the job's coordinating thread does not work it out before the first call.
+
+Each document records where it came from in ``PDFDocument.source``. An
+interrupted ingest can be resumed into the same job: sources it already
+holds are skipped.
+"""
+import glob
+import hashlib
+import logging
+import os
+import zipfile
+
+from django.conf import settings
+from django.core.files import File
+
+from ..models import PDFDocument
+from .dedupe_service import fingerprint_document
+from .pdf_service import read_pages, store_pages
+
+logger = logging.getLogger(__name__)
+
+PDF_MAGIC = b'%PDF-'
+GLOB_CHARS = frozenset('*?[')
+
+
+class _HashingReader:
+    """Read-only file wrapper that hashes what is read through it."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.digest.update(data)
+        return data
+
+
+def _is_pdf(name):
+    return name.lower().endswith('.pdf')
+
+
+def _directory_files(path):
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if _is_pdf(name):
+                full_path = os.path.join(root, name)
+                yield os.path.abspath(full_path), name, lambda full_path=full_path: open(full_path, 'rb')
+
+
+def _archive_files(path):
+    archive_path = os.path.abspath(path)
+    with zipfile.ZipFile(archive_path) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and _is_pdf(info.filename):
+                yield f'{archive_path}:{info.filename}', os.path.basename(info.filename), \
+                    lambda info=info: archive.open(info)
+
+
+def iter_sources(paths):
+    """Yield ``(source, file name, open)`` for every PDF under ``paths``.
+
+    ``source`` identifies the file for resuming and ``open()`` returns a
+    binary file object. Raises ValueError for a path that does not exist.
+    """
+    for path in paths:
+        if GLOB_CHARS & set(path):
+            for match in sorted(glob.iglob(path, recursive=True)):
+                if os.path.isfile(match) and _is_pdf(match):
+                    yield os.path.abspath(match), os.path.basename(match), \
+                        lambda match=match: open(match, 'rb')
+        elif os.path.isdir(path):
+            yield from _directory_files(path)
+        elif zipfile.is_zipfile(path):
+            yield from _archive_files(path)
+        elif os.path.isfile(path):
+            yield os.path.abspath(path), os.path.basename(path), lambda path=path: open(path, 'rb')
+        else:
+            raise ValueError(f"No such file, directory or pattern: {path}")
+
+
+def add_document(job, source, name, open_file):
+    """Copy one PDF into storage as a document of ``job``.
+
+    Returns the document, or None when the file does not start like a PDF.
+    """
+    with open_file() as fileobj:
+        if fileobj.read(len(PDF_MAGIC)) != PDF_MAGIC:
+            logger.warning(f"Skipping {source}: not a PDF")
+            return None
+        fileobj.seek(0)
+        reader = _HashingReader(fileobj)
+        pdf_doc = PDFDocument(job=job, source=source[:1000])
+        pdf_doc.file.save(name, File(reader, name=name), save=False)
+    pdf_doc.sha256 = reader.digest.hexdigest()
+    pdf_doc.save()
+    pages = read_pages(pdf_doc)
+    store_pages(pdf_doc, pages)
+    if settings.DEDUPE_ENABLED:
+        fingerprint_document(pdf_doc, pages)
+    return pdf_doc
+
+
+def ingest(job, paths, on_file=None):
+    """Add the PDFs under ``paths`` that ``job`` does not hold yet.
+
+    ``on_file(source, outcome)`` is called for each file with ``added``,
+    ``present`` (already in the job) or ``skipped`` (not a PDF). Returns
+    the count of each outcome.
+    """
+    known = set(job.documents.values_list('source', flat=True))
+    counts = {'added': 0, 'present': 0, 'skipped': 0}
+    for source, name, open_file in iter_sources(paths):
+        if source in known:
+            outcome = 'present'
+        else:
+            outcome = 'added' if add_document(job, source, name, open_file) else 'skipped'
+            known.add(source)
+        counts[outcome] += 1
+        if on_file is not None:
+            on_file(source, outcome)
+    return counts
@@ -0,0 +1,378 @@
+# core/services/json_repair.py
+"""Single-pass, tolerant JSON parser for LLM output.
+
+Model replies wrap JSON in prose and code fences, and they make mistakes
+real parsers reject: trailing or missing commas, comments, unquoted keys,
+single quotes, Python literals, bare words and ``...`` placeholders.
+Replies cut off at the token limit end mid-value. ``JSONRepairParser``
+reads all of these in one pass over the characters, with no regex
+rewriting beforehand and no retry. It skips text before the first ``{``
+or ``[`` and stops after the matching close, so prose afterwards (even
+with braces) is ignored. ``parse_json`` tries the C decoder first and
+only falls back to this parser for replies it rejects; inside those,
+each nested value that is well-formed is still handed to the C decoder
+whole.
+
+A bare value runs to the next ``,``, ``}``, ``]`` or line break, so
+``45 years`` is one string rather than a value and a stray key. A quote
+directly followed by a letter or digit is part of the string, not its
+end.
+
+The parser is incremental: ``feed`` can be called with chunks as they
+stream in. ``value`` always holds what has been parsed so far, and
+``on_complete(path, value)`` fires for each object or array as soon as
+it closes.
+"""
+import json
+import re
+from json.decoder import scanstring
+
+_decoder = json.JSONDecoder()
+
+_MISSING = object()
+
+_LITERALS = {
+    'true': True, 'false': False, 'null': None,
+    'True': True, 'False': False, 'None': None,
+}
+_NUMBER_RE = re.compile(r'-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?$')
+# Characters that end a run of plain string content or a bare literal
+_STRING_SPECIAL = {'"': re.compile(r'["\\]'), "'": re.compile(r"['\\]")}
+_LITERAL_END_RE = re.compile(r'[\s,:{}\[\]"\'/]')
+_VALUE_END_RE = re.compile(r'[,}\]\n]|/[/*]')
+_SEPARATORS_RE = re.compile(r'[\s,:]*')
+# Well-formed values shorter than this are not worth a C decoder attempt that may fail
+_DECODE_MIN = 64
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', '/': '/', '\\': '\\', '"': '"', "'": "'"}
+
+
+class _Frame:
+    __slots__ = ('container', 'path', 'key')
+
+    def __init__(self, container, path):
+        self.container = container
+        self.path = path
+        # Object frames: the key waiting for its value
+        self.key = None
+
+
+class JSONRepairParser:
+    def __init__(self, on_complete=None):
+        self.on_complete = on_complete
+        self.value = _MISSING
+        # True once the top-level value has closed
+        self.done = False
+        self._stack = []
+        self._token = None
+        self._buf = []
+        self._quote = None
+        self._literal_end = _LITERAL_END_RE
+        self._pending = ''
+        # Unread text after the top-level value closed
+        self.rest = ''
+
+    @property
+    def started(self):
+        return self.value is not _MISSING
+
+    def feed(self, text):
+        if self._pending:
+            text, self._pending = self._pending + text, ''
+        i, n = 0, len(text)
+        # Where the C decoder last gave up; containers that would close before it are short
+        failed_at = -1
+        while i < n and not self.done:
+            token = self._token
+            if token is None:
+                ch = text[i]
+                if not self._stack:
+                    # Skip prose and code fences before the top-level value
+                    i = _first_value_start(text, i)
+                    if i < 0:
+                        return self
+                    self._open({} if text[i] == '{' else [])
+                    i += 1
+                    continue
+                if ch in ' \t\r\n,:':
+                    i = _SEPARATORS_RE.match(text, i).end()
+                elif ch == '"' or ch == "'":
+                    if ch == '"':
+                        try:
+                            value, end = scanstring(text, i + 1)
+                        except ValueError:
+                            pass
+                        else:
+                            if end < n and not text[end].isalnum():
+                                self._add(value, quoted=True)
+                                i = end
+                                continue
+                    self._token = 'string'
+                    self._quote = ch
+                    self._buf = []
+                    i += 1
+                elif ch == '{' or ch == '[':
+                    if not i < failed_at < i + _DECODE_MIN and not self._at_key():
+                        try:
+                            value, end = _decoder.raw_decode(text, i)
+                        except json.JSONDecodeError as error:
+                            failed_at = error.pos
+                        else:
+                            self._add_closed(value)
+                            i = end
+                            continue
+                    self._open({} if ch == '{' else [])
+                    i += 1
+                elif ch == '}' or ch == ']':
+                    self._close(dict if ch == '}' else list)
+                    i += 1
+                elif ch == '/':
+                    self._token = 'slash'
+                    i += 1
+                else:
+                    self._start_literal([])
+                continue
+            if token == 'string':
+                match = _STRING_SPECIAL[self._quote].search(text, i)
+                if match is None:
+                    self._buf.append(text[i:])
+                    return self
+                self._buf.append(text[i:match.start()])
+                i = match.start()
+                if text[i] == '\\':
+                    size = 6 if text[i + 1:i + 2] == 'u' else 2
+                    if i + size > n:
+                        # Escape split across chunks; finish it with the next one
+                        self._pending = text[i:]
+                        return self
+                    self._escape(text[i + 1:i + size])
+                    i += size
+                elif i + 1 == n:
+                    # A quote at the end of the chunk may still turn out to be inside the string
+                    self._pending = text[i:]
+                    return self
+                elif text[i + 1].isalnum():
+                    # An unescaped quote inside the string, as in "x"y"
+                    self._buf.append(text[i])
+                    i += 1
+                else:
+                    self._end_string()
+                    i += 1
+                continue
+            if token == 'literal':
+                match = self._literal_end.search(text, i)
+                if match is None:
+                    if text.endswith('/'):
+                        # Maybe the start of a comment; decide with the next chunk
+                        self._buf.append(text[i:n - 1])
+                        self._pending = '/'
+                    else:
+                        self._buf.append(text[i:])
+                    return self
+                self._buf.append(text[i:match.start()])
+                i = match.start()
+                self._end_literal()
+                continue
+            if token == 'line_comment':
+                end = text.find('\n', i)
+                if end < 0:
+                    return self
+                self._token = None
+                i = end + 1
+                continue
+            if token == 'block_comment':
+                end = text.find('*/', i)
+                if end < 0:
+                    # Keep a trailing '*' in case the '/' arrives in the next chunk
+                    self._token = 'block_comment_star' if text.endswith('*') else token
+                    return self
+                self._token = None
+                i = end + 2
+                continue
+            if token == 'block_comment_star':
+                self._token = None if text[i] == '/' else 'block_comment'
+                i += 1
+                continue
+            if token == 'slash':
+                self._token = None
+                if text[i] == '/':
+                    self._token = 'line_comment'
+                    i += 1
+                    continue
+                if text[i] == '*':
+                    self._token = 'block_comment'
+                    i += 1
+                    continue
+                self._start_literal(['/'])
+                continue
+        if self.done:
+            self.rest = text[i:]
+        return self
+
+    def finish(self):
+        """Close whatever is still open and return ``(value, complete)``.
+
+        A string cut off mid-value is kept as far as it got; a key without
+        a value is dropped.
+        """
+        complete = self.done
+        if self._pending == '/' and self._token == 'literal':
+            self._buf.append(self._pending)
+        self._pending = ''
+        if self._token == 'string':
+            self._end_string()
+        elif self._token in ('literal', 'slash'):
+            if self._token == 'slash':
+                self._buf = ['/']
+            self._end_literal()
+        self._token = None
+        # Paths of the containers the text left open
+        self.open_paths = [frame.path for frame in self._stack if frame.path is not None]
+        self._stack.clear()
+        if self.value is _MISSING:
+            raise ValueError("No valid JSON found in response")
+        return self.value, complete
+
+    def _escape(self, text):
+        char = text[0] if text else ''
+        if char == 'u':
+            try:
+                self._buf.append(chr(int(text[1:5], 16)))
+            except ValueError:
+                self._buf.append('\\' + text)
+        else:
+            self._buf.append(_ESCAPES.get(char, char))
+
+    def _end_string(self):
+        self._token = None
+        self._add(''.join(self._buf), quoted=True)
+
+    def _at_key(self):
+        frame = self._stack[-1]
+        return isinstance(frame.container, dict) and frame.key is None
+
+    def _start_literal(self, buf):
+        self._token = 'literal'
+        self._buf = buf
+        # Keys stop at the first separator; values run to the end of the member
+        self._literal_end = _LITERAL_END_RE if self._at_key() else _VALUE_END_RE
+
+    def _end_literal(self):
+        self._token = None
+        text = ''.join(self._buf).strip()
+        if not text:
+            return
+        frame = self._stack[-1] if self._stack else None
+        if text.strip('.…') == '':
+            # "..." placeholders for omitted items
+            return
+        if frame is not None and isinstance(frame.container, dict) and frame.key is None:
+            self._add(text, quoted=True)
+        elif text in _LITERALS:
+            self._add(_LITERALS[text])
+        elif _NUMBER_RE.match(text):
+            self._add(float(text) if any(c in text for c in '.eE') else int(text))
+        else:
+            self._add(text)
+
+    def _add(self, value, quoted=False):
+        if not self._stack:
+            self.value = value
+            self.done = True
+            return
+        frame = self._stack[-1]
+        container = frame.container
+        if isinstance(container, list):
+            container.append(value)
+        elif frame.key is None:
+            # Values in key position are keys (this also absorbs missing commas)
+            frame.key = value if quoted else str(value)
+        else:
+            container[frame.key] = value
+            frame.key = None
+
+    def _add_closed(self, value):
+        """Add a value the C decoder read whole, reporting its containers as closed."""
+        frame = self._stack[-1]
+        if frame.path is not None and self.on_complete is not None and isinstance(value, (dict, list)):
+            key = len(frame.container) if isinstance(frame.container, list) else frame.key
+            self._report(frame.path + (key,), value)
+        self._add(value)
+
+    def _report(self, path, value):
+        items = value.items() if isinstance(value, dict) else enumerate(value)
+        for key, item in items:
+            if isinstance(item, (dict, list)):
+                self._report(path + (key,), item)
+        self.on_complete(path, value)
+
+    def _open(self, container):
+        if not self._stack:
+            self.value = container
+            path = ()
+        else:
+            frame = self._stack[-1]
+            parent = frame.container
+            if isinstance(parent, list):
+                path = frame.path + (len(parent),)
+                parent.append(container)
+            elif frame.key is not None:
+                path = frame.path + (frame.key,)
+                parent[frame.key] = container
+                frame.key = None
+            else:
+                # A container where a key belongs; parse it but keep it out of the result
+                path = None
+        self._stack.append(_Frame(container, path))
+
+    def _close(self, kind):
+        if not any(isinstance(frame.container, kind) for frame in self._stack):
+            # Stray bracket
+            return
+        while self._stack:
+            frame = self._stack.pop()
+            if self.on_complete is not None and frame.path is not None:
+                self.on_complete(frame.path, frame.container)
+            if isinstance(frame.container, kind):
+                break
+        if not self._stack:
+            self.done = True
+
+
+def _first_value_start(text, start=0):
+    starts = [i for i in (text.find('{', start), text.find('[', start)) if i >= 0]
+    return min(starts) if starts else -1
+
+
+def _is_citation(value, rest):
+    # Prose like "see [1]" ahead of the real payload
+    return isinstance(value, list) and '{' in rest and not any(isinstance(v, (dict, list)) for v in value)
+
+
+def parse_json(text):
+    """Parse the first JSON value in ``text``; returns ``(value, complete)``.
+
+    Well-formed values go through the C decoder; only replies it rejects
+    are walked by ``JSONRepairParser``. ``complete`` is False when the text
+    ended before the value closed.
+    """
+    start = _first_value_start(text)
+    while start >= 0:
+        try:
+            value, end = _decoder.raw_decode(text, start)
+        except ValueError:
+            break
+        if not _is_citation(value, text[end:]):
+            return value, True
+        start = _first_value_start(text, end)
+
+    while True:
+        parser = JSONRepairParser().feed(text)
+        value, complete = parser.finish()
+        if _is_citation(value, parser.rest):
+            text = parser.rest
+            continue
+        return value, complete
+
+
+def repair_json(text):
+    return parse_json(text)[0]
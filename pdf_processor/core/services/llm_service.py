@@ -0,0 +1,585 @@
+# core/services/llm_service.py
+"""Long-lived LLM client with pluggable backends.
+
+``get_llm_client()`` returns one client per process, built from
+``settings.LLM_BACKEND`` the first time it is needed, so API configuration,
+model objects and HTTP connections are reused across calls instead of being
+rebuilt for every document. Backends:
+
+``gemini``  Google Gemini through ``google.generativeai``.
+``stub``    Deterministic in-process responder for offline tests/benchmarks,
+            with optional latency, jitter and simulated 503s.
+``http``    Any server speaking the small JSON protocol served by
+            ``python manage.py run_llm_stub``; connections are kept alive
+            per thread.
+
+Backends implement ``chat(messages, ...)`` where ``messages`` is a list of
+``{'role': 'user' | 'model', 'parts': [...]}`` turns; ``generate(contents)``
+is a single user turn. Parts are strings, ``{'mime_type', 'data'}`` dicts
+with raw bytes, or ``UploadedFile`` handles.
+
+``achat`` is the coroutine version used by the asyncio pipeline. Gemini and
+the stub implement it natively; other backends run ``chat`` in a thread.
+
+``stream``/``astream`` are ``chat``/``achat`` that also pass the reply text
+to an ``on_text`` callback chunk by chunk as it is generated. Gemini and the
+stub stream; the ``http`` protocol has no streaming, so its replies arrive
+as a single chunk.
+"""
+import asyncio
+import base64
+import hashlib
+import http.client
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .metrics import LLM_TOKENS, timed
+from .rate_limiter import RateLimiter, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = 'gemini-1.5-pro'
+DEFAULT_GENERATION_CONFIG = {"temperature": 0.1, "top_p": 0.8, "top_k": 40}
+
+
+class LLMError(Exception):
+    """Raised by backends for failed API calls.
+
+    ``status`` mirrors the HTTP code when known (None for connection errors)
+    and ``retry_after`` carries the server's Retry-After hint in seconds.
+    """
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class LLMResponse:
+    def __init__(self, text, model_name, prompt_tokens=0, output_tokens=0):
+        self.text = text
+        self.model_name = model_name
+        self.prompt_tokens = prompt_tokens
+        self.output_tokens = output_tokens
+
+    def __repr__(self):
+        return f"LLMResponse(model={self.model_name!r}, chars={len(self.text)})"
+
+
+class UploadedFile:
+    """Handle for a file uploaded through a backend's file API."""
+
+    def __init__(self, name, uri, mime_type, raw=None):
+        self.name = name
+        self.uri = uri
+        self.mime_type = mime_type
+        self.raw = raw
+
+
+class LLMBackend:
+    name = None
+
+    def chat(self, messages, model_name, generation_config):
+        raise NotImplementedError
+
+    async def achat(self, messages, model_name, generation_config):
+        return await asyncio.to_thread(self.chat, messages, model_name, generation_config)
+
+    def stream(self, messages, model_name, generation_config, on_text):
+        response = self.chat(messages, model_name, generation_config)
+        on_text(response.text)
+        return response
+
+    async def astream(self, messages, model_name, generation_config, on_text):
+        response = await self.achat(messages, model_name, generation_config)
+        on_text(response.text)
+        return response
+
+    def generate(self, contents, model_name, generation_config):
+        return self.chat([{'role': 'user', 'parts': list(contents)}], model_name, generation_config)
+
+    def upload_file(self, file, mime_type, display_name=None):
+        raise NotImplementedError
+
+    def delete_file(self, name):
+        pass
+
+
+class GeminiBackend(LLMBackend):
+    name = 'gemini'
+
+    def __init__(self):
+        import google.generativeai as genai
+        from google.api_core import exceptions as google_exceptions
+
+        self.genai = genai
+        self.api_error = google_exceptions.GoogleAPICallError
+        self.genai.configure(api_key=settings.GEMINI_API_KEY)
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def get_model(self, model_name):
+        with self._lock:
+            if model_name not in self._models:
+                self._models[model_name] = self.genai.GenerativeModel(model_name)
+            return self._models[model_name]
+
+    def _to_part(self, part):
+        if isinstance(part, UploadedFile):
+            return part.raw
+        if isinstance(part, dict) and not isinstance(part.get('data'), bytes):
+            # The SDK's Blob proto only takes bytes: the one copy of inline data
+            return {**part, 'data': bytes(part['data'])}
+        return part
+
+    def _retry_after(self, error):
+        # 429s carry a google.rpc.RetryInfo detail with the suggested delay
+        for detail in getattr(error, 'details', None) or []:
+            delay = getattr(detail, 'retry_delay', None)
+            if delay is not None:
+                return delay.seconds + delay.nanos / 1e9
+        return None
+
+    def _contents(self, messages):
+        return [
+            {'role': message['role'], 'parts': [self._to_part(part) for part in message['parts']]}
+            for message in messages
+        ]
+
+    def chat(self, messages, model_name, generation_config):
+        model = self.get_model(model_name)
+        try:
+            response = model.generate_content(self._contents(messages), generation_config=generation_config)
+        except self.api_error as e:
+            raise LLMError(str(e), status=e.code, retry_after=self._retry_after(e)) from e
+        return self._response(response, model_name)
+
+    async def achat(self, messages, model_name, generation_config):
+        model = self.get_model(model_name)
+        try:
+            response = await model.generate_content_async(
+                self._contents(messages), generation_config=generation_config
+            )
+        except self.api_error as e:
+            raise LLMError(str(e), status=e.code, retry_after=self._retry_after(e)) from e
+        return self._response(response, model_name)
+
+    def stream(self, messages, model_name, generation_config, on_text):
+        model = self.get_model(model_name)
+        try:
+            response = model.generate_content(
+                self._contents(messages), generation_config=generation_config, stream=True
+            )
+            for chunk in response:
+                on_text(self._chunk_text(chunk))
+        except self.api_error as e:
+            raise LLMError(str(e), status=e.code, retry_after=self._retry_after(e)) from e
+        return self._response(response, model_name)
+
+    async def astream(self, messages, model_name, generation_config, on_text):
+        model = self.get_model(model_name)
+        try:
+            response = await model.generate_content_async(
+                self._contents(messages), generation_config=generation_config, stream=True
+            )
+            async for chunk in response:
+                on_text(self._chunk_text(chunk))
+        except self.api_error as e:
+            raise LLMError(str(e), status=e.code, retry_after=self._retry_after(e)) from e
+        return self._response(response, model_name)
+
+    def _chunk_text(self, chunk):
+        # The closing chunk may carry only the finish reason and usage
+        try:
+            return chunk.text
+        except ValueError:
+            return ''
+
+    def _response(self, response, model_name):
+        usage = getattr(response, 'usage_metadata', None)
+        return LLMResponse(
+            response.text,
+            model_name,
+            prompt_tokens=getattr(usage, 'prompt_token_count', 0) or 0,
+            output_tokens=getattr(usage, 'candidates_token_count', 0) or 0,
+        )
+
+    def upload_file(self, file, mime_type, display_name=None):
+        uploaded = self.genai.upload_file(path=file, mime_type=mime_type, display_name=display_name)
+        return UploadedFile(uploaded.name, uploaded.uri, mime_type, raw=uploaded)
+
+    def delete_file(self, name):
+        self.genai.delete_file(name)
+
+
+def _content_digest(parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            digest.update(part.encode('utf-8'))
+        elif isinstance(part, UploadedFile):
+            digest.update(part.name.encode('utf-8'))
+        elif isinstance(part, dict):
+            data = part.get('data', b'')
+            digest.update(data if isinstance(data, (bytes, memoryview)) else str(data).encode('utf-8'))
+    return digest.hexdigest()
+
+
+# Characters per chunk of a streamed stub reply
+STUB_CHUNK_CHARS = 64
+STUB_PAGING_RE = re.compile(r'only the first (\d+) cases')
+STUB_FIELDS_RE = re.compile(r'Fields to extract:\n((?:\d+\..*(?:\n|$))+)')
+
+
+def stub_response_text(messages, model_name, generation_config=None):
+    """Deterministic reply for a conversation: same input, same output.
+
+    Extraction prompts (anything mentioning ``case_results``) get a fenced
+    JSON block with one to five cases whose values and confidences are
+    derived from a hash of the first user turn. When the prompt asks for
+    cases in batches ("only the first N cases") each model turn returns the
+    next N and adds the "Request the next cases" instruction while cases
+    remain. Field re-extraction prompts get just the listed fields;
+    anything else gets a short echo. When ``generation_config`` carries a
+    ``response_schema`` the JSON is returned bare, as structured output is.
+    """
+    structured = bool((generation_config or {}).get('response_schema'))
+    first_parts = messages[0]['parts']
+    digest = _content_digest(first_parts)
+    prompt = ' '.join(part for part in first_parts if isinstance(part, str))
+    rng = random.Random(digest)
+    fields = STUB_FIELDS_RE.search(prompt)
+    if fields:
+        keys = re.findall(r'^(\d+)\.', fields.group(1), re.M)
+        data = {key: {"value": f"stub-{digest[:6]}-{key}", "confidence": rng.randint(3, 5)} for key in keys}
+        return json.dumps(data) if structured else "```json\n" + json.dumps(data, indent=2) + "\n```"
+    if 'case_results' not in prompt:
+        return f"Stub response from {model_name} ({digest[:8]})"
+
+    cases = []
+    for case_number in range(1, rng.randint(1, 5) + 1):
+        case = {}
+        for i in range(16):
+            case[str(i)] = {
+                "value": f"stub-{digest[:6]}-{case_number}-{i}",
+                "confidence": rng.randint(1, 5),
+            }
+        cases.append(case)
+
+    data = {"case_results": cases}
+    paging = STUB_PAGING_RE.search(prompt)
+    if paging:
+        per_turn = int(paging.group(1))
+        start = per_turn * sum(1 for message in messages if message['role'] == 'model')
+        data = {"case_results": cases[start:start + per_turn]}
+        if start + per_turn < len(cases):
+            data["instruction"] = {"value": "Request the next cases", "confidence": 5}
+    return json.dumps(data) if structured else "```json\n" + json.dumps(data, indent=2) + "\n```"
+
+
+class StubBackend(LLMBackend):
+    name = 'stub'
+
+    def __init__(self, latency=None, jitter=None, error_rate=None):
+        self.latency = settings.LLM_STUB_LATENCY if latency is None else latency
+        self.jitter = settings.LLM_STUB_JITTER if jitter is None else jitter
+        self.error_rate = settings.LLM_STUB_ERROR_RATE if error_rate is None else error_rate
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def _delay(self):
+        return self.latency * random.uniform(1 - self.jitter, 1 + self.jitter) if self.latency else 0
+
+    def _reply(self, messages, model_name, generation_config):
+        if self.error_rate and random.random() < self.error_rate:
+            raise LLMError('Simulated server error', status=503)
+        text = stub_response_text(messages, model_name, generation_config)
+        return LLMResponse(text, model_name, prompt_tokens=estimate_tokens(messages), output_tokens=len(text) // 4)
+
+    def chat(self, messages, model_name, generation_config):
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return self._reply(messages, model_name, generation_config)
+
+    async def achat(self, messages, model_name, generation_config):
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return self._reply(messages, model_name, generation_config)
+
+    def _chunks(self, response):
+        text = response.text
+        return [text[i:i + STUB_CHUNK_CHARS] for i in range(0, len(text), STUB_CHUNK_CHARS)] or ['']
+
+    def stream(self, messages, model_name, generation_config, on_text):
+        # The latency is spread over the chunks, as tokens are over a real reply
+        response = self._reply(messages, model_name, generation_config)
+        chunks = self._chunks(response)
+        delay = self._delay() / len(chunks)
+        for chunk in chunks:
+            if delay:
+                time.sleep(delay)
+            on_text(chunk)
+        return response
+
+    async def astream(self, messages, model_name, generation_config, on_text):
+        response = self._reply(messages, model_name, generation_config)
+        chunks = self._chunks(response)
+        delay = self._delay() / len(chunks)
+        for chunk in chunks:
+            if delay:
+                await asyncio.sleep(delay)
+            on_text(chunk)
+        return response
+
+    def upload_file(self, file, mime_type, display_name=None):
+        digest = hashlib.sha256()
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'rb') as handle:
+                for chunk in iter(lambda: handle.read(1024 * 1024), b''):
+                    digest.update(chunk)
+        else:
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                digest.update(chunk)
+        name = f"files/{digest.hexdigest()[:16]}"
+        with self._lock:
+            self._files[name] = mime_type
+        return UploadedFile(name, f"stub://{name}", mime_type)
+
+    def delete_file(self, name):
+        with self._lock:
+            self._files.pop(name, None)
+
+
+class HTTPBackend(LLMBackend):
+    """Client for the JSON protocol served by ``run_llm_stub``.
+
+    POST /v1/generate  {"model", "messages", "generation_config"} -> {"text", ...}
+    POST /v1/files     raw bytes, Content-Type = mime type      -> {"name", "uri"}
+    DELETE /v1/files/<name>
+    """
+    name = 'http'
+
+    def __init__(self, base_url=None, timeout=None):
+        parts = urlsplit(base_url or settings.LLM_HTTP_URL)
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = settings.LLM_HTTP_TIMEOUT if timeout is None else timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _request(self, method, path, body=None, headers=None):
+        # One retry covers a kept-alive connection the server has since closed
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                if hasattr(body, 'seek'):
+                    body.seek(0)
+                conn.request(method, self.prefix + path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                payload = response.read()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise LLMError(f"Connection to {self.host}:{self.port} failed: {str(e)}") from e
+
+        data = json.loads(payload) if payload else {}
+        if response.status >= 400:
+            raise LLMError(
+                data.get('error', f"HTTP {response.status}"),
+                status=response.status,
+                retry_after=parse_retry_after(response.getheader('Retry-After'))
+            )
+        return data
+
+    def _serialize(self, part):
+        if isinstance(part, str):
+            return {'text': part}
+        if isinstance(part, UploadedFile):
+            return {'file_uri': part.uri, 'mime_type': part.mime_type}
+        return {
+            'mime_type': part['mime_type'],
+            'data': base64.b64encode(part['data']).decode('ascii'),
+        }
+
+    def chat(self, messages, model_name, generation_config):
+        body = json.dumps({
+            'model': model_name,
+            'messages': [
+                {'role': message['role'], 'parts': [self._serialize(part) for part in message['parts']]}
+                for message in messages
+            ],
+            'generation_config': generation_config,
+        })
+        data = self._request('POST', '/v1/generate', body=body, headers={'Content-Type': 'application/json'})
+        return LLMResponse(
+            data['text'],
+            data.get('model', model_name),
+            prompt_tokens=data.get('prompt_tokens', 0),
+            output_tokens=data.get('output_tokens', 0),
+        )
+
+    def upload_file(self, file, mime_type, display_name=None):
+        headers = {'Content-Type': mime_type}
+        if isinstance(file, (str, os.PathLike)):
+            # http.client streams file objects in blocks rather than reading them whole
+            headers['Content-Length'] = str(os.path.getsize(file))
+            with open(file, 'rb') as handle:
+                data = self._request('POST', '/v1/files', body=handle, headers=headers)
+        else:
+            # Streamed likewise; _request rewinds the file before sending
+            headers['Content-Length'] = str(file.seek(0, os.SEEK_END))
+            data = self._request('POST', '/v1/files', body=file, headers=headers)
+        return UploadedFile(data['name'], data['uri'], mime_type)
+
+    def delete_file(self, name):
+        self._request('DELETE', f"/v1/{name}")
+
+
+BACKENDS = {
+    GeminiBackend.name: GeminiBackend,
+    StubBackend.name: StubBackend,
+    HTTPBackend.name: HTTPBackend,
+}
+
+
+def register_backend(backend_class):
+    BACKENDS[backend_class.name] = backend_class
+    return backend_class
+
+
+def estimate_tokens(messages):
+    """Rough pre-call token count used to charge the tokens-per-minute bucket."""
+    tokens = 0
+    for message in messages:
+        for part in message['parts']:
+            if isinstance(part, str):
+                tokens += len(part) // 4
+            else:
+                tokens += settings.LLM_PDF_TOKEN_ESTIMATE
+    return tokens
+
+
+class LLMClient:
+    def __init__(self, backend, rate_limiter=None):
+        self.backend = backend
+        self.rate_limiter = rate_limiter
+
+    def generate(self, contents, model_name=None, generation_config=None):
+        if isinstance(contents, str):
+            contents = [contents]
+        return self.chat([{'role': 'user', 'parts': list(contents)}], model_name, generation_config)
+
+    async def agenerate(self, contents, model_name=None, generation_config=None):
+        if isinstance(contents, str):
+            contents = [contents]
+        return await self.achat([{'role': 'user', 'parts': list(contents)}], model_name, generation_config)
+
+    def chat(self, messages, model_name=None, generation_config=None, on_text=None):
+        """Send ``messages`` and return the ``LLMResponse``.
+
+        With ``on_text`` the reply is streamed and the callback receives
+        each chunk of text as it arrives.
+        """
+        estimate = estimate_tokens(messages)
+        if self.rate_limiter is not None:
+            with timed('rate_limit_wait'):
+                self.rate_limiter.acquire(estimate)
+
+        try:
+            with timed('llm_call'):
+                model_name = model_name or DEFAULT_MODEL
+                config = DEFAULT_GENERATION_CONFIG if generation_config is None else generation_config
+                if on_text is None:
+                    response = self.backend.chat(messages, model_name, config)
+                else:
+                    response = self.backend.stream(messages, model_name, config, on_text)
+        except LLMError as e:
+            if e.status == 429 and self.rate_limiter is not None:
+                self.rate_limiter.penalize(e.retry_after)
+            raise
+
+        self._count_tokens(response)
+        if self.rate_limiter is not None:
+            self.rate_limiter.record_usage(estimate, response.prompt_tokens + response.output_tokens)
+        return response
+
+    async def achat(self, messages, model_name=None, generation_config=None, on_text=None):
+        """``chat`` for the event loop; quota waits sleep without holding a thread."""
+        estimate = estimate_tokens(messages)
+        if self.rate_limiter is not None:
+            with timed('rate_limit_wait'):
+                await self.rate_limiter.aacquire(estimate)
+
+        try:
+            with timed('llm_call'):
+                model_name = model_name or DEFAULT_MODEL
+                config = DEFAULT_GENERATION_CONFIG if generation_config is None else generation_config
+                if on_text is None:
+                    response = await self.backend.achat(messages, model_name, config)
+                else:
+                    response = await self.backend.astream(messages, model_name, config, on_text)
+        except LLMError as e:
+            if e.status == 429 and self.rate_limiter is not None:
+                await sync_to_async(self.rate_limiter.penalize)(e.retry_after)
+            raise
+
+        self._count_tokens(response)
+        if self.rate_limiter is not None:
+            await sync_to_async(self.rate_limiter.record_usage)(
+                estimate, response.prompt_tokens + response.output_tokens
+            )
+        return response
+
+    def _count_tokens(self, response):
+        LLM_TOKENS.inc(response.prompt_tokens, model=response.model_name, kind='prompt')
+        LLM_TOKENS.inc(response.output_tokens, model=response.model_name, kind='output')
+
+    def upload_file(self, file, mime_type, display_name=None):
+        return self.backend.upload_file(file, mime_type, display_name=display_name)
+
+    def delete_file(self, name):
+        return self.backend.delete_file(name)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """Return the process-wide client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                backend_class = BACKENDS[settings.LLM_BACKEND]
+                logger.info(f"Initialising {backend_class.name} LLM backend")
+                rate_limiter = RateLimiter()
+                _client = LLMClient(backend_class(), rate_limiter if rate_limiter.enabled else None)
+    return _client
+
+
+def reset_llm_client():
+    """Drop the cached client so the next call rebuilds it from settings."""
+    global _client
+    with _client_lock:
+        _client = None
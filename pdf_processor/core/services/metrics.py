@@ -0,0 +1,225 @@
+# core/services/metrics.py
+"""In-process metrics in the Prometheus text exposition format.
+
+Every process (web server, each worker) keeps its own counters and
+histograms; Prometheus scrapes the web process at ``/metrics/`` and each
+worker on the port given to ``run_worker --metrics-port``. Pipeline stages
+are timed with ``timed('stage')``:
+
+``upload_save``   storing an upload and creating its job and documents
+``file_read``     hashing / mapping the PDF from storage
+``text_extract``  pypdf text layer and section selection
+``encode``        building the inline part or uploading through the file API
+``rate_limit_wait``  time held by the shared rate limiter
+``llm_call``      the model round trip
+``parse``         JSON recovery of a reply
+``normalize``     padding cases to the expected fields
+``db_write``      saving a result and its normalised cases
+``render``        rendering the results page
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.label_names)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{name}{labels} {value}' for name, labels, value in self.samples())
+        return '\n'.join(lines)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f'{self.name}_total', _label_text(self.label_names, key), value
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, _label_text(self.label_names, key), value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += 1
+            state[2] += value
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[1] if state else 0
+
+    def totals(self):
+        """``{label values: (count, sum)}`` for every series observed so far."""
+        with self._lock:
+            return {key: (count, total) for key, (_, count, total) in self._values.items()}
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, ([*counts], count, total)) for key, (counts, count, total) in self._values.items())
+        for key, (counts, count, total) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _label_text(self.label_names + ('le',), key + (f'{bound:g}',))
+                yield f'{self.name}_bucket', labels, cumulative
+            labels = _label_text(self.label_names, key)
+            yield f'{self.name}_bucket', _label_text(self.label_names + ('le',), key + ('+Inf',)), count
+            yield f'{self.name}_count', labels, count
+            yield f'{self.name}_sum', labels, float(total)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self, extra=()):
+        return '\n'.join(metric.render() for metric in [*self.metrics, *extra]) + '\n'
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    'pdf_processor_stage_seconds', 'Time spent in each pipeline stage.', labels=('stage',)
+))
+STAGE_ERRORS = registry.register(Counter(
+    'pdf_processor_stage_errors', 'Pipeline stages that raised.', labels=('stage',)
+))
+REQUEST_SECONDS = registry.register(Histogram(
+    'pdf_processor_http_request_seconds', 'Request latency by view.', labels=('view', 'method', 'status')
+))
+REQUEST_QUERIES = registry.register(Histogram(
+    'pdf_processor_http_request_db_queries', 'Database queries per request by view.',
+    labels=('view', 'method'), buckets=QUERY_BUCKETS
+))
+LLM_TOKENS = registry.register(Counter(
+    'pdf_processor_llm_tokens', 'Tokens reported by the LLM backend.', labels=('model', 'kind')
+))
+STRUCTURED_REPLIES = registry.register(Counter(
+    'pdf_processor_structured_replies', 'Structured-output replies by whether they matched the schema.',
+    labels=('result',)
+))
+DUPLICATES = registry.register(Counter(
+    'pdf_processor_duplicates', 'Uploads recognised as an earlier document, by what matched.', labels=('match',)
+))
+CACHE_LOOKUPS = registry.register(Counter(
+    'pdf_processor_cache_lookups', 'Extraction cache lookups in this process, by result.', labels=('result',)
+))
+FIRST_ROW_SECONDS = registry.register(Histogram(
+    'pdf_processor_first_row_seconds', 'Time from the first model request of a document to its first extracted case.',
+    labels=('mode',)
+))
+
+
+@contextmanager
+def timed(stage):
+    """Record how long the block takes under ``stage``."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def render_metrics(extra=()):
+    """The registry in text format, plus ``extra`` metrics computed for this scrape."""
+    return registry.render(extra)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host=''):
+    """Serve the registry over HTTP from a daemon thread (for workers)."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
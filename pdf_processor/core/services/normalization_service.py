@@ -0,0 +1,229 @@
+# core/services/normalization_service.py
+"""Columnar normalisation of extracted values for analysis.
+
+The model returns free text: "45-year-old", "2 yrs", "Simpson grade II",
+"WHO grade I", "Yes". For meta-analysis these are parsed into typed
+columns. Template fields declare a ``kind`` and each kind has a parser
+that works on a whole pandas column at once, using the ``.str`` regex
+methods and ``numpy.select`` instead of a Python call per cell:
+
+``age``           ``<key> years``   age in years (months, weeks and days converted)
+``months``        ``<key> months``  a duration in months (years, weeks and days converted)
+``resection``     ``<key> extent``  "total" or "subtotal", and ``<key> simpson``, the Simpson grade 1-5
+``who_grade``     ``<key> grade``   WHO grade 1-3
+``flag``          ``<key> flag``    y/n as a boolean
+``vital_status``  ``<key> status``  A/D as "alive" or "deceased"
+
+Values that cannot be parsed become missing (NA) rather than guesses.
+``normalized_cases`` builds the table for a set of jobs from the
+``ExtractedField`` rows in one query; exports call ``normalize_cases`` on
+each chunk of rows they stream.
+"""
+import numpy as np
+import pandas as pd
+
+from ..models import ExtractedField
+from .prompt_registry import job_template
+from .results_service import column_sort_key, job_columns
+
+NUMBER = r'\d+(?:[.,]\d+)?'
+# Optional range ("2-3 months" is read as 2.5) before the unit. A bare "m"
+# is not a unit of age: "45 M" gives the patient's sex.
+RANGE = rf'(?P<low>{NUMBER})(?:\s*(?:-|–|to)\s*(?P<high>{NUMBER}))?\s*-?\s*'
+AGE_RE = RANGE + r'(?P<unit>years?|yrs?|y|months?|mos?|weeks?|wks?|w|days?|d)?\b'
+DURATION_RE = RANGE + r'(?P<unit>years?|yrs?|y|months?|mos?|m|weeks?|wks?|w|days?|d)?\b'
+
+WORD_NUMBERS = {
+    'a': '1', 'an': '1', 'one': '1', 'two': '2', 'three': '3', 'four': '4', 'five': '5', 'six': '6',
+    'seven': '7', 'eight': '8', 'nine': '9', 'ten': '10', 'eleven': '11', 'twelve': '12',
+}
+WORD_NUMBER_RE = r'\b(' + '|'.join(WORD_NUMBERS) + r')\b(?=\s+(?:years?|months?|weeks?|days?)\b)'
+
+# Conversion by the first letter of the unit
+YEARS_PER_UNIT = {'y': 1.0, 'm': 1 / 12, 'w': 7 / 365.25, 'd': 1 / 365.25}
+MONTHS_PER_UNIT = {'y': 12.0, 'm': 1.0, 'w': 12 * 7 / 365.25, 'd': 12 / 365.25}
+
+ROMAN = {'I': 1, 'II': 2, 'III': 3, 'IV': 4, 'V': 5, '1': 1, '2': 2, '3': 3, '4': 4, '5': 5}
+WHO_GRADE_RE = r'GRADE\s*[:\-]?\s*(III|II|I|[1-3])\b'
+BARE_GRADE_RE = r'^\W*(III|II|I|[1-3])\W*$'
+SIMPSON_RE = r'SIMPSON\s*(?:GRADE\s*)?[:\-]?\s*(IV|V|III|II|I|[1-5])\b'
+SUBTOTAL_RE = r'\b(?:sub-?total|partial|near[- ]total|incomplete|debulking|biopsy|str)\b'
+TOTAL_RE = r'\b(?:total|gross|complete|gtr)\b'
+
+FLAGS = {
+    'y': True, 'yes': True, 'true': True, 'present': True, 'positive': True,
+    'n': False, 'no': False, 'none': False, 'false': False, 'absent': False, 'negative': False,
+}
+STATUSES = {
+    'a': 'alive', 'alive': 'alive', 'living': 'alive', 'survived': 'alive',
+    'd': 'deceased', 'dead': 'deceased', 'deceased': 'deceased', 'died': 'deceased', 'expired': 'deceased',
+}
+
+# pandas dtype of each derived column, by suffix
+COLUMN_TYPES = {
+    'years': 'float64',
+    'months': 'float64',
+    'extent': 'string',
+    'simpson': 'Int64',
+    'grade': 'Int64',
+    'flag': 'boolean',
+    'status': 'string',
+}
+
+
+def _text(values):
+    return pd.Series(values, dtype='string').fillna('').str.strip()
+
+
+def _first_word(values):
+    # "n/a" is not a "no"
+    return _text(values).str.lower().str.extract(r'^\W*([a-z]+)\b(?!/)', expand=False)
+
+
+def _number(values):
+    return pd.to_numeric(values.str.replace(',', '.', regex=False), errors='coerce').astype('float64')
+
+
+def _quantity(values, pattern, per_unit, default_unit):
+    """Numbers with an optional range and unit, converted with ``per_unit``."""
+    text = _text(values).str.lower().str.replace(WORD_NUMBER_RE, lambda m: WORD_NUMBERS[m.group(1)], regex=True)
+    parts = text.str.extract(pattern)
+    low, high = _number(parts['low']), _number(parts['high'])
+    factor = parts['unit'].fillna(default_unit).str[0].map(per_unit).astype('float64')
+    return ((low + high.fillna(low)) / 2 * factor).astype('float64')
+
+
+def parse_age(values):
+    return {'years': _quantity(values, AGE_RE, YEARS_PER_UNIT, 'y').round(2)}
+
+
+def parse_months(values):
+    return {'months': _quantity(values, DURATION_RE, MONTHS_PER_UNIT, 'm').round(2)}
+
+
+def _grade(values, pattern):
+    return _text(values).str.upper().str.extract(pattern, expand=False).map(ROMAN).astype('Int64')
+
+
+def parse_who_grade(values):
+    grade = _grade(values, WHO_GRADE_RE)
+    return {'grade': grade.fillna(_grade(values, BARE_GRADE_RE))}
+
+
+def parse_resection(values):
+    """Extent of resection and, where the paper gives it, the Simpson grade.
+
+    Simpson grades I-III count as total resection and IV-V as subtotal.
+    """
+    simpson = _grade(values, SIMPSON_RE)
+    text = _text(values).str.lower()
+    extent = np.select(
+        [simpson.le(3).fillna(False), simpson.ge(4).fillna(False),
+         text.str.contains(SUBTOTAL_RE, regex=True), text.str.contains(TOTAL_RE, regex=True)],
+        ['total', 'subtotal', 'subtotal', 'total'],
+        default=None,
+    )
+    return {'extent': pd.Series(extent, index=text.index, dtype='string'), 'simpson': simpson}
+
+
+def parse_flag(values):
+    return {'flag': _first_word(values).map(FLAGS).astype('boolean')}
+
+
+def parse_vital_status(values):
+    return {'status': _first_word(values).map(STATUSES).astype('string')}
+
+
+PARSERS = {
+    'age': (parse_age, ('years',)),
+    'months': (parse_months, ('months',)),
+    'resection': (parse_resection, ('extent', 'simpson')),
+    'who_grade': (parse_who_grade, ('grade',)),
+    'flag': (parse_flag, ('flag',)),
+    'vital_status': (parse_vital_status, ('status',)),
+}
+
+
+def derived_columns(templates, columns):
+    """``[(name, dtype)]`` of the normalised columns for ``columns`` under ``templates``."""
+    derived = {}
+    for key in columns:
+        for template in templates:
+            kind = template.kinds.get(key)
+            if kind in PARSERS:
+                for suffix in PARSERS[kind][1]:
+                    derived.setdefault(f'{key} {suffix}', COLUMN_TYPES[suffix])
+    return list(derived.items())
+
+
+def normalize_frame(frame, kinds):
+    """Parse the columns of ``frame`` that ``kinds`` (``{field_key: kind}``) names."""
+    parsed = {}
+    for key, kind in kinds.items():
+        if key in frame.columns and kind in PARSERS:
+            parse, _ = PARSERS[kind]
+            for suffix, values in parse(frame[key]).items():
+                parsed[f'{key} {suffix}'] = values
+    return pd.DataFrame(parsed, index=frame.index)
+
+
+def normalize_cases(frame, templates, columns=None):
+    """Normalised columns for a frame of cases from several jobs.
+
+    ``frame`` has a ``job_id`` column and one column of raw values per
+    field key; ``templates`` maps each job id to its template. Jobs that
+    share field kinds are parsed together, so the work is one pass per
+    column rather than one per job.
+    """
+    columns = columns if columns is not None else [c for c in frame.columns if c != 'job_id']
+    names = derived_columns(list(dict.fromkeys(templates.values())), columns)
+    groups = {}
+    for job_id, template in templates.items():
+        kinds = tuple(sorted((key, kind) for key, kind in template.kinds.items() if key in columns))
+        groups.setdefault(kinds, []).append(job_id)
+
+    parts = [
+        normalize_frame(frame[frame['job_id'].isin(job_ids)], dict(kinds))
+        for kinds, job_ids in groups.items() if kinds
+    ]
+    result = pd.concat(parts) if parts else pd.DataFrame(index=frame.index)
+    result = result.reindex(index=frame.index, columns=[name for name, _ in names])
+    return result.astype(dict(names))
+
+
+def case_frame(jobs, columns=None):
+    """Raw values of every case of ``jobs``, one row per case and one column per field key.
+
+    Fields are read with a single query and pivoted by pandas.
+    """
+    columns = columns or job_columns(jobs)
+    fields = ExtractedField.objects.filter(job__in=jobs, field_key__in=columns).values_list(
+        'job_id', 'case__document_id', 'case__case_index', 'field_key', 'value'
+    )
+    index = ['job_id', 'document_id', 'case_index']
+    long = pd.DataFrame.from_records(fields.iterator(chunk_size=10000), columns=index + ['field_key', 'value'])
+    frame = long.set_index(index + ['field_key'])['value'].unstack('field_key')
+    frame = frame.reindex(columns=sorted(columns, key=column_sort_key)).sort_index().reset_index()
+    frame.columns.name = None
+    return frame
+
+
+def normalized_cases(jobs, columns=None):
+    """Raw and normalised columns for every case of ``jobs`` as one DataFrame."""
+    jobs = list(jobs)
+    columns = columns or job_columns(jobs)
+    frame = case_frame(jobs, columns)
+    normalized = normalize_cases(frame, {job.id: job_template(job) for job in jobs}, columns)
+    return pd.concat([frame, normalized], axis=1)
+
+
+def normalize_chunk(job_ids, values, templates, columns):
+    """Normalised values for a chunk of exported rows, as lists of Python values.
+
+    ``values`` holds one ``{field_key: raw value}`` dict per row and
+    ``job_ids`` the job of each row; missing results are None.
+    """
+    frame = pd.DataFrame.from_records(values, columns=columns)
+    frame['job_id'] = job_ids
+    normalized = normalize_cases(frame, templates, columns).astype(object)
+    return normalized.where(normalized.notna(), None).values.tolist()
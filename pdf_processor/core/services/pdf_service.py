@@ -0,0 +1,308 @@
+# core/services/pdf_service.py
+"""Reading stored PDFs on their way to the LLM.
+
+The old path did ``file.read()`` followed by ``base64.b64encode(...).decode()``,
+holding the PDF roughly 2.3 times in Python memory. Here hashing streams the
+file in fixed-size chunks, small PDFs are sent inline as a view of a
+memory map (the Gemini SDK takes one ``bytes`` copy of it, as its request
+protos need, and the HTTP backend base64-encodes it directly), and PDFs
+above ``GEMINI_INLINE_MAX_BYTES`` are streamed from disk through the LLM
+backend's file API so their bytes never enter the worker's heap.
+
+Before any of that, ``build_text_context`` tries to extract the text layer
+locally and keep only the sections the extraction prompt needs (title page,
+case presentation, results, pathology, follow-up and tables). When the text
+layer is thin, as with scanned papers, it returns None and the caller sends
+the full PDF instead. Page texts are saved as ``DocumentPage`` rows with
+the result, so later requests for the same document skip pypdf.
+"""
+import hashlib
+import logging
+import mmap
+import re
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+
+from ..models import DocumentPage
+from .llm_service import get_llm_client
+from .metrics import timed
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # pragma: no cover - text extraction is optional
+    PdfReader = None
+
+logger = logging.getLogger(__name__)
+
+PDF_MIME_TYPE = 'application/pdf'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Section headings as they appear in case reports, mapped to whether the
+# section carries fields from MEDICAL_REVIEW_PROMPT
+SECTION_HEADINGS = {
+    'abstract': True,
+    'summary': True,
+    'introduction': False,
+    'background': False,
+    'case presentation': True,
+    'case report': True,
+    'case reports': True,
+    'case description': True,
+    'case history': True,
+    'case series': True,
+    'clinical presentation': True,
+    'patients and methods': True,
+    'materials and methods': False,
+    'methods': False,
+    'results': True,
+    'treatment': True,
+    'surgery': True,
+    'operative findings': True,
+    'pathology': True,
+    'histopathology': True,
+    'pathological findings': True,
+    'outcome': True,
+    'follow-up': True,
+    'discussion': False,
+    'conclusion': False,
+    'conclusions': False,
+    'acknowledgements': False,
+    'acknowledgments': False,
+    'references': False,
+}
+HEADING_RE = re.compile(
+    r'^\s*(?:\d+(?:\.\d+)*\.?\s+)?(%s)\s*:?\s*$' % '|'.join(
+        re.escape(heading) for heading in sorted(SECTION_HEADINGS, key=len, reverse=True)
+    ),
+    re.IGNORECASE
+)
+TABLE_CAPTION_RE = re.compile(r'^\s*table\s+[0-9IVX]+\b', re.IGNORECASE)
+
+
+def _local_path(field_file):
+    try:
+        return field_file.path
+    except NotImplementedError:
+        # Remote storage backends have no filesystem path
+        return None
+
+
+def file_sha256(field_file):
+    """SHA-256 of a stored FileField, read in chunks."""
+    digest = hashlib.sha256()
+    with field_file.open('rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def document_sha256(pdf_doc):
+    """Return the document's content hash, computing and saving it on first use."""
+    if not pdf_doc.sha256:
+        with timed('file_read'):
+            pdf_doc.sha256 = file_sha256(pdf_doc.file)
+        pdf_doc.save(update_fields=['sha256'])
+    return pdf_doc.sha256
+
+
+@contextmanager
+def open_mapped(field_file):
+    """Yield a read-only buffer over the stored file.
+
+    Local files are memory-mapped so the page cache backs the data instead of
+    a private copy; other storages fall back to a plain read.
+    """
+    path = _local_path(field_file)
+    if path is None:
+        with field_file.open('rb') as file:
+            yield file.read()
+        return
+
+    with open(path, 'rb') as file:
+        if file.seek(0, 2) == 0:
+            yield b''
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+def upload_pdf(field_file, display_name=None, client=None):
+    """Stream a stored PDF to the backend's file API and return the file handle."""
+    client = client or get_llm_client()
+    path = _local_path(field_file)
+    if path is not None:
+        return client.upload_file(path, PDF_MIME_TYPE, display_name=display_name)
+    with field_file.open('rb') as file:
+        return client.upload_file(file, PDF_MIME_TYPE, display_name=display_name)
+
+
+@contextmanager
+def pdf_part(pdf_doc, client=None):
+    """Yield the ``generate`` content part for a document's PDF.
+
+    Inline data is a ``memoryview`` that is only valid inside the block.
+    Uploaded files are deleted from the file API once the block exits.
+    """
+    size = pdf_doc.file.size
+    if size <= settings.GEMINI_INLINE_MAX_BYTES:
+        # A view of the map, not a copy: backends read it while the block
+        # runs and the map is closed after
+        with ExitStack() as stack:
+            with timed('encode'):
+                data = stack.enter_context(memoryview(stack.enter_context(open_mapped(pdf_doc.file))))
+            yield {"mime_type": PDF_MIME_TYPE, "data": data}
+        return
+
+    client = client or get_llm_client()
+    logger.info(f"Uploading {pdf_doc.file.name} ({size} bytes) through the file API")
+    with timed('encode'):
+        uploaded = upload_pdf(pdf_doc.file, display_name=pdf_doc.file.name, client=client)
+    try:
+        yield uploaded
+    finally:
+        try:
+            client.delete_file(uploaded.name)
+        except Exception as e:
+            logger.warning(f"Could not delete uploaded file {uploaded.name}: {str(e)}")
+
+
+def extract_pages(field_file):
+    """Return the text layer of each page as ``[{'number': 1, 'text': ...}, ...]``."""
+    if PdfReader is None:
+        return []
+    with field_file.open('rb') as file:
+        reader = PdfReader(file)
+        return [
+            {'number': number, 'text': page.extract_text() or ''}
+            for number, page in enumerate(reader.pages, start=1)
+        ]
+
+
+def split_sections(pages):
+    """Split page text into chunks at recognised section headings.
+
+    Each chunk records its heading (None for the title block), whether it is
+    relevant to the extraction, and the pages it spans. Table captions start
+    their own relevant chunk that runs to the end of the page.
+    """
+    chunks = []
+    current = {'heading': None, 'relevant': True, 'pages': [], 'lines': []}
+    section_relevant = True
+
+    for page in pages:
+        for line in page['text'].splitlines():
+            heading = HEADING_RE.match(line)
+            caption = TABLE_CAPTION_RE.match(line)
+            if heading or caption:
+                if current['lines']:
+                    chunks.append(current)
+                if heading:
+                    section_relevant = SECTION_HEADINGS[heading.group(1).lower()]
+                    current = {'heading': heading.group(1), 'relevant': section_relevant, 'pages': [], 'lines': []}
+                else:
+                    current = {'heading': line.strip(), 'relevant': True, 'table': True, 'pages': [], 'lines': []}
+            if page['number'] not in current['pages']:
+                current['pages'].append(page['number'])
+            current['lines'].append(line)
+
+        if current.get('table'):
+            # Tables end with their page; the surrounding section resumes
+            chunks.append(current)
+            current = {'heading': None, 'relevant': section_relevant, 'pages': [], 'lines': []}
+
+    if current['lines']:
+        chunks.append(current)
+
+    for chunk in chunks:
+        chunk['text'] = '\n'.join(chunk.pop('lines')).strip()
+    return [chunk for chunk in chunks if chunk['text']]
+
+
+def _page_label(numbers):
+    if len(numbers) == 1:
+        return f"[Page {numbers[0]}]"
+    return f"[Pages {numbers[0]}-{numbers[-1]}]"
+
+
+def extraction_confidence(pages, chunks):
+    """Score 0-1 for how much the local text layer can be trusted."""
+    if not pages:
+        return 0.0
+    min_chars = settings.PDF_TEXT_MIN_CHARS_PER_PAGE
+    text_pages = sum(1 for page in pages if len(page['text'].strip()) >= min_chars)
+    coverage = text_pages / len(pages)
+    found_case_sections = any(chunk['relevant'] and chunk['heading'] for chunk in chunks)
+    return coverage if found_case_sections else coverage * 0.5
+
+
+def read_pages(pdf_doc):
+    """Page texts of a document read with pypdf, or None when disabled or unreadable."""
+    if not settings.PDF_TEXT_EXTRACTION_ENABLED or PdfReader is None:
+        return None
+    try:
+        with timed('text_extract'):
+            return extract_pages(pdf_doc.file)
+    except Exception as e:
+        logger.warning(f"Text extraction failed for {pdf_doc.file.name}: {str(e)}")
+        return None
+
+
+def saved_pages(documents):
+    """``{document_id: pages}`` for the documents whose page texts are saved, in one query."""
+    pages = {}
+    for document_id, number, text in DocumentPage.objects.filter(document__in=documents).values_list(
+        'document_id', 'number', 'text'
+    ):
+        pages.setdefault(document_id, []).append({'number': number, 'text': text})
+    return pages
+
+
+def document_pages(pdf_doc):
+    """Saved page texts of a document, falling back to ``read_pages``."""
+    if not settings.PDF_TEXT_EXTRACTION_ENABLED or PdfReader is None:
+        return None
+    return saved_pages([pdf_doc]).get(pdf_doc.id) or read_pages(pdf_doc)
+
+
+def store_pages(pdf_doc, pages):
+    """Save a document's page texts unless they are saved already."""
+    if not pages or DocumentPage.objects.filter(document=pdf_doc).exists():
+        return
+    DocumentPage.objects.bulk_create(
+        [DocumentPage(document=pdf_doc, number=page['number'], text=page['text']) for page in pages],
+        ignore_conflicts=True,
+    )
+
+
+def build_text_context(pdf_doc, pages=None):
+    """Return the relevant text of a document, or None to fall back to the PDF.
+
+    ``pages`` are the page texts if the caller already has them. The result
+    holds the selected ``text``, the ``pages`` it came from, the
+    ``confidence`` score and the character counts before and after selection.
+    """
+    if not settings.PDF_TEXT_EXTRACTION_ENABLED or PdfReader is None:
+        return None
+
+    if pages is None:
+        pages = read_pages(pdf_doc)
+        if pages is None:
+            return None
+
+    chunks = split_sections(pages)
+    confidence = extraction_confidence(pages, chunks)
+    if confidence < settings.PDF_TEXT_MIN_CONFIDENCE:
+        logger.info(f"Low text extraction confidence ({confidence:.2f}) for {pdf_doc.file.name}, sending full PDF")
+        return None
+
+    selected = [chunk for chunk in chunks if chunk['relevant']]
+    text = '\n\n'.join(f"{_page_label(chunk['pages'])} {chunk['text']}" for chunk in selected)
+    pages_used = sorted({number for chunk in selected for number in chunk['pages']})
+    return {
+        'text': text,
+        'pages': pages_used,
+        'confidence': confidence,
+        'total_chars': sum(len(page['text']) for page in pages),
+        'selected_chars': len(text),
+    }
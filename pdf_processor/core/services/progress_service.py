@@ -0,0 +1,184 @@
+# core/services/progress_service.py
+"""Job progress pushed to browsers as server-sent events.
+
+Each event loop runs one ``JobWatcher``, shared by every open progress
+stream. A tick costs one query for the ``updated_at`` of all watched jobs,
+no matter how many tabs are open. Documents and results are reloaded only
+for jobs that changed, and the resulting events go to each subscriber's
+queue. Workers bump ``ProcessingJob.updated_at`` whenever a document
+finishes or a case series is checkpointed (``core.tasks.touch_job``).
+
+Events:
+
+``document``  one document changed: status, error and its rows so far
+              (``partial`` while a case series is still being extracted);
+              ``duplicate_of`` names the earlier upload whose rows it reuses
+``status``    job status with total/processed/failed counts
+``done``      the job finished; same payload as ``status``, last event
+"""
+import asyncio
+import json
+import logging
+import os
+import weakref
+from contextlib import asynccontextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count
+
+from ..models import PDFDocument, ProcessingJob, ProcessingResult
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('completed', 'failed')
+
+
+def job_summary(job):
+    counts = dict(
+        job.documents.values_list('status').annotate(n=Count('id')).order_by()
+    )
+    data = {
+        'success': job.status != 'failed',
+        'job_id': job.id,
+        'status': job.status,
+        'total': sum(counts.values()),
+        'processed': counts.get('completed', 0) + counts.get('failed', 0),
+        'failed': counts.get('failed', 0),
+    }
+    if job.error_message:
+        data['error'] = job.error_message
+    return data
+
+
+def job_events(job_id, seen):
+    """Return ``(event, data)`` pairs for what changed since ``seen``.
+
+    ``seen`` maps document ids to the state last reported and is updated
+    in place; pass an empty dict for a full snapshot.
+    """
+    job = ProcessingJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return [('done', {'success': False, 'job_id': job_id, 'status': 'failed', 'error': 'Job not found'})]
+
+    states = {
+        state['id']: state
+        for state in PDFDocument.objects.filter(job_id=job_id).values(
+            'id', 'file', 'status', 'error_message', 'duplicate_of', 'result__updated_at', 'result__complete'
+        )
+    }
+    changed = [doc_id for doc_id, state in sorted(states.items()) if seen.get(doc_id) != state]
+    rows = dict(
+        ProcessingResult.objects.filter(document_id__in=changed).values_list('document_id', 'result_data')
+    )
+
+    events = []
+    for doc_id in changed:
+        state = seen[doc_id] = states[doc_id]
+        events.append(('document', {
+            'document_id': doc_id,
+            'name': os.path.basename(state['file']),
+            'status': state['status'],
+            'error': state['error_message'],
+            'partial': state['result__complete'] is False,
+            'duplicate_of': state['duplicate_of'],
+            'rows': (rows.get(doc_id) or {}).get('case_results', []),
+        }))
+
+    summary = job_summary(job)
+    events.append(('status', summary))
+    if job.status in TERMINAL_STATUSES:
+        events.append(('done', summary))
+    return events
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class JobWatcher:
+    def __init__(self, interval=None):
+        self.interval = settings.PROGRESS_POLL_INTERVAL if interval is None else interval
+        self.subscribers = {}
+        # job id -> [updated_at, {document id: state}] as last broadcast
+        self.state = {}
+        self._task = None
+
+    @asynccontextmanager
+    async def subscribe(self, job_id):
+        queue = asyncio.Queue()
+        self.subscribers.setdefault(job_id, set()).add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        try:
+            yield queue
+        finally:
+            queues = self.subscribers.get(job_id, set())
+            queues.discard(queue)
+            if not queues:
+                self.subscribers.pop(job_id, None)
+                self.state.pop(job_id, None)
+
+    async def _run(self):
+        while self.subscribers:
+            await asyncio.sleep(self.interval)
+            watched = {job_id: self.state.get(job_id, [None, {}]) for job_id in self.subscribers}
+            try:
+                changes = await sync_to_async(self.poll)(watched)
+            except Exception as e:
+                logger.error(f"Progress poll failed: {str(e)}")
+                continue
+
+            for job_id, version, seen, events in changes:
+                if job_id not in self.subscribers:
+                    continue
+                self.state[job_id] = [version, seen]
+                for queue in self.subscribers[job_id]:
+                    for event in events:
+                        queue.put_nowait(event)
+
+    def poll(self, watched):
+        """Return ``(job_id, version, seen, events)`` for every watched job that changed."""
+        versions = dict(ProcessingJob.objects.filter(id__in=list(watched)).values_list('id', 'updated_at'))
+        changes = []
+        for job_id, (version, seen) in watched.items():
+            current = versions.get(job_id)
+            if current is not None and current == version:
+                continue
+            seen = dict(seen)
+            changes.append((job_id, current, seen, job_events(job_id, seen)))
+        return changes
+
+
+_watchers = weakref.WeakKeyDictionary()
+
+
+def get_watcher():
+    """The watcher shared by all progress streams on the running event loop."""
+    loop = asyncio.get_running_loop()
+    watcher = _watchers.get(loop)
+    if watcher is None:
+        watcher = _watchers[loop] = JobWatcher()
+    return watcher
+
+
+async def stream_job_events(job_id):
+    """Yield SSE messages for a job until it completes or fails."""
+    yield f"retry: {int(settings.PROGRESS_POLL_INTERVAL * 1000)}\n\n"
+    async with get_watcher().subscribe(job_id) as queue:
+        # Start with a snapshot; replays from the watcher are idempotent on the client
+        for event, data in await sync_to_async(job_events)(job_id, {}):
+            yield format_event(event, data)
+            if event == 'done':
+                return
+
+        while True:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), timeout=settings.PROGRESS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                # Comment lines keep proxies from closing an idle stream
+                yield ': keep-alive\n\n'
+                continue
+            yield format_event(event, data)
+            if event == 'done':
+                return
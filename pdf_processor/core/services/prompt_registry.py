@@ -0,0 +1,339 @@
+# core/services/prompt_registry.py
+"""Versioned extraction prompt templates.
+
+A template declares the fields it asks for. The prompt text, the column
+schema, the normaliser that pads missing fields and the validators are
+derived from that declaration once and cached on the template, rather
+than being rebuilt for every reply. Templates are registered by ``key``
+and ``version``; a job records the pair it was created with, so a newer
+version does not change how older results are read.
+
+Prompts typed into the upload form are wrapped in an ad-hoc ``custom``
+template whose fields come from the prompt's numbered list, falling back
+to the fields of the job's registered template.
+
+For structured output each template also provides the JSON schema of its
+reply (``response_schema``), sent as the response format, and a checker
+compiled from that schema once (``schema_validator``).
+"""
+import re
+from functools import cached_property, lru_cache
+
+DEFAULT_TEMPLATE = 'medical_review'
+
+FIELD_LINE_RE = re.compile(r'^\s*(\d+)\.\s+(.+?)\s*$', re.M)
+
+CONFIDENCE_RANGE = range(1, 6)
+
+JSON_FORMAT = """Return the data in JSON format:
+{{
+  "case_results": [
+    {{
+{example}      ...
+    }}
+  ]
+}}"""
+
+FLAG = ('y', 'n', 'yes', 'no')
+
+# The subset of JSON schema used for response formats
+SCHEMA_TYPES = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'integer': int,
+    'number': (int, float),
+    'boolean': bool,
+}
+
+FIELD_SCHEMA = {
+    'type': 'object',
+    'properties': {'value': {'type': 'string'}, 'confidence': {'type': 'integer'}},
+    'required': ['value', 'confidence'],
+}
+
+
+def compile_schema(schema, path='$'):
+    """Turn ``schema`` into ``check(data)``, a generator of error messages.
+
+    The schema is walked once, here; checking a reply only runs the
+    closures built for it.
+    """
+    kind = schema['type']
+    expected = SCHEMA_TYPES[kind]
+    checks = []
+    if kind == 'object':
+        required = tuple(schema.get('required', ()))
+        properties = [(key, compile_schema(sub, f'{path}.{key}')) for key, sub in schema.get('properties', {}).items()]
+
+        def check_object(data):
+            for key in required:
+                if key not in data:
+                    yield f'{path}: missing {key!r}'
+            for key, check in properties:
+                if key in data:
+                    yield from check(data[key])
+        checks.append(check_object)
+    elif kind == 'array' and 'items' in schema:
+        check_item = compile_schema(schema['items'], f'{path}[]')
+
+        def check_array(data):
+            for item in data:
+                yield from check_item(item)
+        checks.append(check_array)
+
+    def check(data):
+        if not isinstance(data, expected) or (isinstance(data, bool) and kind != 'boolean'):
+            yield f'{path}: expected {kind}'
+            return
+        for check_part in checks:
+            yield from check_part(data)
+    return check
+
+
+class Field:
+    """One extracted column: its key in the reply, its label and, optionally, the accepted values.
+
+    ``role`` marks fields other code relies on, such as the ``doi`` and
+    ``title`` used to recognise a paper uploaded twice. ``kind`` names the
+    parser ``normalization_service`` applies to the field's values.
+    """
+
+    def __init__(self, key, label, choices=(), role=None, kind=None):
+        self.key = str(key)
+        self.label = label
+        self.choices = frozenset(str(choice).lower() for choice in choices)
+        self.role = role
+        self.kind = kind
+
+
+class PromptTemplate:
+    def __init__(self, key, version, title, instructions, fields, prompt=None):
+        self.key = key
+        self.version = version
+        self.title = title
+        self.instructions = instructions
+        self.fields = tuple(fields)
+        self._prompt = prompt
+
+    def __repr__(self):
+        return f'<PromptTemplate {self.label}>'
+
+    @property
+    def label(self):
+        return f'{self.key}@v{self.version}'
+
+    @cached_property
+    def prompt(self):
+        if self._prompt is not None:
+            return self._prompt
+        listing = '\n'.join(f'{field.key}. {field.label}' for field in self.fields)
+        example = ''.join(f'      "{field.key}": {{"value": "", "confidence": 1}},\n' for field in self.fields[:2])
+        return f'{self.instructions}\n\nFor each case, extract:\n{listing}\n\n' + JSON_FORMAT.format(example=example)
+
+    @cached_property
+    def required_fields(self):
+        return tuple(field.key for field in self.fields)
+
+    @cached_property
+    def labels(self):
+        return {field.key: field.label for field in self.fields}
+
+    @cached_property
+    def roles(self):
+        """``{role: field_key}`` for the fields that declare one."""
+        return {field.role: field.key for field in self.fields if field.role}
+
+    @cached_property
+    def kinds(self):
+        """``{field_key: kind}`` for the fields with a value parser."""
+        return {field.key: field.kind for field in self.fields if field.kind}
+
+    @cached_property
+    def columns(self):
+        """Column schema stored on ``ProcessingJob.columns``."""
+        return [{'key': field.key, 'label': field.label} for field in self.fields]
+
+    @cached_property
+    def normalizer(self):
+        """Function putting a parsed reply into the ``{"case_results": [...]}`` shape.
+
+        Every case gets an entry for each required field and bare values
+        are wrapped as ``{"value", "confidence"}``.
+        """
+        keys = self.required_fields
+
+        def normalize(data):
+            if isinstance(data, list):
+                data = {'case_results': [case for case in data if isinstance(case, dict)]}
+            if 'case_results' not in data:
+                data = {'case_results': [data]}
+
+            for case in data['case_results']:
+                for key in keys:
+                    if key not in case:
+                        case[key] = {'value': '', 'confidence': 1}
+                    elif isinstance(case[key], (str, int, float)):
+                        case[key] = {'value': str(case[key]), 'confidence': 1}
+            return data
+        return normalize
+
+    @cached_property
+    def validators(self):
+        """``{field_key: check}`` where ``check(entry)`` returns a problem or None."""
+        def check_confidence(confidence):
+            try:
+                if int(confidence) in CONFIDENCE_RANGE:
+                    return None
+            except (TypeError, ValueError):
+                pass
+            return f'confidence {confidence!r} is not between 1 and 5'
+
+        def build(field):
+            allowed = ', '.join(sorted(field.choices))
+
+            def check(entry):
+                if not isinstance(entry, dict):
+                    return 'not a {"value", "confidence"} object'
+                value = str(entry.get('value') or '').strip()
+                if value and field.choices and value.lower() not in field.choices:
+                    return f'{value!r} is not one of {allowed}'
+                return check_confidence(entry.get('confidence'))
+            return check
+
+        return {field.key: build(field) for field in self.fields}
+
+    def case_schema(self, keys=None):
+        """Schema of one case, or of just ``keys`` for a field re-extraction."""
+        keys = self.required_fields if keys is None else list(keys)
+        return {'type': 'object', 'properties': {key: FIELD_SCHEMA for key in keys}, 'required': list(keys)}
+
+    @cached_property
+    def response_schema(self):
+        return {
+            'type': 'object',
+            'properties': {
+                'case_results': {'type': 'array', 'items': self.case_schema()},
+                'instruction': FIELD_SCHEMA,
+            },
+            'required': ['case_results'],
+        }
+
+    @cached_property
+    def schema_validator(self):
+        return compile_schema(self.response_schema)
+
+    def missing_fields(self, data):
+        """Required keys absent from any case of a reply, before padding."""
+        cases = data if isinstance(data, list) else data.get('case_results', [data])
+        return {key for case in cases if isinstance(case, dict) for key in self.required_fields if key not in case}
+
+    def validate(self, case_results):
+        """Problems with the values of normalised ``case_results``, one message each."""
+        problems = []
+        for i, case in enumerate(case_results, 1):
+            for key, check in self.validators.items():
+                if key in case:
+                    problem = check(case[key])
+                    if problem:
+                        problems.append(f'case {i}, field {key} ({self.labels[key]}): {problem}')
+        return problems
+
+
+_templates = {}
+
+
+def register(template):
+    _templates[(template.key, template.version)] = template
+    template_for_prompt.cache_clear()
+    return template
+
+
+def get_template(key=DEFAULT_TEMPLATE, version=None):
+    """The registered template ``key`` at ``version``, or its latest version."""
+    if version is None:
+        versions = [v for k, v in _templates if k == key]
+        version = max(versions) if versions else None
+    try:
+        return _templates[(key, version)]
+    except KeyError:
+        raise KeyError(f"Unknown prompt template {key} v{version}") from None
+
+
+def latest_templates():
+    latest = {}
+    for (key, version), template in sorted(_templates.items()):
+        latest[key] = template
+    return list(latest.values())
+
+
+def template_choices():
+    return [(template.key, f'{template.title} (v{template.version})') for template in latest_templates()]
+
+
+@lru_cache(maxsize=128)
+def template_for_prompt(prompt, base_key=DEFAULT_TEMPLATE, base_version=None):
+    """Template for a prompt text: the registered one with that exact text, or a custom one."""
+    for template in _templates.values():
+        if template.prompt == prompt:
+            return template
+    labels = dict(FIELD_LINE_RE.findall(prompt.split('Return the data', 1)[0]))
+    fields = [Field(key, label) for key, label in labels.items()] or get_template(base_key, base_version).fields
+    return PromptTemplate('custom', 0, 'Custom prompt', '', fields, prompt=prompt)
+
+
+def as_template(prompt=None):
+    """Accept a ``PromptTemplate``, prompt text or None (the default template)."""
+    if isinstance(prompt, PromptTemplate):
+        return prompt
+    return template_for_prompt(prompt) if prompt else get_template()
+
+
+def job_template(job):
+    """Template ``job`` extracts with; its own prompt text wins over the registered template."""
+    key = job.prompt_template or DEFAULT_TEMPLATE
+    if job.prompt:
+        return template_for_prompt(job.prompt, key, job.prompt_version)
+    return get_template(key, job.prompt_version)
+
+
+register(PromptTemplate(
+    'medical_review', 1, 'Meningioma case reports and case series',
+    "You are a medical reviewer tasked with extracting specific information from case studies or case series related to meningioma patients. Your goal is to extract the following information and provide a confidence rating (1-5, with 5 being most confident) for each item. If information is not available, return an empty string for that item and a confidence rating of 1.",
+    [
+        Field(0, 'Article Name', role='title'),
+        Field(1, 'Document Object Identifier (DOI)', role='doi'),
+        Field(2, 'Study author (last name of first author)'),
+        Field(3, 'Year of publication'),
+        Field(4, 'Patient age', kind='age'),
+        Field(5, 'Patient gender (M/F)', choices=('M', 'F', 'male', 'female')),
+        Field(6, 'Duration of symptoms (in months)', kind='months'),
+        Field(7, 'Tumor location (Cranial or Spinal)', choices=('cranial', 'spinal')),
+        Field(8, 'Extent of resection (total or subtotal)', kind='resection'),
+        Field(9, 'WHO Grade', kind='who_grade'),
+        Field(10, 'Meningioma subtype'),
+        Field(11, 'Adjuvant therapy (y/n)', choices=FLAG, kind='flag'),
+        Field(12, 'Symptom assessment'),
+        Field(13, 'Recurrence (y/n)', choices=FLAG, kind='flag'),
+        Field(14, 'Patient status (A/D)', choices=('A', 'D', 'alive', 'deceased'), kind='vital_status'),
+        Field(15, 'Tumor invasion (y/n)', choices=FLAG, kind='flag'),
+    ],
+))
+
+register(PromptTemplate(
+    'case_review', 1, 'Meningioma case reviews (aggregate)',
+    "You are a medical reviewer summarizing information from a case review on meningioma patients. Extract the following information for the cases managed or observed at the authors' institution only, and provide a confidence rating (1-5, with 5 being most confident) for each item. If information is not available, return an empty string for that item and a confidence rating of 1. Report one entry per article.",
+    [
+        Field(0, 'Article Name', role='title'),
+        Field(1, 'Document Object Identifier (DOI)', role='doi'),
+        Field(2, 'Study author (last name of first author)'),
+        Field(3, 'Year of publication'),
+        Field(4, "Total cases from the authors' institution"),
+        Field(5, 'Age range'),
+        Field(6, 'Gender distribution (e.g. 10M/5F)'),
+        Field(7, 'Most common tumor location(s)'),
+        Field(8, 'Most common treatment(s)'),
+        Field(9, 'Overall recurrence rate'),
+        Field(10, 'Overall patient status (e.g. 90% alive, 10% deceased)'),
+    ],
+))
@@ -0,0 +1,149 @@
+# core/services/rate_limiter.py
+"""Rate limiting and retry policy for LLM calls.
+
+Two token buckets, one for requests per minute and one for tokens per
+minute, live in the ``RateLimitBucket`` table so every worker process draws
+from the same quota. Updates use optimistic concurrency (a conditional
+UPDATE on ``version``), which works the same on SQLite and Postgres.
+
+When the API answers 429 the bucket is drained for the Retry-After period,
+so all workers back off together instead of each discovering the limit on
+its own. Failed calls are rescheduled with full-jitter exponential backoff.
+"""
+import asyncio
+import logging
+import random
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F
+
+from ..models import RateLimitBucket
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    def __init__(self, name, per_minute):
+        self.name = name
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+
+    def _state(self):
+        bucket, _ = RateLimitBucket.objects.get_or_create(
+            name=self.name,
+            defaults={'tokens': self.capacity, 'updated_at': time.time()}
+        )
+        return bucket
+
+    def try_acquire(self, cost):
+        """Take ``cost`` tokens if available; otherwise return seconds to wait."""
+        cost = min(cost, self.capacity)
+        while True:
+            bucket = self._state()
+            now = time.time()
+            tokens = min(self.capacity, bucket.tokens + max(0.0, now - bucket.updated_at) * self.rate)
+            if tokens < cost:
+                return (cost - tokens) / self.rate
+
+            updated = RateLimitBucket.objects.filter(pk=bucket.pk, version=bucket.version).update(
+                tokens=tokens - cost,
+                updated_at=now,
+                version=F('version') + 1,
+            )
+            if updated:
+                return 0.0
+
+    def adjust(self, delta):
+        """Add (or with a negative delta, remove) tokens, e.g. to settle actual usage."""
+        RateLimitBucket.objects.filter(name=self.name).update(tokens=F('tokens') + delta)
+
+    def drain(self, seconds):
+        """Leave the bucket empty for ``seconds`` from now."""
+        self._state()
+        RateLimitBucket.objects.filter(name=self.name).update(
+            tokens=-seconds * self.rate,
+            updated_at=time.time(),
+            version=F('version') + 1,
+        )
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, prefix='llm'):
+        rpm = settings.LLM_REQUESTS_PER_MINUTE if requests_per_minute is None else requests_per_minute
+        tpm = settings.LLM_TOKENS_PER_MINUTE if tokens_per_minute is None else tokens_per_minute
+        self.requests = TokenBucket(f'{prefix}:requests', rpm) if rpm else None
+        self.tokens = TokenBucket(f'{prefix}:tokens', tpm) if tpm else None
+
+    @property
+    def enabled(self):
+        return self.requests is not None or self.tokens is not None
+
+    def acquire(self, estimated_tokens, sleep=time.sleep):
+        """Block until both buckets admit the call. Returns the total time waited."""
+        waited = 0.0
+        for bucket, cost in ((self.requests, 1), (self.tokens, estimated_tokens)):
+            if bucket is None:
+                continue
+            while True:
+                delay = bucket.try_acquire(cost)
+                if not delay:
+                    break
+                sleep(delay)
+                waited += delay
+        if waited:
+            logger.debug(f"Rate limiter held call for {waited:.2f}s")
+        return waited
+
+    async def aacquire(self, estimated_tokens):
+        """``acquire`` for the event loop: bucket updates run on the ORM thread, waits are async sleeps."""
+        waited = 0.0
+        for bucket, cost in ((self.requests, 1), (self.tokens, estimated_tokens)):
+            if bucket is None:
+                continue
+            while True:
+                delay = await sync_to_async(bucket.try_acquire)(cost)
+                if not delay:
+                    break
+                await asyncio.sleep(delay)
+                waited += delay
+        if waited:
+            logger.debug(f"Rate limiter held call for {waited:.2f}s")
+        return waited
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        if self.tokens is not None and actual_tokens:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
+
+    def penalize(self, retry_after=None):
+        """Back every worker off after a 429."""
+        seconds = retry_after or settings.LLM_RETRY_BASE_DELAY
+        logger.warning(f"LLM quota exceeded, pausing all workers for {seconds:.1f}s")
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.drain(seconds)
+
+
+def is_retryable(status):
+    # Connection-level failures carry no status and are worth another try
+    return status is None or status in RETRYABLE_STATUSES
+
+
+def backoff_delay(attempt, retry_after=None, base=None, cap=None):
+    """Full-jitter exponential backoff, never shorter than Retry-After."""
+    base = settings.LLM_RETRY_BASE_DELAY if base is None else base
+    cap = settings.LLM_RETRY_MAX_DELAY if cap is None else cap
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after:
+        delay = max(delay, float(retry_after))
+    return delay
+
+
+def parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,124 @@
+# core/services/reextraction_service.py
+"""Targeted re-extraction of selected fields of one case.
+
+When a single field comes back unreliable there is no need to re-run the
+whole document. ``reextract_fields`` sends one request with a reduced
+prompt naming only the wanted fields and what is already known about the
+case, built on the saved page texts (``DocumentPage``) so pypdf does not
+run again. The answer is merged into ``ProcessingResult.result_data``,
+the version is bumped and a ``ResultRevision`` records each field before
+and after. Extraction cache entries of the PDF holding the old result get
+the corrected one, so a later upload of the same file is not served the
+result from before the correction.
+"""
+import copy
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from ..models import ProcessingResult, ResultRevision
+from ..utils import field_reextraction_prompt
+from . import cache_service
+from .extraction_service import adocument_parts, document_parts, generation_config
+from .json_repair import parse_json
+from .llm_service import get_llm_client
+from .pdf_service import document_pages, store_pages
+from .prompt_registry import job_template
+from .results_service import update_case_fields
+from .routing_service import tag_model
+
+logger = logging.getLogger(__name__)
+
+
+def _reply_fields(text, field_keys):
+    data, _ = parse_json(text)
+    # Tolerate the full extraction shape as well as the bare field object
+    if isinstance(data, dict) and isinstance(data.get('case_results'), list) and data['case_results']:
+        data = data['case_results'][0]
+    if not isinstance(data, dict):
+        raise ValueError("Invalid JSON structure: root must be an object")
+    return {key: data[key] for key in field_keys if key in data}
+
+
+def _prepare(pdf_doc, case_index, field_keys, model_name):
+    result = ProcessingResult.objects.get(document=pdf_doc)
+    cases = result.result_data.get('case_results', [])
+    if not 0 <= case_index < len(cases):
+        raise ValueError(f"Document has no case {case_index}")
+
+    field_keys = list(dict.fromkeys(str(key) for key in field_keys))
+    if not field_keys:
+        raise ValueError("No fields to re-extract")
+    template = job_template(pdf_doc.job)
+    unknown = [key for key in field_keys if key not in template.labels]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    return {
+        'result': result,
+        'field_keys': field_keys,
+        'model_name': model_name or settings.LLM_STRONG_MODEL,
+        'pages': document_pages(pdf_doc),
+        'prompt': field_reextraction_prompt(template, cases[case_index], case_index, field_keys),
+        'config': generation_config(template, field_keys),
+    }
+
+
+def _apply(pdf_doc, case_index, request, response):
+    store_pages(pdf_doc, request['pages'])
+    fields = _reply_fields(response.text, request['field_keys'])
+    if not fields:
+        raise ValueError("The reply contained none of the requested fields")
+    model_name = request['model_name']
+    fields = tag_model([fields], model_name)[0]
+    logger.info(f"Re-extracted fields {', '.join(fields)} of case {case_index + 1} of {pdf_doc.file.name}")
+
+    with transaction.atomic():
+        result = ProcessingResult.objects.select_for_update().get(pk=request['result'].pk)
+        before = copy.deepcopy(result.result_data)
+        case = result.result_data['case_results'][case_index]
+        changes = {key: {'before': case.get(key), 'after': entry} for key, entry in fields.items()}
+        case.update(fields)
+        result.version += 1
+        result.save(update_fields=['result_data', 'version', 'updated_at'])
+        cache_service.replace_result(pdf_doc.sha256, before, result.result_data)
+        update_case_fields(pdf_doc, case_index, fields, request['pages'])
+        return ResultRevision.objects.create(
+            result=result,
+            version=result.version,
+            case_index=case_index,
+            changes=changes,
+            model_name=model_name,
+            raw_text=response.text,
+        )
+
+
+def reextract_fields(pdf_doc, case_index, field_keys, model_name=None):
+    """Re-extract ``field_keys`` of case ``case_index`` and merge them into the result.
+
+    Returns the new ``ResultRevision``. Raises ``ProcessingResult.DoesNotExist``
+    for documents without a result, ``ValueError`` for unknown cases or
+    fields and unusable replies, and ``LLMError`` when the call fails.
+    """
+    request = _prepare(pdf_doc, case_index, field_keys, model_name)
+    client = get_llm_client()
+    with document_parts(pdf_doc, client, request['pages']) as parts:
+        response = client.chat(
+            [{'role': 'user', 'parts': parts + [request['prompt']]}],
+            model_name=request['model_name'], generation_config=request['config']
+        )
+    return _apply(pdf_doc, case_index, request, response)
+
+
+async def areextract_fields(pdf_doc, case_index, field_keys, model_name=None):
+    """``reextract_fields`` for async views; the model call does not hold a thread."""
+    request = await sync_to_async(_prepare)(pdf_doc, case_index, field_keys, model_name)
+    client = get_llm_client()
+    async with adocument_parts(pdf_doc, client, request['pages']) as parts:
+        response = await client.achat(
+            [{'role': 'user', 'parts': parts + [request['prompt']]}],
+            model_name=request['model_name'], generation_config=request['config']
+        )
+    return await sync_to_async(_apply)(pdf_doc, case_index, request, response)
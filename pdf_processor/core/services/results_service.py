@@ -0,0 +1,286 @@
+# core/services/results_service.py
+"""Normalised case results.
+
+``ProcessingResult.result_data`` keeps each document's extraction as
+returned by the model. When a result is saved, its cases are also written
+as ``ExtractedCase`` rows with one ``ExtractedField`` per field. Results
+pages and cross-job queries can then page, sort and filter in SQL rather
+than loading every blob into pandas. Given the document's page texts,
+each field also records the page and span its value was found at
+(``evidence_service.locate``).
+"""
+import base64
+import json
+import os
+import re
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from ..models import ExtractedCase, ExtractedField, PDFDocument
+from .evidence_service import locate
+from .prompt_registry import job_template
+
+MAX_PAGE_SIZE = 500
+
+# A value that starts with a number ("9", "45-year-old", "3.5 cm") sorts by
+# that number. Numbers are stored offset by NUMBER_OFFSET and zero-padded so
+# the text column orders them numerically, ahead of all other text.
+LEADING_NUMBER_RE = re.compile(r'\s*(-?\d+(?:[.,]\d+)?)')
+NUMBER_OFFSET = 1e9
+
+
+def field_value(entry):
+    """Split a ``{"value", "confidence"}`` entry into ``(value, confidence)``."""
+    if isinstance(entry, dict):
+        value, confidence = entry.get('value', ''), entry.get('confidence')
+    else:
+        value, confidence = entry, None
+    if value is None:
+        value = ''
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    try:
+        confidence = int(confidence) if confidence is not None else None
+    except (TypeError, ValueError):
+        confidence = None
+    return str(value), confidence
+
+
+def value_sort_key(value):
+    """``ExtractedField.sort_key`` of a value: numbers by magnitude, then text ignoring case."""
+    match = LEADING_NUMBER_RE.match(value)
+    if match:
+        number = float(match.group(1).replace(',', '.'))
+        if abs(number) < NUMBER_OFFSET:
+            return f'1{number + NUMBER_OFFSET:018.6f}'
+    text = value.strip().casefold()
+    return f'2{text}'[:255] if text else ''
+
+
+def field_model(entry):
+    return str(entry.get('model') or '')[:100] if isinstance(entry, dict) else ''
+
+
+def field_evidence(value, pages, label):
+    found = locate(value, pages, label) if pages else None
+    if found is None:
+        return {'page': None, 'span_start': None, 'span_end': None}
+    return {'page': found['page'], 'span_start': found['start'], 'span_end': found['end']}
+
+
+def store_cases(pdf_doc, case_results, pages=None):
+    """Replace the normalised cases of ``pdf_doc`` with ``case_results``.
+
+    With the document's ``pages`` each value is located in the page texts.
+    """
+    cases = [case for case in case_results if isinstance(case, dict)]
+    labels = job_template(pdf_doc.job).labels if pages else {}
+    with transaction.atomic():
+        ExtractedCase.objects.filter(document=pdf_doc).delete()
+        created = ExtractedCase.objects.bulk_create([
+            ExtractedCase(job_id=pdf_doc.job_id, document=pdf_doc, case_index=i)
+            for i in range(len(cases))
+        ])
+        ExtractedField.objects.bulk_create([
+            ExtractedField(
+                case=extracted, job_id=pdf_doc.job_id, field_key=str(key)[:100],
+                value=value, sort_key=value_sort_key(value), confidence=confidence, model=field_model(entry),
+                **field_evidence(value, pages, labels.get(str(key))),
+            )
+            for extracted, case in zip(created, cases)
+            for key, entry in case.items()
+            for value, confidence in [field_value(entry)]
+        ])
+    return len(cases)
+
+
+def update_case_fields(pdf_doc, case_index, fields, pages=None):
+    """Write ``{field_key: entry}`` into the normalised rows of one case."""
+    case, _ = ExtractedCase.objects.get_or_create(
+        document=pdf_doc, case_index=case_index, defaults={'job_id': pdf_doc.job_id}
+    )
+    labels = job_template(pdf_doc.job).labels if pages else {}
+    for key, entry in fields.items():
+        value, confidence = field_value(entry)
+        ExtractedField.objects.update_or_create(
+            case=case, field_key=str(key)[:100],
+            defaults={
+                'job_id': pdf_doc.job_id, 'value': value, 'sort_key': value_sort_key(value),
+                'confidence': confidence, 'model': field_model(entry),
+                **field_evidence(value, pages, labels.get(str(key))),
+            },
+        )
+
+
+def column_sort_key(key):
+    # Numbered prompt fields in prompt order, then anything else by name
+    return (0, int(key), '') if key.isdigit() else (1, 0, key)
+
+
+def job_columns(jobs):
+    keys = ExtractedField.objects.filter(job__in=jobs).values_list('field_key', flat=True).distinct()
+    return sorted(keys, key=column_sort_key)
+
+
+def case_rows(cases, columns=None, with_model=False, with_evidence=False):
+    """Rows for ``cases`` as ``{field_key: {"value", "confidence"}}`` dicts, in order.
+
+    Fields are fetched with one query; ``columns`` limits which,
+    ``with_model`` adds the ``model`` that produced each value and
+    ``with_evidence`` its ``evidence``: ``{"page", "start", "end"}`` or None.
+    """
+    cases = list(cases)
+    fields = ExtractedField.objects.filter(case__in=cases)
+    if columns is not None:
+        fields = fields.filter(field_key__in=columns)
+
+    rows = {case.id: {} for case in cases}
+    for case_id, key, value, confidence, model, page, start, end in fields.values_list(
+        'case_id', 'field_key', 'value', 'confidence', 'model', 'page', 'span_start', 'span_end'
+    ):
+        rows[case_id][key] = {'value': value, 'confidence': confidence}
+        if with_model:
+            rows[case_id][key]['model'] = model
+        if with_evidence:
+            rows[case_id][key]['evidence'] = {'page': page, 'start': start, 'end': end} if page else None
+    return [rows[case.id] for case in cases]
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def _keyset_filter(keys, values, descending):
+    (first, second), (a, b) = keys, values
+    lookup = 'lt' if descending else 'gt'
+    # The redundant bound on the first key is what lets the index range scan start at the cursor
+    return Q(**{f'{first}__{lookup}e': a}) & (
+        Q(**{f'{first}__{lookup}': a}) | Q(**{first: a, f'{second}__{lookup}': b})
+    )
+
+
+def _sorted_cases(jobs, sort, cursor, reverse, backwards, count):
+    """Up to ``count`` cases of ``jobs`` in the order of field ``sort``, walking from ``cursor``.
+
+    Cases that have the field are read from ``ExtractedField`` along its
+    ``(job, field_key, sort_key|confidence, case)`` index; cases without
+    it come after them, by id. Each case carries its ``sort_value``, None
+    for the cases without one.
+    """
+    key, _, attr = sort.partition('.')
+    column = 'confidence' if attr == 'confidence' else 'sort_key'
+    valued = ExtractedField.objects.filter(job__in=jobs, field_key=key, **{f'{column}__isnull': False})
+    order = '-' if reverse else ''
+
+    def with_value(cursor, count):
+        fields = valued
+        if cursor is not None:
+            fields = fields.filter(_keyset_filter((column, 'case_id'), cursor, reverse))
+        found = list(fields.order_by(order + column, order + 'case_id').values_list(column, 'case_id')[:count])
+        cases = ExtractedCase.objects.order_by().in_bulk([case_id for _, case_id in found])
+        for value, case_id in found:
+            cases[case_id].sort_value = value
+        return [cases[case_id] for _, case_id in found]
+
+    def without_value(cursor, count):
+        cases = ExtractedCase.objects.filter(job__in=jobs).filter(~Exists(valued.filter(case=OuterRef('pk'))))
+        if cursor is not None:
+            cases = cases.filter(**{'id__lt' if reverse else 'id__gt': cursor[1]})
+        cases = list(cases.order_by(order + 'id')[:count])
+        for case in cases:
+            case.sort_value = None
+        return cases
+
+    if cursor is None:
+        start = without_value if backwards else with_value
+    else:
+        start = without_value if cursor[0] is None else with_value
+    following = with_value if backwards else without_value
+    cases = start(cursor, count)
+    if len(cases) < count and following is not start:
+        cases += following(None, count - len(cases))
+    return cases
+
+
+def page_cases(jobs, sort=None, descending=False, after=None, before=None, last=False, limit=50):
+    """Return one page of cases with keyset pagination.
+
+    Cases are ordered by document and position, or by the value of field
+    ``sort`` (``"<key>.confidence"`` for its confidence) with the case id
+    as tie-breaker; cases without a value for the field come last in
+    either direction. Values sort by ``value_sort_key``, so numbers go in
+    numeric order. ``after``/``before`` are cursors from a previous page
+    and ``last`` jumps to the final page. Each page is an index range scan
+    from the cursor rather than an OFFSET, so deep pages cost the same as
+    the first. The one exception is the cases without the field: finding
+    them checks each case of the job, which only the pages at the end of a
+    sorted listing do. Returns ``{'cases', 'next', 'previous'}``; the
+    cursors are None at either end.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    backwards = before is not None or last
+    reverse = descending != backwards
+    start = after if after is not None else before
+    start = decode_cursor(start) if start is not None else None
+    if sort:
+        keys = ('sort_value', 'id')
+        cases = _sorted_cases(jobs, sort, start, reverse, backwards, limit + 1)
+    else:
+        keys = ('document_id', 'case_index')
+        cases = ExtractedCase.objects.filter(job__in=jobs)
+        if start is not None:
+            cases = cases.filter(_keyset_filter(keys, start, reverse))
+        cases = list(cases.order_by(*(f'-{key}' if reverse else key for key in keys))[:limit + 1])
+
+    more = len(cases) > limit
+    cases = cases[:limit]
+    if backwards:
+        cases.reverse()
+
+    def cursor(case):
+        return encode_cursor([getattr(case, key) for key in keys])
+
+    if not cases:
+        return {'cases': [], 'next': None, 'previous': None}
+    if backwards:
+        at_start, at_end = not more, last
+    else:
+        at_start, at_end = after is None, not more
+    return {
+        'cases': cases,
+        'next': None if at_end else cursor(cases[-1]),
+        'previous': None if at_start else cursor(cases[0]),
+    }
+
+
+def iter_cases(jobs, columns=None, chunk_size=500):
+    """Yield ``(case, document_name, fields)`` for every case of ``jobs``.
+
+    Reads in keyset-paginated chunks, so memory stays bounded however many
+    cases the jobs hold.
+    """
+    after = None
+    while True:
+        page = page_cases(jobs, after=after, limit=chunk_size)
+        cases = page['cases']
+        if not cases:
+            return
+        names = dict(
+            PDFDocument.objects.filter(id__in={case.document_id for case in cases}).values_list('id', 'file')
+        )
+        for case, fields in zip(cases, case_rows(cases, columns=columns)):
+            yield case, os.path.basename(names.get(case.document_id, '')), fields
+        after = page['next']
+        if after is None:
+            return
@@ -0,0 +1,95 @@
+# core/services/routing_service.py
+"""Which model extracts a document.
+
+Most papers are single case reports the fast model handles well, so each
+document is extracted with ``LLM_FAST_MODEL`` first. The strong model
+(``LLM_STRONG_MODEL``) re-extracts it only when that result looks
+unreliable: no cases, required fields left out of the reply, or a value
+given with confidence below ``MODEL_ROUTING_MIN_CONFIDENCE``. Empty values
+are the prompt's way of saying "not reported", so they never escalate on
+their own.
+
+Every field entry carries the ``model`` that produced it. After an
+escalation the strong model's cases are kept, except for fields where the
+fast model was strictly more confident. Cases only the fast model found
+are kept as it gave them.
+"""
+import logging
+
+from django.conf import settings
+
+from .llm_service import DEFAULT_MODEL
+from .results_service import column_sort_key, field_value
+
+logger = logging.getLogger(__name__)
+
+
+def routing_models():
+    """Models to try in order: ``[fast, strong]``, or just one without routing."""
+    if not settings.MODEL_ROUTING_ENABLED or settings.LLM_FAST_MODEL == settings.LLM_STRONG_MODEL:
+        return [settings.LLM_STRONG_MODEL or DEFAULT_MODEL]
+    return [settings.LLM_FAST_MODEL, settings.LLM_STRONG_MODEL]
+
+
+def routing_label():
+    """Identifies the policy in cache keys, so changing it misses the cache."""
+    models = routing_models()
+    if len(models) == 1:
+        return models[0]
+    return f"{'>'.join(models)}@{settings.MODEL_ROUTING_MIN_CONFIDENCE}"
+
+
+def _confidence(entry):
+    return field_value(entry)[1] or 0
+
+
+def escalation_reasons(case_results, missing=()):
+    """Why a fast-model result should be re-extracted; empty if it is good enough."""
+    reasons = []
+    if not case_results:
+        reasons.append('no cases')
+    if missing:
+        reasons.append(f"missing fields {', '.join(sorted(missing, key=column_sort_key))}")
+
+    threshold = settings.MODEL_ROUTING_MIN_CONFIDENCE
+    low = set()
+    for case in case_results:
+        for key, entry in case.items():
+            value, confidence = field_value(entry)
+            if value and (confidence is None or confidence < threshold):
+                low.add(key)
+    if low:
+        reasons.append(f"low confidence in fields {', '.join(sorted(low, key=column_sort_key))}")
+    return reasons
+
+
+def tag_model(case_results, model_name):
+    """Copies of ``case_results`` with ``model`` recorded on every field."""
+    tagged = []
+    for case in case_results:
+        row = {}
+        for key, entry in case.items():
+            if not isinstance(entry, dict):
+                entry = {'value': entry, 'confidence': None}
+            row[key] = {**entry, 'model': model_name}
+        tagged.append(row)
+    return tagged
+
+
+def merge_cases(primary, escalated):
+    """Combine tagged results of the fast and the strong model, field by field."""
+    if not escalated:
+        return primary
+    if len(primary) > len(escalated):
+        logger.info(
+            f"Strong model found {len(escalated)} case(s), fast model {len(primary)}; "
+            f"keeping the fast model's cases {len(escalated) + 1}-{len(primary)}"
+        )
+    merged = []
+    for i in range(max(len(primary), len(escalated))):
+        row = dict(escalated[i]) if i < len(escalated) else {}
+        for key, entry in (primary[i] if i < len(primary) else {}).items():
+            if key not in row or _confidence(entry) > _confidence(row[key]):
+                row[key] = entry
+        merged.append(row)
+    return merged
@@ -0,0 +1,566 @@
+# core/tasks.py
+"""Database-backed job queue for PDF processing.
+
+The web tier only creates a ``ProcessingJob`` in the ``pending`` state.
+Worker processes started with ``python manage.py run_worker`` claim pending
+jobs one at a time, run the Gemini extraction for each of the job's
+documents and record the outcome on the job, moving it through
+pending -> processing -> completed/failed.
+"""
+import asyncio
+import logging
+import os
+import heapq
+import queue
+import socket
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import DocumentFingerprint, ProcessingJob, ProcessingResult
+from .services import cache_service, dedupe_service
+from .services.extraction_service import (
+    aprocess_pdf_with_gemini, extraction_options, generation_config, process_pdf_with_gemini,
+)
+from .services.metrics import timed
+from .services.pdf_service import document_sha256, read_pages, saved_pages, store_pages
+from .services.prompt_registry import job_template
+from .services.rate_limiter import backoff_delay
+from .services.results_service import store_cases
+from .services.routing_service import routing_label
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_job(job):
+    """Put a job (back) on the queue and return its id."""
+    job.status = 'pending'
+    job.worker_id = ''
+    job.started_at = None
+    job.completed_at = None
+    job.error_message = ''
+    job.save(update_fields=['status', 'worker_id', 'started_at', 'completed_at', 'error_message', 'updated_at'])
+    return job.id
+
+
+def claim_next_job(worker_id):
+    """Atomically move the oldest pending job to ``processing``.
+
+    The claim is a conditional UPDATE on ``status='pending'`` so two workers
+    racing for the same row cannot both win, on SQLite as well as Postgres.
+    Returns the claimed job or None when the queue is empty.
+    """
+    while True:
+        job_id = (
+            ProcessingJob.objects.filter(status='pending')
+            .order_by('created_at', 'id')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+
+        claimed = ProcessingJob.objects.filter(id=job_id, status='pending').update(
+            status='processing',
+            worker_id=worker_id,
+            started_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+        if claimed:
+            return ProcessingJob.objects.get(id=job_id)
+
+
+def requeue_stale_jobs(timeout=None):
+    """Return jobs whose worker died mid-run to the queue."""
+    timeout = timeout or settings.PROCESSING_JOB_TIMEOUT
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    count = ProcessingJob.objects.filter(status='processing', started_at__lt=cutoff).update(
+        status='pending',
+        worker_id='',
+        started_at=None,
+        updated_at=timezone.now(),
+    )
+    if count:
+        logger.warning(f"Requeued {count} stale job(s) older than {timeout}s")
+    return count
+
+
+def job_concurrency(job, document_count, default=None):
+    limit = job.max_concurrency or default or settings.PROCESSING_MAX_CONCURRENCY
+    return max(1, min(limit, document_count))
+
+
+def touch_job(job_id):
+    """Mark a job as changed so progress streams pick up its documents."""
+    ProcessingJob.objects.filter(pk=job_id).update(updated_at=timezone.now())
+
+
+@timed('db_write')
+def save_partial_result(pdf_doc, turns, case_results):
+    """Checkpoint a case series between turns so a crash can resume it."""
+    ProcessingResult.objects.update_or_create(
+        document=pdf_doc,
+        defaults={
+            'result_data': {'case_results': case_results},
+            'raw_text': '\n\n'.join(turns),
+            'turns': turns,
+            'complete': False,
+        }
+    )
+    store_cases(pdf_doc, case_results)
+    touch_job(pdf_doc.job_id)
+
+
+def resume_turns(documents):
+    """Map document id to the saved turns of its unfinished case series."""
+    return dict(
+        ProcessingResult.objects.filter(document__in=documents, complete=False)
+        .values_list('document_id', 'turns')
+    )
+
+
+@timed('db_write')
+def save_document_result(pdf_doc, result):
+    """Store one document's extraction outcome. Runs on the coordinating thread."""
+    if result.get('success'):
+        ProcessingResult.objects.update_or_create(
+            document=pdf_doc,
+            defaults={
+                'result_data': result['parsed_json'],
+                'raw_text': result.get('raw_text', ''),
+                'turns': result.get('turns', []),
+                'complete': True,
+            }
+        )
+        case_results = result['parsed_json'].get('case_results', [])
+        store_pages(pdf_doc, result.get('pages'))
+        store_cases(pdf_doc, case_results, result.get('pages') or saved_pages([pdf_doc]).get(pdf_doc.id))
+        if settings.DEDUPE_ENABLED:
+            dedupe_service.record_identifiers(pdf_doc, case_results, job_template(pdf_doc.job))
+        pdf_doc.duplicate_of_id = result.get('duplicate_of')
+        warnings = result.get('warnings') or []
+        if warnings:
+            logger.warning(f"{pdf_doc.file.name}: {len(warnings)} value(s) failed validation, e.g. {warnings[0]}")
+        pdf_doc.processed = True
+        pdf_doc.status = 'completed'
+        pdf_doc.error_message = ''
+    else:
+        pdf_doc.status = 'failed'
+        pdf_doc.error_message = result.get('error', 'Unknown processing error')
+    pdf_doc.save(update_fields=['processed', 'status', 'error_message', 'duplicate_of'])
+    touch_job(pdf_doc.job_id)
+
+
+def latest_checkpoints(items):
+    """Drop checkpoints superseded by a later item for the same document.
+
+    ``items`` are ``(pdf_doc, key, result)`` in the order they were posted;
+    a burst of streamed rows then costs one write instead of one per row.
+    """
+    last = {pdf_doc.id: i for i, (pdf_doc, _, _) in enumerate(items)}
+    return [item for i, item in enumerate(items) if not item[2].get('partial') or last[item[0].id] == i]
+
+
+def run_with_retries(job, pending, prompt, workers, turns=None, pages=None):
+    """Yield ``(pdf_doc, key, result)`` as extractions progress.
+
+    Failures the API marks as transient (429, 5xx, dropped connections) are
+    put on a retry queue instead of being reported. Each is resubmitted once
+    its jittered exponential backoff, or the server's Retry-After if longer,
+    has elapsed, up to ``LLM_MAX_RETRIES`` times, continuing from the turns
+    it already completed. Waiting happens here on the coordinating thread so
+    pool threads stay free for documents that are ready.
+
+    Between the turns of a case series, and for every streamed case, the
+    pool thread posts its progress to a queue; it is yielded as a result
+    with ``partial`` set so the caller can checkpoint it without touching
+    the ORM from the pool. Finished futures are posted to the same queue,
+    so this thread wakes up as soon as either arrives, and a document's
+    checkpoints always come before its final result. ``pages`` maps
+    document ids to saved page texts, likewise loaded here.
+    """
+    attempts = {}
+    retry_queue = []
+    futures = {}
+    turns = dict(turns or {})
+    pages = pages or {}
+    progress = queue.SimpleQueue()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'job-{job.id}') as pool:
+        def submit(pdf_doc, key):
+            def on_turn(done_turns, case_results):
+                progress.put((pdf_doc, key, {'partial': True, 'turns': done_turns, 'case_results': case_results}))
+
+            future = pool.submit(
+                process_pdf_with_gemini, pdf_doc, prompt,
+                on_turn=on_turn, resume_turns=turns.get(pdf_doc.id), pages=pages.get(pdf_doc.id)
+            )
+            futures[future] = (pdf_doc, key)
+            future.add_done_callback(progress.put)
+
+        for pdf_doc, key in pending:
+            submit(pdf_doc, key)
+
+        while futures or retry_queue:
+            now = time.monotonic()
+            while retry_queue and retry_queue[0][0] <= now:
+                _, _, pdf_doc, key = heapq.heappop(retry_queue)
+                submit(pdf_doc, key)
+
+            timeout = max(0.0, retry_queue[0][0] - now) if retry_queue else None
+            if not futures:
+                if timeout is not None:
+                    time.sleep(timeout)
+                continue
+
+            try:
+                items = [progress.get(timeout=timeout)]
+            except queue.Empty:
+                continue
+            while not progress.empty():
+                items.append(progress.get())
+            done = [item for item in items if isinstance(item, Future)]
+            yield from latest_checkpoints([item for item in items if not isinstance(item, Future)])
+
+            for future in done:
+                pdf_doc, key = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'success': False, 'error': str(e)}
+
+                attempt = attempts.get(pdf_doc.id, 0)
+                if not result.get('success') and result.get('retryable') and attempt < settings.LLM_MAX_RETRIES:
+                    attempts[pdf_doc.id] = attempt + 1
+                    delay = backoff_delay(attempt, result.get('retry_after'))
+                    logger.warning(
+                        f"Job {job.id}: retrying {pdf_doc.file.name} in {delay:.1f}s "
+                        f"(attempt {attempt + 1}/{settings.LLM_MAX_RETRIES}): {result.get('error')}"
+                    )
+                    if result.get('turns'):
+                        turns[pdf_doc.id] = result['turns']
+                    heapq.heappush(retry_queue, (time.monotonic() + delay, pdf_doc.id, pdf_doc, key))
+                    continue
+
+                yield pdf_doc, key, result
+
+
+def fingerprint_documents(job, documents, pages):
+    """Read and fingerprint the documents without a saved fingerprint, over a thread pool.
+
+    Returns ``{document_id: (pages, fingerprint)}`` with the fingerprint as
+    ``dedupe_service.compute_fingerprint`` gives it. Documents added by
+    ``ingest_pdfs`` were fingerprinted then and are left out. The pool only
+    reads files and hashes text; the ORM stays on this thread.
+    """
+    saved = set(DocumentFingerprint.objects.filter(document__in=documents).values_list('document_id', flat=True))
+    missing = [pdf_doc for pdf_doc in documents if pdf_doc.id not in saved]
+    if not missing:
+        return {}
+
+    def fingerprint(pdf_doc):
+        doc_pages = pages[pdf_doc.id] if pdf_doc.id in pages else read_pages(pdf_doc)
+        return doc_pages, dedupe_service.compute_fingerprint(doc_pages)
+
+    workers = job_concurrency(job, len(missing))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'job-{job.id}-fingerprint') as pool:
+        return dict(zip([pdf_doc.id for pdf_doc in missing], pool.map(fingerprint, missing)))
+
+
+def earlier_upload(pdf_doc, pages, template, batch, computed=None):
+    """Earlier upload of the same paper as ``(document, reason)``, or None.
+
+    The earlier document must be finished or be one of ``batch``, the ids
+    of documents of this run already queued for extraction. ``computed`` is
+    the fingerprint worked out by ``fingerprint_documents``, if any.
+    """
+    if pages is None:
+        pages = read_pages(pdf_doc)
+        store_pages(pdf_doc, pages)
+    fingerprint = dedupe_service.fingerprint_document(pdf_doc, pages, computed)
+    return dedupe_service.find_duplicate(
+        pdf_doc, fingerprint, pages, template,
+        accept=lambda original: original.status == 'completed' or original.id in batch
+    )
+
+
+def prepare_job(job):
+    """Serve cached and duplicate documents and load what the extraction of the rest needs.
+
+    Returns ``(template, model_label, pending, turns, pages, duplicates)``
+    where ``pending`` lists ``(pdf_doc, cache_key)`` still to extract and
+    ``duplicates`` maps the id of a pending document to ``(pdf_doc, reason)``
+    for the later uploads of the same paper waiting on its result.
+    """
+    template = job_template(job)
+    documents = list(job.documents.exclude(status='completed').order_by('id'))
+    pages = saved_pages(documents)
+
+    # Serve repeat uploads from the cache, then earlier uploads of the same
+    # paper, before spending any API quota
+    misses = []
+    model_label = routing_label()
+    config = generation_config(template)
+    options = extraction_options()
+    for pdf_doc in documents:
+        key = cache_service.cache_key(document_sha256(pdf_doc), template.prompt, model_label, config, options)
+        cached = cache_service.get_cached_result(key)
+        if cached is not None:
+            logger.info(f"Job {job.id}: cache hit for {pdf_doc.file.name}")
+            save_document_result(pdf_doc, cached)
+            continue
+        misses.append((pdf_doc, key))
+
+    fingerprints = {}
+    if settings.DEDUPE_ENABLED:
+        fingerprints = fingerprint_documents(job, [pdf_doc for pdf_doc, _ in misses], pages)
+    # Ids of the documents in pending
+    pending, batch, duplicates = [], set(), {}
+    for pdf_doc, key in misses:
+        if settings.DEDUPE_ENABLED:
+            doc_pages, computed = fingerprints.get(pdf_doc.id, (pages.get(pdf_doc.id), None))
+            if pdf_doc.id in fingerprints and pdf_doc.id not in pages:
+                store_pages(pdf_doc, doc_pages)
+            match = earlier_upload(pdf_doc, doc_pages, template, batch, computed)
+            if match is not None:
+                original, reason = match
+                if original.id in batch:
+                    duplicates.setdefault(original.id, []).append((pdf_doc, reason))
+                else:
+                    save_document_result(pdf_doc, dedupe_service.duplicate_result(original, reason))
+                continue
+        pending.append((pdf_doc, key))
+        batch.add(pdf_doc.id)
+
+    documents = [pdf_doc for pdf_doc, _ in pending]
+    return template, model_label, pending, resume_turns(documents), saved_pages(documents), duplicates
+
+
+def record_result(pdf_doc, key, result, model_label, duplicates=None):
+    """Save a checkpoint or final result yielded by ``run_with_retries``.
+
+    The final result is also saved for the ``duplicates`` of the document.
+    """
+    if result.get('partial'):
+        save_partial_result(pdf_doc, result['turns'], result['case_results'])
+        return
+    save_document_result(pdf_doc, result)
+    cache_service.store_result(key, pdf_doc.sha256, result.get('model', model_label), result)
+    for duplicate, reason in (duplicates or {}).pop(pdf_doc.id, []):
+        save_document_result(duplicate, dedupe_service.duplicate_result(pdf_doc, reason) or {
+            'success': False, 'error': f"Duplicate of {pdf_doc.file.name}, which failed: {pdf_doc.error_message}",
+        })
+
+
+def complete_job(job):
+    total = job.documents.count()
+    failed = job.documents.filter(status='failed').count()
+    if total == 0:
+        raise ValueError("Job has no documents")
+    if failed == total:
+        first_error = job.documents.filter(status='failed').values_list('error_message', flat=True).first()
+        raise ValueError(f"No PDFs were successfully processed: {first_error}")
+
+    job.status = 'completed'
+    job.error_message = f"{failed} of {total} document(s) failed" if failed else ''
+
+
+def fail_job(job, error):
+    logger.error(f"Error processing job {job.id}: {str(error)}", exc_info=error)
+    job.status = 'failed'
+    job.error_message = str(error)
+
+
+def close_job(job):
+    job.completed_at = timezone.now()
+    job.save(update_fields=['status', 'error_message', 'completed_at', 'updated_at'])
+    return job
+
+
+def process_job(job, on_result=None):
+    """Run the extraction for every document of a claimed job.
+
+    Gemini calls are I/O bound, so the documents are fanned out over a
+    thread pool capped at ``job_concurrency``. The pool threads read the file
+    and talk to the API; results are written back from this thread as they
+    complete. Documents completed by an earlier, interrupted run are skipped
+    and case series it left half-way are resumed from their saved turns.
+    ``on_result(pdf_doc, result)`` is called after each document is saved.
+    """
+    try:
+        template, model_label, pending, turns, pages, duplicates = prepare_job(job)
+        if pending:
+            workers = job_concurrency(job, len(pending))
+            logger.info(f"Job {job.id}: extracting {len(pending)} document(s) with {workers} worker(s)")
+            for pdf_doc, key, result in run_with_retries(job, pending, template, workers, turns, pages):
+                record_result(pdf_doc, key, result, model_label, duplicates)
+                if on_result is not None and not result.get('partial'):
+                    on_result(pdf_doc, result)
+        complete_job(job)
+    except Exception as e:
+        fail_job(job, e)
+    return close_job(job)
+
+
+async def arun_with_retries(job, pending, prompt, concurrency, turns=None, pages=None):
+    """``run_with_retries`` for the event loop, as an async generator.
+
+    Each document is a task; at most ``concurrency`` of them are waiting on
+    the model at a time. Backoff sleeps happen outside that limit, and
+    checkpoints are yielded as ``partial`` results in order with the final
+    one.
+    """
+    turns = dict(turns or {})
+    pages = pages or {}
+    results = asyncio.Queue()
+    in_flight = asyncio.Semaphore(concurrency)
+
+    async def extract(pdf_doc, key):
+        def on_turn(done_turns, case_results):
+            results.put_nowait((pdf_doc, key, {'partial': True, 'turns': done_turns, 'case_results': case_results}))
+
+        attempt = 0
+        while True:
+            async with in_flight:
+                try:
+                    result = await aprocess_pdf_with_gemini(
+                        pdf_doc, prompt, on_turn=on_turn,
+                        resume_turns=turns.get(pdf_doc.id), pages=pages.get(pdf_doc.id)
+                    )
+                except Exception as e:
+                    result = {'success': False, 'error': str(e)}
+
+            if result.get('success') or not result.get('retryable') or attempt >= settings.LLM_MAX_RETRIES:
+                results.put_nowait((pdf_doc, key, result))
+                return
+            delay = backoff_delay(attempt, result.get('retry_after'))
+            attempt += 1
+            logger.warning(
+                f"Job {job.id}: retrying {pdf_doc.file.name} in {delay:.1f}s "
+                f"(attempt {attempt}/{settings.LLM_MAX_RETRIES}): {result.get('error')}"
+            )
+            if result.get('turns'):
+                turns[pdf_doc.id] = result['turns']
+            await asyncio.sleep(delay)
+
+    tasks = [asyncio.create_task(extract(pdf_doc, key)) for pdf_doc, key in pending]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            items = [await results.get()]
+            while not results.empty():
+                items.append(results.get_nowait())
+            for pdf_doc, key, result in latest_checkpoints(items):
+                if not result.get('partial'):
+                    remaining -= 1
+                yield pdf_doc, key, result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def aprocess_job(job, on_result=None):
+    """``process_job`` on the event loop: documents are tasks instead of pool threads.
+
+    ORM work goes through ``sync_to_async``, which runs it on one shared
+    thread, so the database is still only touched from one place.
+    """
+    try:
+        template, model_label, pending, turns, pages, duplicates = await sync_to_async(prepare_job)(job)
+        if pending:
+            concurrency = job_concurrency(job, len(pending), settings.PROCESSING_ASYNC_MAX_CONCURRENCY)
+            logger.info(f"Job {job.id}: extracting {len(pending)} document(s), {concurrency} at a time")
+            results = arun_with_retries(job, pending, template, concurrency, turns, pages)
+            async for pdf_doc, key, result in results:
+                await sync_to_async(record_result)(pdf_doc, key, result, model_label, duplicates)
+                if on_result is not None and not result.get('partial'):
+                    await sync_to_async(on_result)(pdf_doc, result)
+        await sync_to_async(complete_job)(job)
+    except Exception as e:
+        fail_job(job, e)
+    return await sync_to_async(close_job)(job)
+
+
+def run_worker(worker_id=None, once=False, poll_interval=None, max_jobs=None):
+    """Claim and process jobs until stopped.
+
+    With ``once`` the worker drains the queue and returns instead of waiting
+    for new work. Returns the number of jobs processed.
+    """
+    worker_id = worker_id or default_worker_id()
+    poll_interval = settings.PROCESSING_WORKER_POLL_INTERVAL if poll_interval is None else poll_interval
+    processed = 0
+
+    logger.info(f"Worker {worker_id} started")
+    requeue_stale_jobs()
+    cache_service.evict()
+    while max_jobs is None or processed < max_jobs:
+        close_old_connections()
+        job = claim_next_job(worker_id)
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        logger.info(f"Worker {worker_id} claimed job {job.id}")
+        process_job(job)
+        processed += 1
+        cache_service.evict()
+
+    logger.info(f"Worker {worker_id} stopped after {processed} job(s)")
+    return processed
+
+
+async def arun_worker(worker_id=None, once=False, poll_interval=None, max_jobs=None, max_concurrent_jobs=None):
+    """``run_worker`` on the event loop, running up to ``max_concurrent_jobs`` jobs at once.
+
+    Used by ``run_worker --async`` and, with ``PROCESSING_IN_ASGI``, by the
+    ASGI application itself. Cancelling it cancels the running jobs; they
+    are requeued as stale by the next worker to start.
+    """
+    worker_id = worker_id or default_worker_id()
+    poll_interval = settings.PROCESSING_WORKER_POLL_INTERVAL if poll_interval is None else poll_interval
+    max_concurrent_jobs = max_concurrent_jobs or settings.PROCESSING_ASYNC_MAX_JOBS
+    running = set()
+    claimed = processed = 0
+
+    logger.info(f"Worker {worker_id} started on the event loop")
+    await sync_to_async(requeue_stale_jobs)()
+    await sync_to_async(cache_service.evict)()
+    try:
+        while True:
+            while len(running) < max_concurrent_jobs and (max_jobs is None or claimed < max_jobs):
+                await sync_to_async(close_old_connections)()
+                job = await sync_to_async(claim_next_job)(worker_id)
+                if job is None:
+                    break
+                logger.info(f"Worker {worker_id} claimed job {job.id}")
+                running.add(asyncio.create_task(aprocess_job(job)))
+                claimed += 1
+
+            if not running:
+                if once or (max_jobs is not None and claimed >= max_jobs):
+                    break
+                await asyncio.sleep(poll_interval)
+                continue
+
+            done, running = await asyncio.wait(running, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED)
+            if done:
+                processed += len(done)
+                await sync_to_async(cache_service.evict)()
+    finally:
+        for task in running:
+            task.cancel()
+
+    logger.info(f"Worker {worker_id} stopped after {processed} job(s)")
+    return processed
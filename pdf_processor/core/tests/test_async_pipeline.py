@@ -0,0 +1,195 @@
+import asyncio
+import shutil
+import tempfile
+from unittest import mock
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.core.handlers.asgi import ASGIHandler
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import tasks
+from core.asgi import WorkerLifespan
+from core.benchmarks.corpus import synthetic_case_report
+from core.models import ExtractedCase, PDFDocument, ProcessingJob, ProcessingResult
+from core.services import llm_service
+from core.services.llm_service import StubBackend
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT, LLM_BACKEND='stub', LLM_STUB_LATENCY=0, LLM_STUB_ERROR_RATE=0,
+    LLM_REQUESTS_PER_MINUTE=0, LLM_TOKENS_PER_MINUTE=0, LLM_RETRY_BASE_DELAY=0,
+    EXTRACTION_CACHE_ENABLED=False, MODEL_ROUTING_ENABLED=False, PROCESSING_ASYNC_MAX_CONCURRENCY=32,
+)
+class AsyncPipelineTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        llm_service.reset_llm_client()
+        self.addCleanup(llm_service.reset_llm_client)
+
+    def create_job(self, documents=4, **kwargs):
+        job = ProcessingJob.objects.create(name='async', **kwargs)
+        for i in range(documents):
+            PDFDocument.objects.create(job=job, file=ContentFile(synthetic_case_report(i), name=f'case{i}.pdf'))
+        return job
+
+    def test_documents_are_in_flight_together(self):
+        """Test that one event loop keeps every document of a job waiting on the model at once"""
+        job = self.create_job(documents=12)
+        in_flight = {'now': 0, 'max': 0}
+        achat = StubBackend.achat
+
+        async def slow_achat(backend, messages, model_name, generation_config):
+            in_flight['now'] += 1
+            in_flight['max'] = max(in_flight['max'], in_flight['now'])
+            await asyncio.sleep(0.02)
+            in_flight['now'] -= 1
+            return await achat(backend, messages, model_name, generation_config)
+
+        with mock.patch.object(StubBackend, 'achat', slow_achat), \
+                mock.patch.object(StubBackend, 'chat', side_effect=AssertionError('blocking call')):
+            async_to_sync(tasks.aprocess_job)(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(ProcessingResult.objects.filter(document__job=job).count(), 12)
+        self.assertTrue(ExtractedCase.objects.filter(job=job).exists())
+        self.assertEqual(in_flight['max'], 12)
+
+    def test_concurrency_limit_and_retries(self):
+        """Test that the job's limit caps calls in flight and transient errors are retried"""
+        job = self.create_job(documents=6, max_concurrency=2)
+        in_flight = {'now': 0, 'max': 0, 'failed': 0}
+        achat = StubBackend.achat
+
+        async def flaky_achat(backend, messages, model_name, generation_config):
+            in_flight['now'] += 1
+            in_flight['max'] = max(in_flight['max'], in_flight['now'])
+            try:
+                await asyncio.sleep(0.01)
+                if in_flight['failed'] < 3:
+                    in_flight['failed'] += 1
+                    raise llm_service.LLMError('Simulated server error', status=503)
+                return await achat(backend, messages, model_name, generation_config)
+            finally:
+                in_flight['now'] -= 1
+
+        with mock.patch.object(StubBackend, 'achat', flaky_achat):
+            async_to_sync(tasks.aprocess_job)(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertFalse(job.documents.exclude(status='completed').exists())
+        self.assertEqual(in_flight['max'], 2)
+
+    def test_streamed_rows_are_checkpointed(self):
+        """Test that streamed cases are saved as partial results before each document completes"""
+        job = self.create_job(documents=3)
+        saved = []
+        save_partial_result = tasks.save_partial_result
+
+        def checkpoint(pdf_doc, turns, case_results):
+            saved.append(pdf_doc.id)
+            save_partial_result(pdf_doc, turns, case_results)
+
+        streaming = self.settings(
+            LLM_STREAMING=True, CASE_SERIES_CASES_PER_TURN=0, LLM_STUB_LATENCY=0.05, LLM_STUB_JITTER=0
+        )
+        with streaming, mock.patch.object(tasks, 'save_partial_result', side_effect=checkpoint):
+            async_to_sync(tasks.aprocess_job)(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(set(saved), set(job.documents.values_list('id', flat=True)))
+        self.assertFalse(ProcessingResult.objects.filter(document__job=job, complete=False).exists())
+
+    def test_async_worker_drains_queue(self):
+        """Test that the asyncio worker claims and finishes queued jobs side by side"""
+        first, second = self.create_job(documents=2), self.create_job(documents=2)
+        tasks.enqueue_job(first)
+        tasks.enqueue_job(second)
+
+        processed = async_to_sync(tasks.arun_worker)(worker_id='async-test', once=True, poll_interval=0.01)
+
+        self.assertEqual(processed, 2)
+        self.assertEqual(ProcessingJob.objects.filter(status='completed', worker_id='async-test').count(), 2)
+
+    def test_submit_endpoint(self):
+        """Test that the async upload endpoint queues a job or reports form errors"""
+        response = self.client.post(reverse('core:submit_job'), {
+            'name': 'api upload',
+            'pdf_file': SimpleUploadedFile('paper.pdf', synthetic_case_report(1), content_type='application/pdf'),
+        })
+        self.assertEqual(response.status_code, 202)
+        job = ProcessingJob.objects.get(pk=response.json()['job_id'])
+        self.assertEqual((job.status, job.documents.count()), ('pending', 1))
+
+        response = self.client.post(reverse('core:submit_job'), {
+            'name': 'not a pdf',
+            'pdf_file': SimpleUploadedFile('notes.txt', b'notes', content_type='text/plain'),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pdf_file', response.json()['errors'])
+
+
+class ASGIHandlerTests(SimpleTestCase):
+    def test_middleware_chain_is_async(self):
+        """Test that the installed middleware keeps the ASGI chain async, so async views do not take a thread"""
+        self.assertTrue(iscoroutinefunction(ASGIHandler()._middleware_chain))
+
+
+class WorkerLifespanTests(SimpleTestCase):
+    def run_lifespan(self):
+        started = asyncio.Event()
+        stopped = []
+
+        async def fake_worker():
+            started.set()
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                stopped.append(True)
+                raise
+
+        async def lifespan():
+            app = WorkerLifespan(mock.AsyncMock())
+            messages = asyncio.Queue()
+            sent = []
+
+            async def send(message):
+                sent.append(message['type'])
+
+            await messages.put({'type': 'lifespan.startup'})
+            server = asyncio.create_task(app({'type': 'lifespan'}, messages.get, send))
+            await asyncio.sleep(0.01)
+            running = started.is_set()
+            await messages.put({'type': 'lifespan.shutdown'})
+            await server
+            return sent, running
+
+        with mock.patch.object(tasks, 'arun_worker', fake_worker):
+            sent, running = asyncio.run(lifespan())
+        return sent, running, stopped
+
+    def test_worker_runs_for_the_lifespan(self):
+        """Test that the in-process worker starts with the server and is cancelled at shutdown"""
+        with self.settings(PROCESSING_IN_ASGI=True):
+            sent, running, stopped = self.run_lifespan()
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+        self.assertTrue(running)
+        self.assertEqual(stopped, [True])
+
+    def test_worker_is_off_by_default(self):
+        """Test that without PROCESSING_IN_ASGI the lifespan only acknowledges"""
+        with self.settings(PROCESSING_IN_ASGI=False):
+            sent, running, stopped = self.run_lifespan()
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+        self.assertFalse(running)
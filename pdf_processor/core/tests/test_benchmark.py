@@ -0,0 +1,65 @@
+import hashlib
+import io
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.benchmarks.corpus import synthetic_case_report
+from core.benchmarks.pipeline import percentile, run_pipeline
+from core.models import ProcessingJob
+from core.services import llm_service
+from core.services.pdf_service import PdfReader
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class CorpusTests(SimpleTestCase):
+    def test_sizes_and_text_layer(self):
+        """Test that synthetic reports grow with size, are distinct and only scans lack text"""
+        small, medium, scanned = (synthetic_case_report(1, size) for size in ('small', 'medium', 'scanned'))
+        self.assertLess(len(small), len(medium))
+        self.assertNotEqual(hashlib.sha256(small).digest(), hashlib.sha256(synthetic_case_report(2)).digest())
+
+        reader = PdfReader(io.BytesIO(medium))
+        self.assertEqual(len(reader.pages), 16)
+        self.assertIn('doi: 10.1000/synthetic.1', reader.pages[0].extract_text())
+        self.assertEqual(PdfReader(io.BytesIO(scanned)).pages[0].extract_text().strip(), '')
+
+    def test_percentile(self):
+        """Test the nearest-rank percentile"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3.0], 95), 3.0)
+        self.assertIsNone(percentile([], 50))
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT, LLM_BACKEND='stub', LLM_STUB_LATENCY=0, LLM_STUB_ERROR_RATE=0.3,
+    LLM_REQUESTS_PER_MINUTE=0, LLM_TOKENS_PER_MINUTE=0, LLM_RETRY_BASE_DELAY=0, LLM_MAX_RETRIES=50,
+)
+class PipelineBenchmarkTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        llm_service.reset_llm_client()
+        self.addCleanup(llm_service.reset_llm_client)
+
+    def test_pipeline_report(self):
+        """Test that a run with simulated errors completes every document and reports each phase"""
+        report = run_pipeline(documents=4, sizes=['small', 'scanned'], jobs=2, renders=3)
+
+        self.assertEqual(ProcessingJob.objects.filter(status='completed').count(), 2)
+        self.assertEqual(report['corpus']['sizes'], {'small': 2, 'scanned': 2})
+        self.assertEqual(report['extract']['completed'], 4)
+        self.assertGreater(report['extract']['cases'], 0)
+        self.assertGreaterEqual(report['extract']['attempts'], 4 + report['extract']['failed_attempts'])
+        self.assertEqual(report['extract']['latency']['count'], 4)
+        self.assertEqual(report['render']['home']['count'], 3)
+        self.assertLessEqual(report['render']['results']['p50'], report['render']['results']['p99'])
+        self.assertIn('llm_call', report['stages'])
+        self.assertGreater(report['memory']['max_rss_bytes'], 0)
@@ -0,0 +1,154 @@
+import hashlib
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core import tasks
+from core.benchmarks.corpus import case_report_pages, make_pdf
+from core.models import DocumentFingerprint, PDFDocument, ProcessingJob, ProcessingResult
+from core.services import dedupe_service, llm_service
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def pages_of(lines_per_page):
+    return [{'number': number, 'text': '\n'.join(lines)} for number, lines in enumerate(lines_per_page, start=1)]
+
+
+def without_doi(index):
+    return [[line for line in lines if not line.startswith('doi:')] for lines in case_report_pages(index)]
+
+
+class FingerprintTests(SimpleTestCase):
+    def test_identifiers_are_normalised(self):
+        """Test that DOIs lose resolver prefixes and case, and short titles are not used"""
+        self.assertEqual(dedupe_service.normalize_doi('https://doi.org/10.1000/ABC.12.'), '10.1000/abc.12')
+        self.assertEqual(dedupe_service.normalize_doi('doi: 10.1000/abc.12'), '10.1000/abc.12')
+        self.assertEqual(dedupe_service.normalize_doi('no identifier'), '')
+        self.assertEqual(dedupe_service.normalize_title('Spinal Meningioma: A Case Report'), 'spinal meningioma a case report')
+        self.assertEqual(dedupe_service.normalize_title('Case report'), '')
+
+    def test_minhash_separates_papers(self):
+        """Test that a re-rendered copy scores close to 1 and shares bands, another paper does not"""
+        original = dedupe_service.minhash(pages_of(case_report_pages(1)))
+        copy = dedupe_service.minhash(pages_of(case_report_pages(1) + [['Downloaded from the publisher website']]))
+        other = dedupe_service.minhash(pages_of(case_report_pages(2)))
+
+        self.assertGreaterEqual(dedupe_service.similarity(original, copy), 0.9)
+        self.assertLess(dedupe_service.similarity(original, other), 0.9)
+        self.assertTrue(set(dedupe_service.band_keys(original)) & set(dedupe_service.band_keys(copy)))
+        self.assertIsNone(dedupe_service.minhash(pages_of([['Too short to fingerprint']])))
+
+    def test_minhash_matches_the_scalar_definition(self):
+        """Test that the vectorised signature equals min((a * shingle + b) mod p) computed with Python ints"""
+        pages = pages_of(case_report_pages(1))
+        words = dedupe_service.WORD_RE.findall(' '.join(page['text'] for page in pages).lower())
+        shingles = {
+            int.from_bytes(hashlib.blake2b(' '.join(words[i:i + 5]).encode(), digest_size=8).digest(), 'big')
+            for i in range(len(words) - 4)
+        }
+        expected = [min((a * x + b) % dedupe_service._PRIME for x in shingles) for a, b in dedupe_service.PERMUTATIONS]
+        with mock.patch.object(dedupe_service, 'MINHASH_BLOCK', 7):
+            self.assertEqual(dedupe_service.minhash(pages), expected)
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT, LLM_BACKEND='stub', LLM_STUB_LATENCY=0, LLM_STUB_ERROR_RATE=0,
+    LLM_REQUESTS_PER_MINUTE=0, LLM_TOKENS_PER_MINUTE=0, EXTRACTION_CACHE_ENABLED=False,
+    MODEL_ROUTING_ENABLED=False, CASE_SERIES_CASES_PER_TURN=0, DEDUPE_ENABLED=True,
+)
+class DuplicateUploadTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        llm_service.reset_llm_client()
+        self.addCleanup(llm_service.reset_llm_client)
+
+    def run_job(self, *contents, **kwargs):
+        """Process a job of the given PDFs; returns its documents and the number of LLM calls."""
+        job = ProcessingJob.objects.create(name='dedupe', **kwargs)
+        documents = [
+            PDFDocument.objects.create(job=job, file=ContentFile(content, name=f'upload{i}.pdf'))
+            for i, content in enumerate(contents)
+        ]
+        client = llm_service.get_llm_client()
+        with mock.patch.object(client, 'chat', wraps=client.chat) as chat:
+            tasks.process_job(job)
+        for pdf_doc in documents:
+            pdf_doc.refresh_from_db()
+        return documents, chat.call_count
+
+    def assertReuses(self, duplicate, original):
+        self.assertEqual(duplicate.status, 'completed')
+        self.assertEqual(duplicate.duplicate_of_id, original.id)
+        self.assertEqual(
+            ProcessingResult.objects.get(document=duplicate).result_data,
+            ProcessingResult.objects.get(document=original).result_data,
+        )
+        self.assertEqual(duplicate.cases.count(), original.cases.count())
+
+    def test_later_uploads_reuse_the_earlier_result(self):
+        """Test that the same file, the same DOI and near-identical text skip the LLM"""
+        (original,), calls = self.run_job(make_pdf(case_report_pages(1)))
+        self.assertEqual(calls, 1)
+        self.assertEqual(DocumentFingerprint.objects.get(document=original).doi, '10.1000/synthetic.1')
+
+        reprint = make_pdf(case_report_pages(1) + [['Downloaded from the publisher website']])
+        (same_file, same_doi), calls = self.run_job(make_pdf(case_report_pages(1)), reprint)
+        self.assertEqual(calls, 0)
+        self.assertReuses(same_file, original)
+        self.assertReuses(same_doi, original)
+
+        (text_original,), _ = self.run_job(make_pdf(without_doi(2)))
+        (similar,), calls = self.run_job(make_pdf(without_doi(2) + [['Downloaded from the publisher website']]))
+        self.assertEqual(calls, 0)
+        self.assertReuses(similar, text_original)
+
+    def test_duplicates_within_one_upload(self):
+        """Test that a paper uploaded twice in one job is extracted once"""
+        reprint = make_pdf(case_report_pages(3) + [['Downloaded from the publisher website']])
+        (original, duplicate, other), calls = self.run_job(
+            make_pdf(case_report_pages(3)), reprint, make_pdf(case_report_pages(4))
+        )
+        self.assertEqual(calls, 2)
+        self.assertReuses(duplicate, original)
+        self.assertIsNone(other.duplicate_of_id)
+
+    def test_fingerprints_are_computed_in_the_pool(self):
+        """Test that uploads without a fingerprint are read and hashed off the coordinating thread"""
+        threads = []
+
+        def compute(pages):
+            threads.append(threading.current_thread().name)
+            return compute_fingerprint(pages)
+
+        compute_fingerprint = dedupe_service.compute_fingerprint
+        with mock.patch.object(dedupe_service, 'compute_fingerprint', compute):
+            documents, calls = self.run_job(make_pdf(case_report_pages(6)), make_pdf(case_report_pages(7)))
+        self.assertEqual(calls, 2)
+        self.assertEqual(len(threads), 2)
+        self.assertTrue(all(name.startswith('job-') for name in threads), threads)
+        self.assertEqual(DocumentFingerprint.objects.filter(document__in=documents).count(), 2)
+        self.assertTrue(all(pdf_doc.pages.exists() for pdf_doc in documents))
+
+    def test_non_duplicates(self):
+        """Test that different DOIs, other prompt templates and disabled detection all extract again"""
+        self.run_job(make_pdf(case_report_pages(5)))
+
+        retitled = [[line.replace('synthetic.5', 'synthetic.500') for line in lines] for lines in case_report_pages(5)]
+        (document,), calls = self.run_job(make_pdf(retitled))
+        self.assertEqual((calls, document.duplicate_of_id), (1, None))
+
+        (document,), calls = self.run_job(make_pdf(case_report_pages(5)), prompt_template='case_review')
+        self.assertEqual((calls, document.duplicate_of_id), (1, None))
+
+        with self.settings(DEDUPE_ENABLED=False):
+            (document,), calls = self.run_job(make_pdf(case_report_pages(5)))
+        self.assertEqual((calls, document.duplicate_of_id), (1, None))
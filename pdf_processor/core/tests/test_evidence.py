@@ -0,0 +1,122 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import tasks
+from core.benchmarks.corpus import case_report_pages, synthetic_case_report
+from core.models import ExtractedField, PDFDocument, ProcessingJob
+from core.services import evidence_service
+from core.services.pdf_service import read_pages, store_pages
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def pages_of(lines_per_page):
+    return [{'number': number, 'text': '\n'.join(lines)} for number, lines in enumerate(lines_per_page, start=1)]
+
+
+class LocateTests(SimpleTestCase):
+    def setUp(self):
+        self.pages = pages_of(case_report_pages(1))
+
+    def found(self, value, label=''):
+        evidence = evidence_service.locate(value, self.pages, label)
+        if evidence is None:
+            return None
+        return evidence['page'], self.pages[evidence['page'] - 1]['text'][evidence['start']:evidence['end']]
+
+    def test_values_are_found_on_their_page(self):
+        """Test that values match across case and spacing, and short values need their label nearby"""
+        self.assertEqual(self.found('who grade  II', 'WHO Grade'), (3, 'WHO Grade II'))
+        self.assertEqual(self.found('35', 'Patient age'), None)
+        self.assertEqual(self.found('35-year-old', 'Patient age'), (2, '35-year-old'))
+        self.assertEqual(self.found('II', 'WHO Grade'), (3, 'II'))
+        self.assertEqual(self.found('Subtotal', 'Extent of resection (total or subtotal)'), (2, 'subtotal'))
+
+    def test_unfindable_values(self):
+        """Test that one-letter codes, absent values and short values without context are not located"""
+        self.assertIsNone(self.found('y', 'Recurrence (y/n)'))
+        self.assertIsNone(self.found('WHO Grade III', 'WHO Grade'))
+        self.assertIsNone(self.found('II'))
+        self.assertIsNone(evidence_service.locate('WHO Grade II', None))
+
+    def test_snippet(self):
+        """Test that a snippet marks the span and flattens line breaks"""
+        self.assertEqual(evidence_service.snippet('one\ntwo three', 4, 7), 'one [[two]] three')
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class EvidenceTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.job = ProcessingJob.objects.create(name='evidence', status='completed')
+        self.pdf_doc = PDFDocument.objects.create(
+            job=self.job, file=ContentFile(synthetic_case_report(1), name='case.pdf')
+        )
+        store_pages(self.pdf_doc, read_pages(self.pdf_doc))
+        case = {
+            '4': {'value': '35-year-old', 'confidence': 5},
+            '9': {'value': 'WHO Grade II', 'confidence': 5},
+            '13': {'value': 'n', 'confidence': 4},
+        }
+        tasks.save_document_result(self.pdf_doc, {'success': True, 'parsed_json': {'case_results': [case]}})
+
+    def test_fields_link_to_their_page(self):
+        """Test that saved fields carry their page and span, served with a snippet by the evidence endpoint"""
+        grade = ExtractedField.objects.get(case__document=self.pdf_doc, field_key='9')
+        self.assertEqual(grade.page, 3)
+        self.assertIsNone(ExtractedField.objects.get(case__document=self.pdf_doc, field_key='13').page)
+
+        with self.assertNumQueries(3):
+            data = self.client.get(reverse('core:case_evidence', args=[self.pdf_doc.id, 0])).json()
+        self.assertEqual(list(data['fields']), ['4', '9', '13'])
+        self.assertEqual(data['fields']['9']['label'], 'WHO Grade')
+        self.assertEqual(data['fields']['9']['evidence']['page'], 3)
+        self.assertIn('[[WHO Grade II]] clear cell', data['fields']['9']['evidence']['snippet'])
+        self.assertIsNone(data['fields']['13']['evidence'])
+        self.assertEqual(self.client.get(reverse('core:case_evidence', args=[self.pdf_doc.id, 5])).status_code, 404)
+
+        rows = self.client.get(reverse('core:job_results', args=[self.job.id])).json()['rows']
+        self.assertEqual(rows[0]['fields']['9']['evidence'], {'page': 3, 'start': grade.span_start, 'end': grade.span_end})
+
+    def test_search_uses_the_page_index(self):
+        """Test that evidence search finds pages through the full-text index, and only through it"""
+        self.assertEqual(evidence_service.page_index(), 'fts5')
+        url = reverse('core:search_document', args=[self.pdf_doc.id])
+        # The backend is worked out once, not by inspecting the schema on every search
+        with mock.patch.object(connection.introspection, 'table_names') as table_names:
+            matches = self.client.get(url, {'q': 'who grade II'}).json()['matches']
+        table_names.assert_not_called()
+        self.assertEqual([(match['document_id'], match['page']) for match in matches], [(self.pdf_doc.id, 3)])
+        self.assertIn('[[WHO Grade II]]', matches[0]['snippet'])
+
+        # Without a page index search is refused rather than scanning every page
+        with mock.patch.object(evidence_service, 'page_index', return_value=None):
+            self.assertEqual(self.client.get(url, {'q': 'who grade II'}).status_code, 501)
+            with self.assertRaises(RuntimeError):
+                evidence_service.search_pages(PDFDocument.objects.all(), 'grade')
+
+        job_matches = self.client.get(reverse('core:search_job', args=[self.job.id]), {'q': 'meningioma'}).json()
+        self.assertEqual({match['page'] for match in job_matches['matches']}, {1, 3, 4})
+        self.assertEqual(self.client.get(url, {'q': 'glioblastoma'}).json()['matches'], [])
+
+    def test_index_follows_the_pages(self):
+        """Test that deleted documents leave the index and bad searches are rejected"""
+        url = reverse('core:search_job', args=[self.job.id])
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'q': 'grade', 'limit': 'x'}).status_code, 400)
+
+        self.pdf_doc.delete()
+        self.assertEqual(self.client.get(url, {'q': 'grade'}).status_code, 404)
+        other = PDFDocument.objects.create(job=self.job, file=ContentFile(b'%PDF-1.4', name='empty.pdf'))
+        self.assertEqual(evidence_service.search_pages(PDFDocument.objects.filter(pk=other.pk), 'grade'), [])
+        self.assertEqual(evidence_service.matching_pages(PDFDocument.objects.all(), 'WHO grade'), [])
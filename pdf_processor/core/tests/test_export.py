@@ -0,0 +1,90 @@
+import csv
+import io
+import shutil
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+from xml.etree import ElementTree
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.models import PDFDocument, ProcessingJob
+from core.services import export_service
+from core.services.results_service import store_cases
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+
+def make_case(job, n):
+    return {str(i): {'value': f'job{job}-case{n}-{i} <&>', 'confidence': n % 5 + 1} for i in range(16)}
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ExportTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.jobs = []
+        for j in range(2):
+            job = ProcessingJob.objects.create(name=f'export{j}', status='completed')
+            for d in range(2):
+                pdf_doc = PDFDocument.objects.create(job=job, file=ContentFile(b'%PDF-1.4', name=f'paper{d}.pdf'))
+                store_cases(pdf_doc, [make_case(j, n) for n in range(3)])
+            self.jobs.append(job)
+
+    def export(self, export_format, jobs=None):
+        jobs = jobs or self.jobs
+        query = '&'.join(f'job={job.id}' for job in jobs)
+        response = self.client.get(f"{reverse('core:export_results', args=[export_format])}?{query}")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_csv_merges_jobs(self):
+        """Test that a CSV export contains every case of every requested job"""
+        rows = list(csv.reader(io.StringIO(self.export('csv').decode('utf-8-sig'))))
+        self.assertEqual(rows[0][:5], ['job_id', 'document', 'case', '0', '0 confidence'])
+        self.assertEqual(len(rows), 1 + 12)
+        self.assertEqual({row[0] for row in rows[1:]}, {str(job.id) for job in self.jobs})
+        self.assertEqual(rows[1][3], 'job0-case0-0 <&>')
+
+    def test_xlsx_is_a_valid_workbook(self):
+        """Test that the streamed XLSX zip holds a sheet with one row per case"""
+        archive = zipfile.ZipFile(io.BytesIO(self.export('xlsx', self.jobs[:1])))
+        self.assertIn('xl/workbook.xml', archive.namelist())
+        sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        rows = sheet.findall(f'{SHEET_NS}sheetData/{SHEET_NS}row')
+        self.assertEqual(len(rows), 1 + 6)
+        first_value = rows[1].findall(f'{SHEET_NS}c')[3].find(f'{SHEET_NS}is/{SHEET_NS}t').text
+        self.assertEqual(first_value, 'job0-case0-0 <&>')
+
+    @unittest.skipIf(export_service.pa is None, 'pyarrow is not installed')
+    def test_parquet_round_trips(self):
+        """Test that the Parquet export reads back with the same rows"""
+        import pyarrow.parquet as pq
+        with mock.patch.object(export_service, 'CHUNK_ROWS', 5):
+            table = pq.read_table(io.BytesIO(self.export('parquet')))
+        self.assertEqual(table.num_rows, 12)
+        self.assertEqual(table.column('0').to_pylist()[0], 'job0-case0-0 <&>')
+        self.assertEqual(table.column('0 confidence').to_pylist()[:3], [1, 2, 3])
+
+    def test_export_is_streamed_in_chunks(self):
+        """Test that rows are emitted as they are read rather than at the end"""
+        with mock.patch.object(export_service, 'CHUNK_ROWS', 4):
+            chunks, _, _ = export_service.export_cases(self.jobs, 'csv')
+            self.assertEqual(len([chunk for chunk in chunks if chunk]), 3)
+
+    def test_unknown_format_and_job(self):
+        """Test that bad requests are rejected before streaming starts"""
+        url = reverse('core:export_results', args=['pdf'])
+        self.assertEqual(self.client.get(f'{url}?job={self.jobs[0].id}').status_code, 400)
+        url = reverse('core:export_results', args=['csv'])
+        self.assertEqual(self.client.get(f'{url}?job=999').status_code, 404)
@@ -0,0 +1,240 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.models import PDFDocument, ProcessingJob
+from core import utils
+from core.services import extraction_service, llm_service
+from core.services.metrics import STRUCTURED_REPLIES
+from core.services.prompt_registry import get_template
+from core.utils import CaseStream, parse_extraction
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class ParseExtractionTests(SimpleTestCase):
+    def test_instruction_is_stripped(self):
+        """Test that the next-cases instruction is detected and removed wherever it appears"""
+        text = '```json\n{"case_results": [{"0": {"value": "a", "confidence": 5}}], ' \
+               '"instruction": {"value": "Request the next cases", "confidence": 5}}\n```'
+        data, more = parse_extraction(text)
+        self.assertTrue(more)
+        self.assertNotIn('instruction', data)
+        self.assertEqual(len(data['case_results']), 1)
+
+        text = '{"case_results": [{"0": "a"}, {"instruction": {"value": "Request the next cases"}}]}'
+        data, more = parse_extraction(text)
+        self.assertTrue(more)
+        self.assertEqual(len(data['case_results']), 1)
+        self.assertEqual(data['case_results'][0]['0'], {'value': 'a', 'confidence': 1})
+
+        data, more = parse_extraction('{"case_results": [{"0": "a"}]}')
+        self.assertFalse(more)
+
+    def test_cases_stream_out_as_they_close(self):
+        """Test that a streamed reply yields each padded case once its brace closes"""
+        cases = []
+        stream = CaseStream(get_template('case_review'), cases.append)
+        text = '```json\n{"case_results": [{"0": {"value": "a", "confidence": 5}, "4": "12"}, ' \
+               '{"0": "b", "instruction": {"value": "Request the next cases"}}, {"0": "c"'
+        for i in range(0, len(text), 7):
+            stream.feed(text[i:i + 7])
+            if i < text.index('{"0": "b"'):
+                self.assertLessEqual(len(cases), 1)
+
+        self.assertEqual([case['0']['value'] for case in cases], ['a', 'b'])
+        self.assertEqual(cases[0]['4'], {'value': '12', 'confidence': 1})
+        self.assertEqual(set(cases[1]), set(get_template('case_review').required_fields))
+
+        rows = []
+        CaseStream(get_template(), rows.append).feed('[{"0": "a"}, {"1": "b"}]')
+        self.assertEqual(len(rows), 2)
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT, LLM_BACKEND='stub', LLM_STUB_LATENCY=0,
+    LLM_REQUESTS_PER_MINUTE=0, LLM_TOKENS_PER_MINUTE=0,
+    CASE_SERIES_CASES_PER_TURN=1, CASE_SERIES_MAX_TURNS=20, MODEL_ROUTING_ENABLED=False,
+)
+class CaseSeriesTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        llm_service.reset_llm_client()
+        self.addCleanup(llm_service.reset_llm_client)
+        self.job = ProcessingJob.objects.create(name='series')
+
+    def series_document(self, min_cases=3):
+        """Return a document the stub answers with at least ``min_cases`` cases."""
+        for i in range(100):
+            pdf_doc = PDFDocument.objects.create(
+                job=self.job, file=ContentFile(f'%PDF-1.4 series {i}'.encode(), name='series.pdf')
+            )
+            result = extraction_service.process_pdf_with_gemini(pdf_doc)
+            if len(result['parsed_json']['case_results']) >= min_cases:
+                return pdf_doc, result
+        self.fail('No stub document with enough cases')
+
+    def test_series_is_extracted_over_several_turns(self):
+        """Test that follow-up turns run until the model stops asking for more"""
+        pdf_doc, expected = self.series_document()
+        cases = expected['parsed_json']['case_results']
+        client = llm_service.get_llm_client()
+        checkpoints = []
+
+        with mock.patch.object(client, 'chat', wraps=client.chat) as chat:
+            result = extraction_service.process_pdf_with_gemini(
+                pdf_doc, on_turn=lambda turns, case_results: checkpoints.append(len(case_results))
+            )
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['parsed_json'], expected['parsed_json'])
+        self.assertEqual(chat.call_count, len(cases))
+        self.assertEqual(len(result['turns']), len(cases))
+        self.assertEqual(checkpoints, list(range(1, len(cases))))
+        self.assertEqual(len({str(case) for case in cases}), len(cases))
+        for case in cases:
+            self.assertNotIn('instruction', case)
+
+        # Later turns keep the document from the first turn in the history
+        last_messages = chat.call_args_list[-1].args[0]
+        self.assertEqual(last_messages[0], chat.call_args_list[0].args[0][0])
+        self.assertEqual([m['role'] for m in last_messages[-2:]], ['model', 'user'])
+
+    def test_series_resumes_from_saved_turns(self):
+        """Test that an interrupted series only asks for the cases still missing"""
+        pdf_doc, expected = self.series_document()
+        client = llm_service.get_llm_client()
+
+        with mock.patch.object(client, 'chat', wraps=client.chat) as chat:
+            result = extraction_service.process_pdf_with_gemini(pdf_doc, resume_turns=expected['turns'][:1])
+
+        self.assertEqual(result['parsed_json'], expected['parsed_json'])
+        self.assertEqual(chat.call_count, len(expected['turns']) - 1)
+
+    def test_turns_are_capped(self):
+        """Test that a runaway series stops after the configured number of turns"""
+        pdf_doc, expected = self.series_document()
+        with self.settings(CASE_SERIES_MAX_TURNS=2):
+            result = extraction_service.process_pdf_with_gemini(pdf_doc)
+
+        self.assertTrue(result['success'])
+        self.assertEqual(len(result['turns']), 2)
+        self.assertEqual(result['parsed_json']['case_results'], expected['parsed_json']['case_results'][:2])
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT, LLM_BACKEND='stub', LLM_STUB_LATENCY=0, LLM_STUB_ERROR_RATE=0,
+    LLM_REQUESTS_PER_MINUTE=0, LLM_TOKENS_PER_MINUTE=0, LLM_STRUCTURED_OUTPUT=True,
+    CASE_SERIES_CASES_PER_TURN=1, CASE_SERIES_MAX_TURNS=20, MODEL_ROUTING_ENABLED=False,
+)
+class StructuredOutputTests(TestCase):
+    def setUp(self):
+        llm_service.reset_llm_client()
+        self.addCleanup(llm_service.reset_llm_client)
+        job = ProcessingJob.objects.create(name='structured')
+        self.pdf_doc = PDFDocument.objects.create(job=job, file=ContentFile(b'%PDF-1.4 structured', name='s.pdf'))
+
+    def test_schema_is_sent_and_replies_skip_repair(self):
+        """Test that every turn carries the response schema and bare JSON replies are not repaired"""
+        client = llm_service.get_llm_client()
+        valid = STRUCTURED_REPLIES.value(result='valid')
+
+        with mock.patch.object(client, 'chat', wraps=client.chat) as chat, \
+                mock.patch.object(utils, '_parse_reply', side_effect=AssertionError('repaired')):
+            result = extraction_service.process_pdf_with_gemini(self.pdf_doc)
+
+        self.assertTrue(result['success'])
+        self.assertTrue(result['parsed_json']['case_results'])
+        for call in chat.call_args_list:
+            config = call.kwargs['generation_config']
+            self.assertEqual(config['response_mime_type'], 'application/json')
+            self.assertIs(config['response_schema'], get_template().response_schema)
+        self.assertEqual(STRUCTURED_REPLIES.value(result='valid') - valid, chat.call_count)
+
+    def test_invalid_reply_falls_back_to_repair(self):
+        """Test that a reply breaking the schema is still parsed by the tolerant path"""
+        fallback = STRUCTURED_REPLIES.value(result='fallback')
+        data, more = parse_extraction(
+            '```json\n{"case_results": [{"0": {"value": "a", "confidence": "high"}}]}\n```', structured=True
+        )
+        self.assertFalse(more)
+        self.assertEqual(data['case_results'][0]['0'], {'value': 'a', 'confidence': 'high'})
+        self.assertEqual(STRUCTURED_REPLIES.value(result='fallback') - fallback, 1)
+
+    def test_disabled(self):
+        """Test that without structured output the plain generation config is used"""
+        with self.settings(LLM_STRUCTURED_OUTPUT=False):
+            self.assertEqual(extraction_service.generation_config(get_template()), llm_service.DEFAULT_GENERATION_CONFIG)
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT, LLM_BACKEND='stub', LLM_STUB_LATENCY=0, LLM_STUB_ERROR_RATE=0,
+    LLM_REQUESTS_PER_MINUTE=0, LLM_TOKENS_PER_MINUTE=0, LLM_STREAMING=True,
+    CASE_SERIES_CASES_PER_TURN=0, CASE_SERIES_MAX_TURNS=20, MODEL_ROUTING_ENABLED=False,
+)
+class StreamingTests(TestCase):
+    def setUp(self):
+        llm_service.reset_llm_client()
+        self.addCleanup(llm_service.reset_llm_client)
+        self.job = ProcessingJob.objects.create(name='streaming')
+
+    def series_document(self, min_cases=3):
+        for i in range(100):
+            pdf_doc = PDFDocument.objects.create(
+                job=self.job, file=ContentFile(f'%PDF-1.4 stream {i}'.encode(), name='stream.pdf')
+            )
+            result = extraction_service.process_pdf_with_gemini(pdf_doc)
+            if len(result['parsed_json']['case_results']) >= min_cases:
+                return pdf_doc, result
+        self.fail('No stub document with enough cases')
+
+    def test_rows_arrive_before_the_reply_ends(self):
+        """Test that each case is checkpointed while the reply is still streaming"""
+        pdf_doc, expected = self.series_document()
+        cases = expected['parsed_json']['case_results']
+        client = llm_service.get_llm_client()
+        returned, checkpoints = [], []
+
+        def chat(*args, **kwargs):
+            self.assertIsNotNone(kwargs['on_text'])
+            response = llm_service.LLMClient.chat(client, *args, **kwargs)
+            returned.append(response)
+            return response
+
+        def on_turn(turns, case_results):
+            checkpoints.append((len(returned), turns, case_results))
+
+        with mock.patch.object(client, 'chat', side_effect=chat):
+            result = extraction_service.process_pdf_with_gemini(pdf_doc, on_turn=on_turn)
+
+        self.assertEqual(result['parsed_json'], expected['parsed_json'])
+        self.assertEqual(len(checkpoints), len(cases))
+        for i, (calls_done, turns, case_results) in enumerate(checkpoints, 1):
+            self.assertEqual((calls_done, turns), (0, []))
+            self.assertEqual(values(case_results), values(cases[:i]))
+
+    @override_settings(CASE_SERIES_CASES_PER_TURN=1)
+    def test_series_turns_are_streamed(self):
+        """Test that every turn of a series streams its cases on top of the earlier ones"""
+        pdf_doc, expected = self.series_document()
+        cases = expected['parsed_json']['case_results']
+        checkpoints = []
+
+        result = extraction_service.process_pdf_with_gemini(
+            pdf_doc, on_turn=lambda turns, case_results: checkpoints.append(len(case_results))
+        )
+
+        self.assertEqual(result['parsed_json'], expected['parsed_json'])
+        # One checkpoint per streamed case, one after each turn that leaves cases outstanding
+        self.assertEqual(checkpoints, sorted(list(range(1, len(cases) + 1)) + list(range(1, len(cases)))))
+
+
+def values(cases):
+    return [{key: entry['value'] for key, entry in case.items()} for case in cases]
@@ -0,0 +1,110 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from core.benchmarks.corpus import synthetic_case_report
+from core.models import DocumentFingerprint, PDFDocument, ProcessingJob
+from core.services import ingest_service, llm_service
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT, LLM_BACKEND='stub', LLM_STUB_LATENCY=0, LLM_STUB_ERROR_RATE=0,
+    LLM_REQUESTS_PER_MINUTE=0, LLM_TOKENS_PER_MINUTE=0, EXTRACTION_CACHE_ENABLED=False,
+    MODEL_ROUTING_ENABLED=False, CASE_SERIES_CASES_PER_TURN=0,
+)
+class IngestCommandTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        llm_service.reset_llm_client()
+        self.addCleanup(llm_service.reset_llm_client)
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        os.makedirs(os.path.join(self.folder, 'papers', 'nested'))
+        for i, name in enumerate(['papers/a.pdf', 'papers/nested/b.PDF']):
+            with open(os.path.join(self.folder, name), 'wb') as f:
+                f.write(synthetic_case_report(i))
+        with open(os.path.join(self.folder, 'papers', 'fake.pdf'), 'wb') as f:
+            f.write(b'<html>not a paper</html>')
+        with open(os.path.join(self.folder, 'papers', 'notes.txt'), 'w') as f:
+            f.write('notes')
+        self.archive = os.path.join(self.folder, 'search.zip')
+        with zipfile.ZipFile(self.archive, 'w') as archive:
+            archive.writestr('export/c.pdf', synthetic_case_report(2))
+            archive.writestr('export/readme.md', 'readme')
+
+    def ingest(self, *args):
+        out = io.StringIO()
+        client = llm_service.get_llm_client()
+        with mock.patch.object(client, 'chat', wraps=client.chat) as chat:
+            call_command('ingest_pdfs', *args, '--json', stdout=out)
+        return json.loads(out.getvalue()[out.getvalue().index('{'):]), chat.call_count
+
+    def test_folder_and_archive(self):
+        """Test that PDFs of a folder and a ZIP are stored with their source and hash, then extracted"""
+        report, calls = self.ingest(os.path.join(self.folder, 'papers'), self.archive, '--name', 'search')
+
+        job = ProcessingJob.objects.get(pk=report['job_id'])
+        self.assertEqual((job.name, job.status), ('search', 'completed'))
+        self.assertEqual(report['files'], {'added': 3, 'present': 0, 'skipped': 1})
+        self.assertEqual((report['completed'], report['failed'], calls), (3, 0, 3))
+        self.assertGreater(report['cases'], 0)
+
+        documents = {os.path.relpath(pdf_doc.source, self.folder): pdf_doc for pdf_doc in job.documents.all()}
+        self.assertEqual(set(documents), {'papers/a.pdf', 'papers/nested/b.PDF', 'search.zip:export/c.pdf'})
+        self.assertEqual(documents['papers/a.pdf'].sha256, hashlib.sha256(synthetic_case_report(0)).hexdigest())
+        self.assertEqual(documents['search.zip:export/c.pdf'].file.read(), synthetic_case_report(2))
+        # Fingerprinted while stored, so the job does not do it before extracting
+        self.assertEqual(DocumentFingerprint.objects.filter(document__job=job).count(), 3)
+
+    def test_resume_adds_only_new_files(self):
+        """Test that --resume skips files already in the job and does not extract finished documents again"""
+        pattern = os.path.join(self.folder, 'papers', '*.pdf')
+        first, _ = self.ingest(pattern)
+        self.assertEqual(first['files'], {'added': 1, 'present': 0, 'skipped': 1})
+
+        report, calls = self.ingest(pattern, self.archive, '--resume', str(first['job_id']))
+        self.assertEqual(report['job_id'], first['job_id'])
+        self.assertEqual(report['files'], {'added': 1, 'present': 1, 'skipped': 1})
+        self.assertEqual((report['documents'], report['completed'], calls), (2, 2, 1))
+
+    def test_queue_and_errors(self):
+        """Test that --queue leaves the job to the workers and bad sources or busy jobs are refused"""
+        call_command('ingest_pdfs', self.archive, '--queue', stdout=io.StringIO())
+        job = ProcessingJob.objects.get()
+        self.assertEqual((job.status, job.documents.count()), ('pending', 1))
+
+        with self.assertRaises(CommandError):
+            call_command('ingest_pdfs', os.path.join(self.folder, 'missing'), stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('ingest_pdfs', os.path.join(self.folder, 'papers', '*.txt'), stdout=io.StringIO())
+        self.assertEqual(ProcessingJob.objects.count(), 1)
+
+        job.status = 'processing'
+        job.save()
+        with self.assertRaises(CommandError):
+            call_command('ingest_pdfs', self.archive, '--resume', str(job.id), stdout=io.StringIO())
+
+    def test_sources_are_listed_lazily(self):
+        """Test that sources are found one at a time rather than collected up front"""
+        sources = ingest_service.iter_sources([self.archive, os.path.join(self.folder, 'missing')])
+        source, name, open_file = next(sources)
+        self.assertEqual(name, 'c.pdf')
+        with open_file() as f:
+            self.assertEqual(f.read(5), b'%PDF-')
+        with self.assertRaises(ValueError):
+            next(sources)
+        self.assertFalse(PDFDocument.objects.exists())
@@ -0,0 +1,61 @@
+import json
+import random
+
+from django.test import SimpleTestCase
+
+from core.management.commands.benchmark_json_parser import CORPUS
+from core.services.json_repair import JSONRepairParser, parse_json
+from core.utils import parse_extraction
+
+with open(CORPUS, encoding='utf-8') as f:
+    ENTRIES = json.load(f)
+
+
+class JSONRepairTests(SimpleTestCase):
+    def test_corpus_is_recovered(self):
+        """Test that every malformed reply in the benchmark corpus parses to its expected value"""
+        for entry in ENTRIES:
+            with self.subTest(entry['name']):
+                value, complete = parse_json(entry['text'])
+                self.assertEqual(value, entry['expected'])
+                self.assertEqual(complete, entry['complete'])
+
+    def test_chunked_feed_matches_single_pass(self):
+        """Test that feeding a reply in arbitrary chunks gives the same result"""
+        rng = random.Random(0)
+        for entry in ENTRIES:
+            with self.subTest(entry['name']):
+                text = entry['text']
+                parser = JSONRepairParser()
+                i = 0
+                while i < len(text):
+                    step = rng.randint(1, 7)
+                    parser.feed(text[i:i + step])
+                    i += step
+                expected = JSONRepairParser().feed(text).finish()
+                self.assertEqual(parser.finish(), expected)
+
+    def test_cases_are_reported_as_they_close(self):
+        """Test that partial output exposes each case as soon as its object closes"""
+        closed = []
+        parser = JSONRepairParser(on_complete=lambda path, value: closed.append(path))
+        parser.feed('{"case_results": [{"0": {"value": "A", "confidence": 5}}, {"0": {"val')
+        self.assertIn(('case_results', 0), closed)
+        self.assertNotIn(('case_results', 1), closed)
+        self.assertEqual(parser.value['case_results'][0]['0']['value'], 'A')
+
+    def test_truncated_reply_keeps_closed_cases(self):
+        """Test that a reply cut off mid-case keeps earlier cases and asks for the rest"""
+        entry = next(e for e in ENTRIES if e['name'] == 'truncated_mid_case')
+        data, more = parse_extraction(entry['text'])
+        self.assertTrue(more)
+        self.assertEqual(len(data['case_results']), 1)
+        self.assertEqual(data['case_results'][0]['0']['value'], 'c1-0')
+
+        with self.assertRaises(ValueError):
+            parse_extraction('{"case_results": [{"0": {"value": "Intraventricular')
+
+    def test_no_json(self):
+        """Test that replies without any JSON still raise"""
+        with self.assertRaises(ValueError):
+            parse_json('I could not find any case data in this document.')
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import threading
+from http.server import ThreadingHTTPServer
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from core.management.commands.run_llm_stub import StubHandler
+from core.services import llm_service
+from core.utils import MEDICAL_REVIEW_PROMPT, extract_json_from_text
+
+
+class StubBackendTests(SimpleTestCase):
+    def test_stub_is_deterministic(self):
+        """Test that the stub returns the same extraction for the same input"""
+        client = llm_service.LLMClient(llm_service.StubBackend(latency=0))
+        contents = [{'mime_type': 'application/pdf', 'data': b'%PDF-1.4 paper'}, MEDICAL_REVIEW_PROMPT]
+
+        first = client.generate(contents)
+        second = client.generate(contents)
+        other = client.generate([{'mime_type': 'application/pdf', 'data': b'%PDF-1.4 other'}, MEDICAL_REVIEW_PROMPT])
+
+        self.assertEqual(first.text, second.text)
+        self.assertNotEqual(first.text, other.text)
+        data = json.loads(extract_json_from_text(first.text))
+        self.assertEqual(len(data['case_results'][0]), 16)
+
+    def test_stub_streams_in_chunks(self):
+        """Test that a streamed stub reply arrives in chunks adding up to the full text, sync and async"""
+        client = llm_service.LLMClient(llm_service.StubBackend(latency=0))
+        messages = [{'role': 'user', 'parts': [{'mime_type': 'application/pdf', 'data': b'%PDF-1.4 paper'},
+                                                MEDICAL_REVIEW_PROMPT]}]
+        chunks, achunks = [], []
+
+        response = client.chat(messages, on_text=chunks.append)
+        aresponse = asyncio.run(client.achat(messages, on_text=achunks.append))
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), response.text)
+        self.assertEqual(achunks, chunks)
+        self.assertEqual(aresponse.text, client.chat(messages).text)
+
+    @override_settings(LLM_BACKEND='stub')
+    def test_client_is_reused(self):
+        """Test that the process-wide client is built once"""
+        llm_service.reset_llm_client()
+        try:
+            self.assertIs(llm_service.get_llm_client(), llm_service.get_llm_client())
+            self.assertEqual(llm_service.get_llm_client().backend.name, 'stub')
+        finally:
+            llm_service.reset_llm_client()
+
+
+class HTTPBackendTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        handler = type('TestStubHandler', (StubHandler,), {'latency': 0.0, 'files': {}})
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def test_http_backend_matches_in_process_stub(self):
+        """Test that the HTTP stub server answers exactly like the in-process stub"""
+        backend = llm_service.HTTPBackend(base_url=self.base_url, timeout=5)
+        contents = [{'mime_type': 'application/pdf', 'data': b'%PDF-1.4 paper'}, MEDICAL_REVIEW_PROMPT]
+
+        response = backend.generate(contents, 'gemini-1.5-pro', {})
+        expected = llm_service.stub_response_text([{'role': 'user', 'parts': contents}], 'gemini-1.5-pro')
+        self.assertEqual(response.text, expected)
+
+    def test_http_backend_reuses_connection(self):
+        """Test that consecutive calls on one thread share a kept-alive connection"""
+        backend = llm_service.HTTPBackend(base_url=self.base_url, timeout=5)
+        backend.generate(['Test connection'], 'stub', {})
+        conn = backend._local.conn
+        backend.generate(['Test connection'], 'stub', {})
+        self.assertIs(backend._local.conn, conn)
+
+    def test_http_file_upload(self):
+        """Test that uploads return a handle usable in later calls"""
+        backend = llm_service.HTTPBackend(base_url=self.base_url, timeout=5)
+        uploaded = backend.upload_file(__file__, 'application/pdf')
+        self.assertTrue(uploaded.uri.startswith('stub://files/'))
+        response = backend.generate([uploaded, MEDICAL_REVIEW_PROMPT], 'stub', {})
+        self.assertIn('case_results', response.text)
+        backend.delete_file(uploaded.name)
+
+        # An open file object is streamed rather than read in whole, and
+        # inline data may be a memoryview
+        with open(__file__, 'rb') as handle, mock.patch.object(handle, 'read', wraps=handle.read) as read:
+            self.assertEqual(backend.upload_file(handle, 'application/pdf').name, uploaded.name)
+        self.assertNotIn(mock.call(), read.call_args_list)
+        contents = [{'mime_type': 'application/pdf', 'data': memoryview(b'%PDF-1.4 paper')}, MEDICAL_REVIEW_PROMPT]
+        expected = llm_service.stub_response_text(
+            [{'role': 'user', 'parts': [{**contents[0], 'data': b'%PDF-1.4 paper'}, contents[1]]}], 'stub'
+        )
+        self.assertEqual(backend.generate(contents, 'stub', {}).text, expected)
@@ -0,0 +1,109 @@
+import shutil
+import tempfile
+
+from asgiref.sync import sync_to_async
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.models import PDFDocument, ProcessingJob
+from core.services import extraction_service, llm_service
+from core.services.metrics import STAGE_ERRORS, STAGE_SECONDS, Counter, Histogram, Registry, timed
+from core.services.results_service import store_cases
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class MetricFormatTests(SimpleTestCase):
+    def test_text_exposition(self):
+        """Test that counters and histograms render in Prometheus text format"""
+        registry = Registry()
+        counter = registry.register(Counter('things', 'Things seen.', labels=('kind',)))
+        histogram = registry.register(Histogram('latency_seconds', 'Latency.', buckets=(0.1, 1)))
+        counter.inc(kind='a "quoted"\nvalue')
+        counter.inc(2, kind='b')
+        histogram.observe(0.1)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        lines = registry.render().splitlines()
+        self.assertEqual(lines[:4], [
+            '# HELP things Things seen.',
+            '# TYPE things counter',
+            'things_total{kind="a \\"quoted\\"\\nvalue"} 1',
+            'things_total{kind="b"} 2',
+        ])
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{le="1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3', lines)
+        self.assertIn('latency_seconds_count 3', lines)
+        self.assertIn('latency_seconds_sum 5.6', lines)
+
+    def test_timed_records_errors(self):
+        """Test that a failing stage is both timed and counted as an error"""
+        before = STAGE_SECONDS.count(stage='test_stage'), STAGE_ERRORS.value(stage='test_stage')
+        with self.assertRaises(ValueError), timed('test_stage'):
+            raise ValueError('boom')
+        after = STAGE_SECONDS.count(stage='test_stage'), STAGE_ERRORS.value(stage='test_stage')
+        self.assertEqual(after, (before[0] + 1, before[1] + 1))
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT, LLM_BACKEND='stub', LLM_STUB_LATENCY=0,
+    LLM_REQUESTS_PER_MINUTE=0, LLM_TOKENS_PER_MINUTE=0, PDF_TEXT_EXTRACTION_ENABLED=False,
+)
+class InstrumentationTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        llm_service.reset_llm_client()
+        self.addCleanup(llm_service.reset_llm_client)
+
+    def test_pipeline_stages_are_timed(self):
+        """Test that an extraction records the encode, LLM, parse and normalize stages"""
+        stages = ('encode', 'llm_call', 'parse', 'normalize')
+        before = {stage: STAGE_SECONDS.count(stage=stage) for stage in stages}
+        job = ProcessingJob.objects.create(name='timed')
+        pdf_doc = PDFDocument.objects.create(job=job, file=ContentFile(b'%PDF-1.4 timed', name='paper.pdf'))
+
+        result = extraction_service.process_pdf_with_gemini(pdf_doc)
+
+        self.assertTrue(result['success'])
+        for stage in stages:
+            self.assertGreater(STAGE_SECONDS.count(stage=stage), before[stage], stage)
+
+    def test_request_query_count_header(self):
+        """Test that each response reports the queries it ran"""
+        job = ProcessingJob.objects.create(name='counted', status='completed')
+        pdf_doc = PDFDocument.objects.create(job=job, file=ContentFile(b'%PDF-1.4', name='paper.pdf'))
+        store_cases(pdf_doc, [{'0': 'a'}])
+
+        response = self.client.get(reverse('core:job_results', args=[job.id]))
+        self.assertEqual(response['X-DB-Queries'], '4')
+
+    async def test_async_request_query_count_header(self):
+        """Test that queries are counted when the middleware runs in an async chain"""
+        job = await ProcessingJob.objects.acreate(name='counted', status='completed')
+        pdf_doc = await PDFDocument.objects.acreate(job=job, file=ContentFile(b'%PDF-1.4', name='paper.pdf'))
+        await sync_to_async(store_cases)(pdf_doc, [{'0': 'a'}])
+
+        response = await self.async_client.get(reverse('core:job_results', args=[job.id]))
+        self.assertEqual(response['X-DB-Queries'], '4')
+        response = await self.async_client.get(reverse('core:job_events', args=[job.id + 1]))
+        self.assertEqual((response.status_code, response['X-DB-Queries']), (404, '1'))
+
+    def test_metrics_endpoint(self):
+        """Test that the scrape endpoint exposes request, stage and job metrics"""
+        ProcessingJob.objects.create(name='pending')
+        self.client.get(reverse('core:home'))
+        response = self.client.get(reverse('core:metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('pdf_processor_jobs{status="pending"} 1', body)
+        self.assertIn('pdf_processor_http_request_db_queries_count{view="core:home",method="GET"}', body)
+        self.assertIn('pdf_processor_stage_seconds_count{stage="render"}', body)
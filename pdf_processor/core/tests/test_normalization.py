@@ -0,0 +1,90 @@
+import csv
+import io
+import shutil
+import tempfile
+
+import pandas as pd
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.models import PDFDocument, ProcessingJob
+from core.services import normalization_service
+from core.services.results_service import store_cases
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def values(series):
+    return [None if pd.isna(value) else value for value in series]
+
+
+class ParserTests(SimpleTestCase):
+    def test_ages_and_durations(self):
+        """Test that ages are read in years and durations in months, whatever unit the text uses"""
+        text = pd.Series(['45-year-old', '45 M', '6 months', '2-3 yrs', 'two weeks', 'Not reported', '', None])
+        self.assertEqual(
+            values(normalization_service.parse_age(text)['years']), [45.0, 45.0, 0.5, 2.5, 0.04, None, None, None]
+        )
+        self.assertEqual(
+            values(normalization_service.parse_months(text)['months']),
+            [540.0, 45.0, 6.0, 30.0, 0.46, None, None, None],
+        )
+
+    def test_grades(self):
+        """Test that WHO and Simpson grades are read from roman or arabic numerals"""
+        who = pd.Series(['WHO grade II', 'Grade I', 'III', 'atypical (grade 2)', '2016 WHO classification', 'type I'])
+        self.assertEqual(values(normalization_service.parse_who_grade(who)['grade']), [2, 1, 3, 2, None, None])
+
+        resection = pd.Series(['Gross total resection (Simpson grade II)', 'Simpson IV', 'subtotal', 'GTR', ''])
+        parsed = normalization_service.parse_resection(resection)
+        self.assertEqual(values(parsed['extent']), ['total', 'subtotal', 'subtotal', 'total', None])
+        self.assertEqual(values(parsed['simpson']), [2, 4, None, None, None])
+
+    def test_flags(self):
+        """Test that y/n and A/D answers become booleans and statuses, and n/a stays missing"""
+        flags = pd.Series(['y', 'No', 'Yes, radiotherapy', 'n/a', 'present', ''])
+        self.assertEqual(values(normalization_service.parse_flag(flags)['flag']), [True, False, True, None, True, None])
+        status = pd.Series(['A', 'Deceased', 'alive at 2 years', 'unknown'])
+        self.assertEqual(
+            values(normalization_service.parse_vital_status(status)['status']), ['alive', 'deceased', 'alive', None]
+        )
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class NormalizedCasesTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.review = ProcessingJob.objects.create(name='review', status='completed')
+        self.aggregate = ProcessingJob.objects.create(name='aggregate', status='completed', prompt_template='case_review')
+        for job, cases in (
+            (self.review, [
+                {'4': '62 years', '6': '1 year', '9': 'WHO grade I', '14': 'A'},
+                {'4': '8 months', '6': '3 weeks', '9': 'II', '14': 'D'},
+            ]),
+            (self.aggregate, [{'4': '12', '9': '15%'}]),
+        ):
+            pdf_doc = PDFDocument.objects.create(job=job, file=ContentFile(b'%PDF-1.4', name=f'{job.name}.pdf'))
+            store_cases(pdf_doc, [{key: {'value': value, 'confidence': 4} for key, value in case.items()} for case in cases])
+
+    def test_jobs_are_parsed_by_their_template(self):
+        """Test that fields are only parsed for jobs whose template declares their kind"""
+        frame = normalization_service.normalized_cases([self.review, self.aggregate])
+        self.assertEqual(list(frame['case_index']), [0, 1, 0])
+        self.assertEqual(values(frame['4 years']), [62.0, 0.67, None])
+        self.assertEqual(values(frame['6 months']), [12.0, 0.69, None])
+        self.assertEqual(values(frame['9 grade']), [1, 2, None])
+        self.assertEqual(values(frame['14 status']), ['alive', 'deceased', None])
+        self.assertEqual(frame['4'].tolist(), ['62 years', '8 months', '12'])
+
+    def test_export_appends_normalized_columns(self):
+        """Test that ?normalized=1 adds the parsed columns to a CSV export"""
+        url = f"{reverse('core:export_results', args=['csv'])}?job={self.review.id}&columns=4,9&normalized=1"
+        response = self.client.get(url)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(rows[0][-2:], ['4 years', '9 grade'])
+        self.assertEqual([row[-2:] for row in rows[1:]], [['62.0', '1'], ['0.67', '2']])
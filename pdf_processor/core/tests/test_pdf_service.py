@@ -0,0 +1,91 @@
+import hashlib
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from core.benchmarks.corpus import FILLER, make_pdf
+from core.models import PDFDocument, ProcessingJob
+from core.services import pdf_service
+from core.services.llm_service import LLMClient, StubBackend, UploadedFile
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+PDF_BYTES = b'%PDF-1.4\n' + b'x' * 5000 + b'\n%%EOF'
+
+CASE_REPORT_PAGES = [
+    ['Parasagittal meningioma in a young adult', 'doi: 10.1000/example.123', 'Smith J, Jones K (2021)',
+     'Introduction'] + [f'Meningiomas are common tumours of the meninges. {FILLER}'] * 4,
+    ['Case presentation', 'A 45-year-old woman presented with headaches for 6 months.'] + [FILLER] * 4,
+    ['Table 1 Histopathology', 'WHO Grade II atypical meningioma', 'Discussion'] + [f'Prior series differ. {FILLER}'] * 4,
+    ['References', '1. Someone A. Meningioma review. 2019.'] + [FILLER] * 4,
+]
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class PDFServiceTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        job = ProcessingJob.objects.create(name='job')
+        self.pdf_doc = PDFDocument.objects.create(job=job, file=ContentFile(PDF_BYTES, name='paper.pdf'))
+
+    def test_document_sha256(self):
+        """Test that the chunked hash matches hashing the whole file and is stored"""
+        with mock.patch.object(pdf_service, 'HASH_CHUNK_SIZE', 1024):
+            digest = pdf_service.document_sha256(self.pdf_doc)
+        self.assertEqual(digest, hashlib.sha256(PDF_BYTES).hexdigest())
+        self.assertEqual(PDFDocument.objects.get(pk=self.pdf_doc.pk).sha256, digest)
+
+    def test_open_mapped(self):
+        """Test that the memory map exposes the stored bytes"""
+        with pdf_service.open_mapped(self.pdf_doc.file) as buffer:
+            self.assertEqual(buffer[:8], PDF_BYTES[:8])
+            self.assertEqual(len(buffer), len(PDF_BYTES))
+
+    def test_text_context_keeps_relevant_sections(self):
+        """Test that only the title block, case sections and tables are kept"""
+        self.pdf_doc.file.save('case.pdf', ContentFile(make_pdf(CASE_REPORT_PAGES)))
+        context = pdf_service.build_text_context(self.pdf_doc)
+
+        self.assertIsNotNone(context)
+        self.assertIn('doi: 10.1000/example.123', context['text'])
+        self.assertIn('45-year-old woman', context['text'])
+        self.assertIn('WHO Grade II', context['text'])
+        self.assertNotIn('Meningiomas are common tumours', context['text'])
+        self.assertNotIn('Prior series differ', context['text'])
+        self.assertNotIn('Meningioma review', context['text'])
+        self.assertEqual(context['pages'], [1, 2, 3])
+        self.assertLess(context['selected_chars'], context['total_chars'])
+
+    def test_text_context_falls_back_without_text_layer(self):
+        """Test that image-only PDFs fall back to sending the full PDF"""
+        self.pdf_doc.file.save('scan.pdf', ContentFile(make_pdf([[], []])))
+        self.assertIsNone(pdf_service.build_text_context(self.pdf_doc))
+
+    @override_settings(GEMINI_INLINE_MAX_BYTES=10 * 1024)
+    def test_small_pdf_is_sent_inline(self):
+        """Test that small PDFs become an inline part with raw bytes"""
+        client = mock.Mock()
+        with pdf_service.pdf_part(self.pdf_doc, client=client) as part:
+            self.assertEqual(part, {'mime_type': 'application/pdf', 'data': PDF_BYTES})
+            self.assertIsInstance(part['data'], memoryview)
+        client.upload_file.assert_not_called()
+        # The view over the map is released with it, not copied
+        with self.assertRaises(ValueError):
+            bytes(part['data'])
+
+    @override_settings(GEMINI_INLINE_MAX_BYTES=1024)
+    def test_large_pdf_uses_file_api(self):
+        """Test that large PDFs are streamed from disk and deleted afterwards"""
+        client = LLMClient(StubBackend(latency=0))
+        with mock.patch.object(client.backend, 'delete_file') as delete:
+            with pdf_service.pdf_part(self.pdf_doc, client=client) as part:
+                self.assertIsInstance(part, UploadedFile)
+                self.assertEqual(part.name, f"files/{hashlib.sha256(PDF_BYTES).hexdigest()[:16]}")
+            delete.assert_called_once_with(part.name)
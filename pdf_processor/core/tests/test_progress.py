@@ -0,0 +1,77 @@
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import tasks
+from core.models import PDFDocument, ProcessingJob
+from core.services.progress_service import JobWatcher, job_events
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+CASE = {str(i): {'value': f'v{i}', 'confidence': 5} for i in range(16)}
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ProgressStreamTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.job = ProcessingJob.objects.create(name='progress', status='processing')
+        self.documents = [
+            PDFDocument.objects.create(job=self.job, file=ContentFile(b'%PDF-1.4', name=f'paper{i}.pdf'))
+            for i in range(2)
+        ]
+
+    def test_events_report_only_changes(self):
+        """Test that a snapshot covers every document and later calls only what changed"""
+        seen = {}
+        events = job_events(self.job.id, seen)
+        self.assertEqual([event for event, _ in events], ['document', 'document', 'status'])
+
+        tasks.save_partial_result(self.documents[0], ['turn 1'], [CASE])
+        events = job_events(self.job.id, seen)
+        self.assertEqual([event for event, _ in events], ['document', 'status'])
+        self.assertTrue(events[0][1]['partial'])
+        self.assertEqual(events[0][1]['rows'], [CASE])
+
+        tasks.save_document_result(self.documents[0], {'success': True, 'parsed_json': {'case_results': [CASE, CASE]}})
+        event, data = job_events(self.job.id, seen)[0]
+        self.assertFalse(data['partial'])
+        self.assertEqual(data['status'], 'completed')
+        self.assertEqual(len(data['rows']), 2)
+
+    def test_watcher_costs_one_query_when_nothing_changed(self):
+        """Test that idle jobs are checked with a single query however many are watched"""
+        other = ProcessingJob.objects.create(name='other')
+        watcher = JobWatcher(interval=0)
+        watched = {self.job.id: [None, {}], other.id: [None, {}]}
+        for job_id, version, seen, events in watcher.poll(watched):
+            watched[job_id] = [version, seen]
+
+        with self.assertNumQueries(1):
+            self.assertEqual(watcher.poll(watched), [])
+
+        tasks.touch_job(self.job.id)
+        changes = watcher.poll(watched)
+        self.assertEqual([job_id for job_id, *_ in changes], [self.job.id])
+
+    async def test_stream_ends_with_done(self):
+        """Test that the SSE endpoint sends a snapshot and closes once the job is finished"""
+        await ProcessingJob.objects.filter(pk=self.job.pk).aupdate(status='completed')
+        response = await self.async_client.get(reverse('core:job_events', args=[self.job.id]))
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertEqual(body.count('event: document'), 2)
+        self.assertTrue(body.rstrip().split('\n\n')[-1].startswith('event: done'))
+
+    async def test_stream_unknown_job(self):
+        """Test that streams for missing jobs are refused"""
+        response = await self.async_client.get(reverse('core:job_events', args=[0]))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,132 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import tasks
+from core.models import ExtractedField, ProcessingJob
+from core.services import extraction_service, prompt_registry
+from core.services.llm_service import LLMClient, LLMResponse
+from core.services.prompt_registry import (
+    Field,
+    PromptTemplate,
+    compile_schema,
+    get_template,
+    job_template,
+    register,
+    template_for_prompt,
+)
+from core.utils import parse_extraction
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class PromptTemplateTests(SimpleTestCase):
+    def test_derived_schema_is_cached(self):
+        """Test that the normaliser and validators are built once per template"""
+        template = get_template('medical_review')
+        self.assertIs(template.normalizer, template.normalizer)
+        self.assertIs(template.validators, template.validators)
+        self.assertEqual(template.required_fields, tuple(str(i) for i in range(16)))
+        self.assertEqual(template.columns[9], {'key': '9', 'label': 'WHO Grade'})
+
+    def test_template_fields_drive_padding(self):
+        """Test that replies are padded with the fields of the template they answer"""
+        review = get_template('case_review')
+        missing = set()
+        data, _ = parse_extraction('{"case_results": [{"0": "Title", "4": {"value": "12", "confidence": 4}}]}',
+                                   missing, review)
+        case = data['case_results'][0]
+        self.assertEqual(set(case), set(review.required_fields))
+        self.assertEqual(case['0'], {'value': 'Title', 'confidence': 1})
+        self.assertEqual(missing, set(review.required_fields) - {'0', '4'})
+
+    def test_validators(self):
+        """Test that values outside a field's choices and bad confidences are reported"""
+        template = get_template('medical_review')
+        case = template.normalizer({'5': {'value': 'Male', 'confidence': 5},
+                                    '7': {'value': 'Thoracic', 'confidence': 4},
+                                    '13': {'value': 'N', 'confidence': 9}})['case_results'][0]
+        problems = template.validate([case])
+        self.assertEqual(len(problems), 2)
+        self.assertIn("field 7 (Tumor location (Cranial or Spinal)): 'Thoracic' is not one of cranial, spinal", problems[0])
+        self.assertIn('field 13', problems[1])
+
+    def test_schema_validator(self):
+        """Test that the compiled schema check reports type errors and missing keys with their path"""
+        template = get_template('case_review')
+        self.assertIs(template.schema_validator, template.schema_validator)
+        case = {key: {'value': '', 'confidence': 1} for key in template.required_fields}
+        self.assertEqual(list(template.schema_validator({'case_results': [case]})), [])
+
+        del case['3']
+        case['4'] = {'value': 12, 'confidence': 5}
+        self.assertEqual(list(template.schema_validator({'case_results': [case]})), [
+            "$.case_results[]: missing '3'", '$.case_results[].4.value: expected string',
+        ])
+        self.assertEqual(list(compile_schema({'type': 'integer'})(True)), ['$: expected integer'])
+        self.assertEqual(list(template.schema_validator([])), ['$: expected object'])
+
+    def test_versions_and_custom_prompts(self):
+        """Test that a job keeps its pinned version and free-text prompts get their own fields"""
+        self.addCleanup(lambda: _drop('medical_review', 99))
+        newer = register(PromptTemplate('medical_review', 99, 'Newer', 'Extract.', [Field(0, 'Article Name')]))
+        self.assertIs(get_template('medical_review'), newer)
+        self.assertEqual(get_template('medical_review', 1).version, 1)
+        self.assertEqual(job_template(ProcessingJob(prompt_version=1)).version, 1)
+
+        custom = template_for_prompt('List:\n1. Age\n2. Sex\nReturn the data as JSON')
+        self.assertEqual((custom.key, custom.required_fields), ('custom', ('1', '2')))
+        self.assertIs(custom, template_for_prompt('List:\n1. Age\n2. Sex\nReturn the data as JSON'))
+        fallback = job_template(ProcessingJob(prompt='Just extract everything.', prompt_template='case_review'))
+        self.assertEqual(fallback.required_fields, get_template('case_review').required_fields)
+        self.assertEqual(fallback.prompt, 'Just extract everything.')
+
+
+def _drop(key, version):
+    prompt_registry._templates.pop((key, version), None)
+    prompt_registry.template_for_prompt.cache_clear()
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT, MODEL_ROUTING_ENABLED=False, CASE_SERIES_CASES_PER_TURN=0,
+    PDF_TEXT_EXTRACTION_ENABLED=False, LLM_REQUESTS_PER_MINUTE=0, LLM_TOKENS_PER_MINUTE=0,
+    EXTRACTION_CACHE_ENABLED=False,
+)
+class TemplateJobTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_upload_pins_template_and_columns(self):
+        """Test that a job created from the form records its template, version and columns"""
+        response = self.client.post(reverse('core:home'), {
+            'name': 'reviews',
+            'prompt_template': 'case_review',
+            'prompt': '',
+            'pdf_file': SimpleUploadedFile('review.pdf', b'%PDF-1.4 review', content_type='application/pdf'),
+        })
+        self.assertEqual(response.status_code, 202)
+        job = ProcessingJob.objects.get(name='reviews')
+        self.assertEqual((job.prompt_template, job.prompt_version), ('case_review', 1))
+        self.assertEqual(job.columns, get_template('case_review').columns)
+
+    def test_job_is_extracted_with_its_template(self):
+        """Test that a worker sends the job's template prompt and pads to its fields"""
+        job = ProcessingJob.objects.create(name='review', prompt_template='case_review', prompt_version=1)
+        job.documents.create(file=ContentFile(b'%PDF-1.4 review', name='review.pdf'))
+        client = mock.Mock(spec=LLMClient)
+        client.chat.return_value = LLMResponse('{"case_results": [{"4": {"value": "12", "confidence": 5}}]}', 'm')
+
+        with mock.patch.object(extraction_service, 'get_llm_client', return_value=client):
+            tasks.process_job(job)
+
+        prompt = client.chat.call_args.args[0][0]['parts'][-1]
+        self.assertIn("4. Total cases from the authors' institution", prompt)
+        keys = set(ExtractedField.objects.filter(job=job).values_list('field_key', flat=True))
+        self.assertEqual(keys, set(get_template('case_review').required_fields))
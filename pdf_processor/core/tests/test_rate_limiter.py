@@ -0,0 +1,67 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from core.services import rate_limiter
+from core.services.llm_service import LLMClient, LLMError, LLMResponse
+
+
+class TokenBucketTests(TestCase):
+    def test_bucket_admits_up_to_capacity_then_waits(self):
+        """Test that a bucket allows a minute's quota and then asks callers to wait"""
+        bucket = rate_limiter.TokenBucket('test:requests', 60)
+        with mock.patch.object(rate_limiter.time, 'time', return_value=1000.0):
+            for _ in range(60):
+                self.assertEqual(bucket.try_acquire(1), 0.0)
+            self.assertAlmostEqual(bucket.try_acquire(1), 1.0)
+
+        with mock.patch.object(rate_limiter.time, 'time', return_value=1002.0):
+            self.assertEqual(bucket.try_acquire(1), 0.0)
+
+    def test_limiter_sleeps_until_tokens_refill(self):
+        """Test that acquire blocks for the time the token bucket needs to refill"""
+        limiter = rate_limiter.RateLimiter(requests_per_minute=0, tokens_per_minute=600)
+        clock = [1000.0]
+        slept = []
+
+        def sleep(seconds):
+            slept.append(seconds)
+            clock[0] += seconds
+
+        with mock.patch.object(rate_limiter.time, 'time', side_effect=lambda: clock[0]):
+            limiter.acquire(600, sleep=sleep)
+            limiter.acquire(100, sleep=sleep)
+        self.assertAlmostEqual(sum(slept), 10.0)
+
+    def test_penalize_drains_shared_bucket(self):
+        """Test that a 429 empties the bucket for every worker for Retry-After seconds"""
+        limiter = rate_limiter.RateLimiter(requests_per_minute=60, tokens_per_minute=0)
+        with mock.patch.object(rate_limiter.time, 'time', return_value=1000.0):
+            limiter.penalize(retry_after=30)
+            other_worker = rate_limiter.TokenBucket('llm:requests', 60)
+            self.assertAlmostEqual(other_worker.try_acquire(1), 31.0)
+
+    def test_client_penalizes_on_429(self):
+        """Test that the client reports quota errors to the limiter and settles usage"""
+        backend = mock.Mock()
+        limiter = mock.Mock()
+        client = LLMClient(backend, rate_limiter=limiter)
+
+        backend.chat.side_effect = LLMError('quota', status=429, retry_after=12)
+        with self.assertRaises(LLMError):
+            client.generate('prompt')
+        limiter.penalize.assert_called_once_with(12)
+
+        backend.chat.side_effect = None
+        backend.chat.return_value = LLMResponse('ok', 'model', prompt_tokens=40, output_tokens=10)
+        client.generate('x' * 400)
+        limiter.record_usage.assert_called_once_with(100, 50)
+
+    @override_settings(LLM_RETRY_BASE_DELAY=1, LLM_RETRY_MAX_DELAY=8)
+    def test_backoff_delay(self):
+        """Test that backoff is jittered, capped and never shorter than Retry-After"""
+        for attempt in range(6):
+            self.assertLessEqual(rate_limiter.backoff_delay(attempt), min(8, 2 ** attempt))
+        self.assertGreaterEqual(rate_limiter.backoff_delay(0, retry_after=5), 5)
+        self.assertFalse(rate_limiter.is_retryable(400))
+        self.assertTrue(rate_limiter.is_retryable(429))
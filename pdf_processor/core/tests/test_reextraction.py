@@ -0,0 +1,99 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import tasks
+from core.benchmarks.corpus import synthetic_case_report
+from core.models import DocumentPage, ExtractedField, PDFDocument, ProcessingJob, ProcessingResult
+from core.services import extraction_service, llm_service, pdf_service
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT, LLM_BACKEND='stub', LLM_STUB_LATENCY=0, LLM_STUB_ERROR_RATE=0,
+    LLM_REQUESTS_PER_MINUTE=0, LLM_TOKENS_PER_MINUTE=0, MODEL_ROUTING_ENABLED=False,
+    LLM_STRONG_MODEL='strong', CASE_SERIES_CASES_PER_TURN=0,
+)
+class ReextractionTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        llm_service.reset_llm_client()
+        self.addCleanup(llm_service.reset_llm_client)
+        job = ProcessingJob.objects.create(name='reextract', status='completed')
+        self.pdf_doc = PDFDocument.objects.create(job=job, file=ContentFile(synthetic_case_report(1), name='case.pdf'))
+        tasks.save_document_result(self.pdf_doc, extraction_service.process_pdf_with_gemini(self.pdf_doc))
+
+    def url(self, case_index=0, document_id=None):
+        return reverse('core:reextract_case_fields', args=[document_id or self.pdf_doc.id, case_index])
+
+    def test_fields_are_merged_with_history(self):
+        """Test that re-extracting two fields updates only them, from cached page text, with one small call"""
+        self.assertTrue(DocumentPage.objects.filter(document=self.pdf_doc).exists())
+        before = ProcessingResult.objects.get(document=self.pdf_doc).result_data['case_results'][0]
+        client = llm_service.get_llm_client()
+
+        with mock.patch.object(pdf_service, 'extract_pages', side_effect=AssertionError('pages not cached')), \
+                mock.patch.object(client, 'achat', wraps=client.achat) as chat:
+            response = self.client.post(self.url(), {'fields': '9,6'})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['version'], 2)
+        self.assertEqual(set(data['fields']), {'9', '6'})
+        self.assertEqual(data['fields']['9']['model'], 'strong')
+        self.assertEqual(data['changes']['9']['before'], before['9'])
+
+        self.assertEqual(chat.call_count, 1)
+        requested = chat.call_args.args[0][0]['parts'][-1].split('Fields to extract:')[1]
+        self.assertIn('9. WHO Grade', requested)
+        self.assertNotIn('10. Meningioma subtype', requested)
+
+        result = ProcessingResult.objects.get(document=self.pdf_doc)
+        case = result.result_data['case_results'][0]
+        self.assertEqual(case['9'], data['fields']['9'])
+        self.assertEqual(case['0'], before['0'])
+        stored = ExtractedField.objects.get(case__document=self.pdf_doc, case__case_index=0, field_key='9')
+        self.assertEqual((stored.value, stored.model), (data['fields']['9']['value'], 'strong'))
+
+        history = self.client.get(reverse('core:result_revisions', args=[self.pdf_doc.id])).json()
+        self.assertEqual(history['version'], 2)
+        self.assertEqual([revision['version'] for revision in history['revisions']], [2])
+
+    @override_settings(EXTRACTION_CACHE_ENABLED=True, DEDUPE_ENABLED=False)
+    def test_cached_result_follows_the_correction(self):
+        """Test that a later upload of the same PDF is served the corrected result from the cache"""
+        job = ProcessingJob.objects.create(name='first upload')
+        PDFDocument.objects.create(job=job, file=ContentFile(synthetic_case_report(2), name='paper.pdf'))
+        tasks.process_job(job)
+        original = job.documents.get()
+
+        response = self.client.post(self.url(document_id=original.id), {'fields': '9'})
+        self.assertEqual(response.status_code, 200)
+        corrected = ProcessingResult.objects.get(document=original).result_data
+
+        again = ProcessingJob.objects.create(name='second upload')
+        PDFDocument.objects.create(job=again, file=ContentFile(synthetic_case_report(2), name='again.pdf'))
+        client = llm_service.get_llm_client()
+        with mock.patch.object(client, 'chat', wraps=client.chat) as chat:
+            tasks.process_job(again)
+        self.assertEqual(chat.call_count, 0)
+        self.assertEqual(ProcessingResult.objects.get(document__job=again).result_data, corrected)
+
+    def test_bad_requests(self):
+        """Test that unknown fields and cases, missing results and GETs are rejected"""
+        self.assertEqual(self.client.post(self.url(), {'fields': '99'}).status_code, 400)
+        self.assertEqual(self.client.post(self.url(), {'fields': ''}).status_code, 400)
+        self.assertEqual(self.client.post(self.url(case_index=50), {'fields': '9'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url()).status_code, 405)
+
+        other = PDFDocument.objects.create(job=self.pdf_doc.job, file=ContentFile(b'%PDF-1.4', name='new.pdf'))
+        self.assertEqual(self.client.post(self.url(document_id=other.id), {'fields': '9'}).status_code, 404)
@@ -0,0 +1,175 @@
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import tasks
+from core.models import ExtractedCase, ExtractedField, PDFDocument, ProcessingJob
+from core.services.results_service import case_rows, job_columns, page_cases, store_cases
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_case(n, confidence=5):
+    return {str(i): {'value': f'case{n}-{i}', 'confidence': confidence} for i in range(16)}
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ResultStorageTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def make_document(self, job):
+        return PDFDocument.objects.create(job=job, file=ContentFile(b'%PDF-1.4', name='paper.pdf'))
+
+    def test_saved_results_are_normalised(self):
+        """Test that saving a result writes one row per case and field"""
+        job = ProcessingJob.objects.create(name='normalised')
+        pdf_doc = self.make_document(job)
+        cases = [make_case(1), make_case(2, confidence=2)]
+        tasks.save_document_result(pdf_doc, {'success': True, 'parsed_json': {'case_results': cases}})
+
+        self.assertEqual(ExtractedCase.objects.filter(job=job).count(), 2)
+        self.assertEqual(ExtractedField.objects.filter(job=job).count(), 32)
+        self.assertEqual(ExtractedField.objects.filter(job=job, field_key='9', confidence__lte=2).count(), 1)
+        self.assertEqual(case_rows(ExtractedCase.objects.filter(job=job)), cases)
+        self.assertEqual(job_columns([job])[:3], ['0', '1', '2'])
+
+    def test_resaving_replaces_cases(self):
+        """Test that a later save (e.g. after a partial checkpoint) replaces earlier rows"""
+        job = ProcessingJob.objects.create(name='replace')
+        pdf_doc = self.make_document(job)
+        store_cases(pdf_doc, [make_case(1), make_case(2)])
+        store_cases(pdf_doc, [{'0': 'plain', '4': {'value': None, 'confidence': 'high'}}])
+
+        rows = case_rows(ExtractedCase.objects.filter(document=pdf_doc))
+        self.assertEqual(rows, [{'0': {'value': 'plain', 'confidence': None}, '4': {'value': '', 'confidence': None}}])
+
+    def make_paged_job(self):
+        job = ProcessingJob.objects.create(name='paged', status='completed')
+        for _ in range(3):
+            store_cases(self.make_document(job), [make_case(n, confidence=n % 5 + 1) for n in range(20)])
+        return job
+
+    def test_results_page_loads_one_page(self):
+        """Test that the results page costs the same number of queries on any page"""
+        self.make_paged_job()
+        with self.assertNumQueries(5):
+            first = self.client.get(reverse('core:home'))
+        with self.assertNumQueries(5):
+            last = self.client.get(reverse('core:home'), {'last': 1})
+        with self.assertNumQueries(5):
+            second = self.client.get(reverse('core:home'), {'after': first.context['next_cursor']})
+
+        self.assertEqual(len(first.context['table_data']), 10)
+        self.assertIsNone(first.context['previous_cursor'])
+        self.assertEqual(second.context['table_data'][0]['0']['value'], 'case10-0')
+        self.assertEqual(last.context['table_data'][-1]['0']['value'], 'case19-0')
+        self.assertIsNone(last.context['next_cursor'])
+
+    def test_results_api_walks_every_case_once(self):
+        """Test that following cursors forwards and backwards visits each case exactly once"""
+        job = self.make_paged_job()
+        url = reverse('core:job_results', args=[job.id])
+
+        seen, pages, cursor = [], [], None
+        while True:
+            params = {'limit': 7, 'sort': '-3.confidence'}
+            if cursor:
+                params['after'] = cursor
+            data = self.client.get(url, params).json()
+            pages.append(data)
+            seen.extend(row['case_id'] for row in data['rows'])
+            cursor = data['next']
+            if cursor is None:
+                break
+
+        self.assertEqual(len(seen), 60)
+        self.assertEqual(len(set(seen)), 60)
+        confidences = [row['fields']['3']['confidence'] for page in pages for row in page['rows']]
+        self.assertEqual(confidences, sorted(confidences, reverse=True))
+
+        back = self.client.get(url, {'limit': 7, 'sort': '-3.confidence', 'before': pages[2]['previous']}).json()
+        self.assertEqual(back['rows'], pages[1]['rows'])
+
+    def test_job_status_serves_the_first_page(self):
+        """Test that a completed job's status carries the first page of cases and a cursor for the rest"""
+        job = self.make_paged_job()
+        status = self.client.get(reverse('core:job_status', args=[job.id])).json()
+        self.assertNotIn('table_html', status)
+        self.assertEqual(len(status['rows']), 50)
+        self.assertEqual(status['rows'][0], make_case(0, confidence=1))
+        self.assertEqual(status['columns'][:3], ['0', '1', '2'])
+
+        rest = self.client.get(status['results_url'], {'after': status['next']}).json()
+        self.assertEqual(len(rest['rows']), 10)
+        self.assertIsNone(rest['next'])
+
+    def test_results_api_projects_columns(self):
+        """Test that only the requested fields are returned"""
+        job = self.make_paged_job()
+        data = self.client.get(reverse('core:job_results', args=[job.id]), {'columns': '0,4', 'sort': '0'}).json()
+        self.assertEqual(data['columns'], ['0', '4'])
+        self.assertEqual(set(data['rows'][0]['fields']), {'0', '4'})
+        values = [row['fields']['0']['value'] for row in data['rows']]
+        self.assertEqual(values, sorted(values))
+
+        bad = self.client.get(reverse('core:job_results', args=[job.id]), {'after': 'not-a-cursor'})
+        self.assertEqual(bad.status_code, 400)
+
+    def test_numeric_values_sort_by_number(self):
+        """Test that numeric values sort numerically, ahead of text, with each page a seek in the field index"""
+        job = ProcessingJob.objects.create(name='ages', status='completed')
+        ages = ['9', '10', '45-year-old', '3.5', 'unknown', '', '100', 'Adult']
+        store_cases(self.make_document(job), [{'4': {'value': age, 'confidence': 5}} for age in ages])
+        url = reverse('core:job_results', args=[job.id])
+
+        rows = self.client.get(url, {'sort': '4', 'limit': 3}).json()
+        values = [row['fields']['4']['value'] for row in rows['rows']]
+        following = self.client.get(url, {'sort': '4', 'limit': 10, 'after': rows['next']}).json()
+        values += [row['fields']['4']['value'] for row in following['rows']]
+        self.assertEqual(values, ['', '3.5', '9', '10', '45-year-old', '100', 'Adult', 'unknown'])
+        descending = self.client.get(url, {'sort': '-4'}).json()['rows']
+        self.assertEqual([row['fields']['4']['value'] for row in descending], values[::-1])
+
+        with CaptureQueriesContext(connection) as queries:
+            page_cases([job], sort='4', limit=3, after=rows['next'])
+        if connection.vendor == 'sqlite':
+            # The page starts at the cursor in the (job, field_key, sort_key, case) index, already in order
+            seek = next(query['sql'] for query in queries if query['sql'].startswith('SELECT "core_extractedfield"'))
+            with connection.cursor() as cursor:
+                plan = ' '.join(row[-1] for row in cursor.execute(f'EXPLAIN QUERY PLAN {seek}').fetchall())
+            self.assertRegex(plan, r'USING COVERING INDEX \S+ \(job_id=\? AND field_key=\? AND sort_key>\?\)')
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_cases_without_the_sort_field_come_last(self):
+        """Test that cases missing the sort field follow the others both ways and cursors cross over"""
+        job = ProcessingJob.objects.create(name='missing', status='completed')
+        cases = [{'4': {'value': str(n), 'confidence': 5}} if n % 2 else {'0': 'x'} for n in range(9)]
+        store_cases(self.make_document(job), cases)
+        url = reverse('core:job_results', args=[job.id])
+
+        for sort in ('4', '-4'):
+            with self.subTest(sort):
+                pages, cursor = [], None
+                while True:
+                    params = {'sort': sort, 'limit': 3, **({'after': cursor} if cursor else {})}
+                    data = self.client.get(url, params).json()
+                    pages.append(data)
+                    cursor = data['next']
+                    if cursor is None:
+                        break
+                values = [row['fields'].get('4', {}).get('value') for page in pages for row in page['rows']]
+                numbers = ['1', '3', '5', '7'] if sort == '4' else ['7', '5', '3', '1']
+                self.assertEqual(values, numbers + [None] * 5)
+
+                last = page_cases([job], sort=sort.lstrip('-'), descending=sort.startswith('-'), last=True, limit=3)
+                self.assertEqual([case.id for case in last['cases']], [row['case_id'] for row in pages[-1]['rows']])
+                back = self.client.get(url, {'sort': sort, 'limit': 3, 'before': pages[2]['previous']}).json()
+                self.assertEqual(back['rows'], pages[1]['rows'])
@@ -0,0 +1,127 @@
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core import tasks
+from core.models import ExtractedField, PDFDocument, ProcessingJob
+from core.services import extraction_service
+from core.services.llm_service import LLMBackend, LLMClient, LLMResponse
+from core.services.routing_service import escalation_reasons, merge_cases, tag_model
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_case(confidence=5, skip=()):
+    return {str(i): {'value': f'v{i}', 'confidence': confidence} for i in range(16) if str(i) not in skip}
+
+
+class ScriptedBackend(LLMBackend):
+    """Answers each model with a fixed list of cases."""
+    name = 'scripted'
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.calls = []
+
+    def chat(self, messages, model_name, generation_config):
+        self.calls.append(model_name)
+        return LLMResponse(json.dumps({'case_results': self.replies[model_name]}), model_name)
+
+
+@override_settings(MODEL_ROUTING_MIN_CONFIDENCE=3)
+class RoutingPolicyTests(SimpleTestCase):
+    def test_escalation_reasons(self):
+        """Test that missing fields and confident-less values escalate but empty values do not"""
+        self.assertEqual(escalation_reasons([make_case()]), [])
+        empty = make_case()
+        empty['4'] = {'value': '', 'confidence': 1}
+        self.assertEqual(escalation_reasons([empty]), [])
+
+        unsure = make_case()
+        unsure['9'] = {'value': 'Grade II', 'confidence': 2}
+        unsure['10'] = {'value': 'fibrous', 'confidence': None}
+        self.assertEqual(escalation_reasons([unsure]), ['low confidence in fields 9, 10'])
+        self.assertEqual(escalation_reasons([make_case()], missing={'12', '3'}), ['missing fields 3, 12'])
+        self.assertEqual(escalation_reasons([]), ['no cases'])
+
+    def test_merge_keeps_the_more_confident_field(self):
+        """Test that the strong model wins ties and the fast model keeps fields and cases it was surer of"""
+        fast = tag_model([make_case(confidence=2), make_case()], 'fast')
+        fast[0]['5'] = {'value': 'F', 'confidence': 5, 'model': 'fast'}
+        strong = tag_model([make_case(confidence=4)], 'strong')
+
+        merged = merge_cases(fast, strong)
+        self.assertEqual(len(merged), 2)
+        self.assertEqual(merged[0]['0'], {'value': 'v0', 'confidence': 4, 'model': 'strong'})
+        self.assertEqual(merged[0]['5'], {'value': 'F', 'confidence': 5, 'model': 'fast'})
+        # A case only the fast model found is kept rather than dropped
+        self.assertEqual(merged[1], fast[1])
+        self.assertEqual(len(merge_cases(strong, fast)), 2)
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT, MODEL_ROUTING_ENABLED=True, LLM_FAST_MODEL='fast', LLM_STRONG_MODEL='strong',
+    MODEL_ROUTING_MIN_CONFIDENCE=3, CASE_SERIES_CASES_PER_TURN=0, PDF_TEXT_EXTRACTION_ENABLED=False,
+    LLM_REQUESTS_PER_MINUTE=0, LLM_TOKENS_PER_MINUTE=0,
+)
+class RoutedExtractionTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        job = ProcessingJob.objects.create(name='routed')
+        self.pdf_doc = PDFDocument.objects.create(job=job, file=ContentFile(b'%PDF-1.4 routed', name='paper.pdf'))
+
+    def extract(self, replies):
+        backend = ScriptedBackend(replies)
+        with mock.patch.object(extraction_service, 'get_llm_client', return_value=LLMClient(backend)):
+            return extraction_service.process_pdf_with_gemini(self.pdf_doc), backend.calls
+
+    def test_confident_result_stays_on_fast_model(self):
+        """Test that a complete, confident result costs one fast call"""
+        result, calls = self.extract({'fast': [make_case()], 'strong': [make_case()]})
+        self.assertEqual(calls, ['fast'])
+        self.assertEqual(result['model'], 'fast')
+        self.assertEqual(result['escalation'], [])
+        self.assertEqual({entry['model'] for entry in result['parsed_json']['case_results'][0].values()}, {'fast'})
+
+    def test_missing_fields_escalate(self):
+        """Test that required keys left out by the fast model are re-extracted and attributed"""
+        result, calls = self.extract({'fast': [make_case(skip={'7'})], 'strong': [make_case(confidence=4)]})
+        self.assertEqual(calls, ['fast', 'strong'])
+        self.assertEqual(result['model'], 'strong')
+        self.assertEqual(result['escalation'], ['missing fields 7'])
+
+        case = result['parsed_json']['case_results'][0]
+        self.assertEqual(case['7'], {'value': 'v7', 'confidence': 4, 'model': 'strong'})
+        self.assertEqual(case['0']['model'], 'fast')
+
+        tasks.save_document_result(self.pdf_doc, result)
+        models = dict(ExtractedField.objects.filter(case__document=self.pdf_doc).values_list('field_key', 'model'))
+        self.assertEqual(models['7'], 'strong')
+        self.assertEqual(models['0'], 'fast')
+
+    def test_unparseable_fast_reply_escalates(self):
+        """Test that a reply the fast model garbles is retried on the strong model"""
+        backend = ScriptedBackend({'strong': [make_case()]})
+        chat = backend.chat
+
+        def garbled(messages, model_name, generation_config):
+            if model_name == 'fast':
+                backend.calls.append(model_name)
+                return LLMResponse('I could not find any cases.', model_name)
+            return chat(messages, model_name, generation_config)
+
+        backend.chat = garbled
+        with mock.patch.object(extraction_service, 'get_llm_client', return_value=LLMClient(backend)):
+            result = extraction_service.process_pdf_with_gemini(self.pdf_doc)
+
+        self.assertTrue(result['success'])
+        self.assertEqual(backend.calls, ['fast', 'strong'])
+        self.assertTrue(result['escalation'][0].startswith('unparseable reply'))
@@ -0,0 +1,286 @@
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import tasks
+from core.models import PDFDocument, ProcessingJob, ProcessingResult
+from core.services import cache_service, llm_service
+from core.services.extraction_service import extraction_options
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+PARSED = {'case_results': [{str(i): {'value': '', 'confidence': 1} for i in range(16)}]}
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class JobQueueTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def make_job(self, name='job', documents=1, **kwargs):
+        job = ProcessingJob.objects.create(name=name, **kwargs)
+        for i in range(documents):
+            content = f'%PDF-1.4 {name} {i}'.encode()
+            PDFDocument.objects.create(job=job, file=ContentFile(content, name=f'paper{i}.pdf'))
+        return job
+
+    def test_claim_next_job_is_fifo_and_exclusive(self):
+        """Test that jobs are claimed oldest first and only once"""
+        first = self.make_job('first')
+        second = self.make_job('second')
+
+        claimed = tasks.claim_next_job('worker-a')
+        self.assertEqual(claimed.id, first.id)
+        self.assertEqual(claimed.status, 'processing')
+        self.assertEqual(claimed.worker_id, 'worker-a')
+
+        self.assertEqual(tasks.claim_next_job('worker-b').id, second.id)
+        self.assertIsNone(tasks.claim_next_job('worker-c'))
+
+    def test_process_job_success(self):
+        """Test that a successful extraction completes the job and stores the result"""
+        job = self.make_job()
+        result = {'success': True, 'parsed_json': PARSED, 'raw_text': '{}'}
+        with mock.patch.object(tasks, 'process_pdf_with_gemini', return_value=result):
+            self.assertEqual(tasks.run_worker(worker_id='test', once=True), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertIsNotNone(job.completed_at)
+        self.assertEqual(ProcessingResult.objects.get(document__job=job).result_data, PARSED)
+
+    def test_process_job_failure(self):
+        """Test that a failed extraction marks the job failed with the error"""
+        job = self.make_job()
+        result = {'success': False, 'error': 'quota exceeded', 'raw_text': ''}
+        with mock.patch.object(tasks, 'process_pdf_with_gemini', return_value=result):
+            tasks.run_worker(worker_id='test', once=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('quota exceeded', job.error_message)
+
+    def test_batch_respects_concurrency_cap(self):
+        """Test that a batch job runs documents in parallel up to max_concurrency"""
+        job = self.make_job(documents=12, max_concurrency=3)
+        lock = threading.Lock()
+        in_flight = []
+        peak = []
+
+        def fake_extract(pdf_doc, prompt=None, **kwargs):
+            with lock:
+                in_flight.append(pdf_doc.id)
+                peak.append(len(in_flight))
+            time.sleep(0.02)
+            with lock:
+                in_flight.remove(pdf_doc.id)
+            return {'success': True, 'parsed_json': PARSED, 'raw_text': '{}'}
+
+        with mock.patch.object(tasks, 'process_pdf_with_gemini', side_effect=fake_extract):
+            tasks.run_worker(worker_id='test', once=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(max(peak), 3)
+        self.assertEqual(ProcessingResult.objects.filter(document__job=job).count(), 12)
+
+    def test_batch_partial_failure_and_resume(self):
+        """Test that failed documents are recorded per document and retried on rerun"""
+        job = self.make_job(documents=3)
+        failing = job.documents.order_by('id').first()
+
+        def fake_extract(pdf_doc, prompt=None, **kwargs):
+            if pdf_doc.id == failing.id:
+                return {'success': False, 'error': 'boom'}
+            return {'success': True, 'parsed_json': PARSED, 'raw_text': '{}'}
+
+        with mock.patch.object(tasks, 'process_pdf_with_gemini', side_effect=fake_extract):
+            tasks.run_worker(worker_id='test', once=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.error_message, '1 of 3 document(s) failed')
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, 'failed')
+
+        tasks.enqueue_job(job)
+        result = {'success': True, 'parsed_json': PARSED, 'raw_text': '{}'}
+        with mock.patch.object(tasks, 'process_pdf_with_gemini', return_value=result) as process:
+            tasks.run_worker(worker_id='test', once=True)
+            self.assertEqual(process.call_count, 1)
+
+    @override_settings(LLM_RETRY_BASE_DELAY=0.01, LLM_RETRY_MAX_DELAY=0.05, LLM_MAX_RETRIES=3)
+    def test_transient_errors_are_retried(self):
+        """Test that 429s are rescheduled, honouring Retry-After, until they succeed"""
+        job = self.make_job()
+        responses = [
+            {'success': False, 'error': 'quota', 'retryable': True, 'retry_after': 0.02},
+            {'success': False, 'error': 'unavailable', 'retryable': True, 'retry_after': None},
+            {'success': True, 'parsed_json': PARSED, 'raw_text': '{}'},
+        ]
+        started = time.monotonic()
+        with mock.patch.object(tasks, 'process_pdf_with_gemini', side_effect=responses) as process:
+            tasks.run_worker(worker_id='test', once=True)
+            self.assertEqual(process.call_count, 3)
+        self.assertGreaterEqual(time.monotonic() - started, 0.02)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+
+    @override_settings(LLM_RETRY_BASE_DELAY=0.01, LLM_RETRY_MAX_DELAY=0.01, LLM_MAX_RETRIES=2)
+    def test_retries_are_bounded(self):
+        """Test that a document fails once its retries are used up"""
+        job = self.make_job()
+        result = {'success': False, 'error': 'quota', 'retryable': True}
+        with mock.patch.object(tasks, 'process_pdf_with_gemini', return_value=result) as process:
+            tasks.run_worker(worker_id='test', once=True)
+            self.assertEqual(process.call_count, 3)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+
+    def test_repeat_upload_is_served_from_cache(self):
+        """Test that the same PDF and prompt only reach Gemini once"""
+        first = self.make_job('same')
+        second = self.make_job('same')
+        result = {'success': True, 'parsed_json': PARSED, 'raw_text': '{}'}
+        with mock.patch.object(tasks, 'process_pdf_with_gemini', return_value=result) as process:
+            tasks.run_worker(worker_id='test', once=True)
+            self.assertEqual(process.call_count, 1)
+
+        for job in (first, second):
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'completed')
+        self.assertEqual(ProcessingResult.objects.get(document__job=second).result_data, PARSED)
+        self.assertEqual(cache_service.cache_stats()['stored_hits'], 1)
+
+        # Counted in the database, so the web process reports the worker's lookups
+        stats = self.client.get(reverse('core:cache_stats')).json()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_rate']), (1, 1, 0.5))
+        body = self.client.get(reverse('core:metrics')).content.decode()
+        self.assertIn('pdf_processor_cache_lookups_recorded_total{result="hit"} 1', body)
+
+    def test_cache_key_covers_extraction_options(self):
+        """Test that changing the case series turns or the text extraction mode changes the cache key"""
+        def key():
+            return cache_service.cache_key('sha', 'prompt', 'model', {}, extraction_options())
+
+        defaults = {'CASE_SERIES_CASES_PER_TURN': 2, 'PDF_TEXT_EXTRACTION_ENABLED': True}
+        with self.settings(**defaults):
+            base = key()
+            self.assertEqual(key(), base)
+        for changed in ({'CASE_SERIES_CASES_PER_TURN': 0}, {'CASE_SERIES_MAX_TURNS': 3},
+                        {'PDF_TEXT_EXTRACTION_ENABLED': False}, {'PDF_TEXT_MIN_CONFIDENCE': 0.5}):
+            with self.settings(**{**defaults, **changed}):
+                self.assertNotEqual(key(), base, changed)
+
+    def test_cache_eviction(self):
+        """Test that the cache keeps only the most recently used entries"""
+        result = {'success': True, 'parsed_json': PARSED, 'raw_text': ''}
+        for i in range(3):
+            cache_service.store_result(f'key{i}', f'sha{i}', 'model', result)
+        cache_service.get_cached_result('key0')
+
+        self.assertEqual(cache_service.evict(max_age=0, max_entries=2), 1)
+        self.assertIsNotNone(cache_service.get_cached_result('key0'))
+        self.assertIsNone(cache_service.get_cached_result('key1'))
+
+    @override_settings(LLM_BACKEND='stub', LLM_STUB_LATENCY=0, LLM_REQUESTS_PER_MINUTE=0, LLM_TOKENS_PER_MINUTE=0)
+    def test_end_to_end_with_stub_backend(self):
+        """Test the full worker pipeline offline against the stub backend"""
+        llm_service.reset_llm_client()
+        self.addCleanup(llm_service.reset_llm_client)
+        job = self.make_job(documents=2)
+        tasks.run_worker(worker_id='test', once=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        for result in ProcessingResult.objects.filter(document__job=job):
+            self.assertTrue(result.result_data['case_results'])
+            self.assertEqual(len(result.result_data['case_results'][0]), 16)
+
+    def test_partial_case_series_is_checkpointed_and_resumed(self):
+        """Test that turns finished before a failure are saved and replayed on the next run"""
+        job = self.make_job()
+        case = PARSED['case_results'][0]
+
+        def interrupted(pdf_doc, prompt=None, on_turn=None, resume_turns=None, pages=None):
+            on_turn(['turn 1'], [case])
+            return {'success': False, 'error': 'worker crashed', 'turns': ['turn 1']}
+
+        with mock.patch.object(tasks, 'process_pdf_with_gemini', side_effect=interrupted):
+            tasks.run_worker(worker_id='test', once=True)
+
+        partial = ProcessingResult.objects.get(document__job=job)
+        self.assertFalse(partial.complete)
+        self.assertEqual(partial.turns, ['turn 1'])
+        self.assertEqual(partial.result_data, {'case_results': [case]})
+
+        tasks.enqueue_job(job)
+        result = {'success': True, 'parsed_json': PARSED, 'raw_text': '', 'turns': ['turn 1', 'turn 2']}
+        with mock.patch.object(tasks, 'process_pdf_with_gemini', return_value=result) as process:
+            tasks.run_worker(worker_id='test', once=True)
+            self.assertEqual(process.call_args.kwargs['resume_turns'], ['turn 1'])
+
+        partial.refresh_from_db()
+        self.assertTrue(partial.complete)
+        self.assertEqual(partial.turns, ['turn 1', 'turn 2'])
+
+    def test_streamed_rows_are_saved_before_the_result(self):
+        """Test that rows posted mid-reply are checkpointed, coalesced, and then replaced by the result"""
+        job = self.make_job()
+        case = PARSED['case_results'][0]
+        written = []
+
+        def streamed(pdf_doc, prompt=None, on_turn=None, resume_turns=None, pages=None):
+            for rows in range(1, 4):
+                on_turn([], [case] * rows)
+            return {'success': True, 'parsed_json': {'case_results': [case] * 3}, 'raw_text': '', 'turns': ['t']}
+
+        with mock.patch.object(tasks, 'process_pdf_with_gemini', side_effect=streamed), \
+                mock.patch.object(tasks, 'save_partial_result', side_effect=lambda d, t, c: written.append(len(c))):
+            tasks.run_worker(worker_id='test', once=True)
+
+        self.assertTrue(written)
+        self.assertEqual(written[-1], 3)
+        result = ProcessingResult.objects.get(document__job=job)
+        self.assertTrue(result.complete)
+        self.assertEqual(len(result.result_data['case_results']), 3)
+
+        doc = job.documents.get()
+        items = [(doc, 'k', {'partial': True, 'case_results': [case] * rows}) for rows in (1, 2)]
+        items.append((doc, 'k', {'success': True}))
+        self.assertEqual(tasks.latest_checkpoints(items), items[-1:])
+        self.assertEqual(tasks.latest_checkpoints(items[:2]), items[1:2])
+
+    def test_requeue_stale_jobs(self):
+        """Test that jobs abandoned by a dead worker go back to pending"""
+        job = self.make_job()
+        tasks.claim_next_job('dead-worker')
+        self.assertEqual(tasks.requeue_stale_jobs(timeout=-1), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'pending')
+
+    def test_upload_enqueues_without_processing(self):
+        """Test that the upload view returns immediately with the job id"""
+        uploads = [ContentFile(b'%PDF-1.4', name=f'paper{i}.pdf') for i in range(2)]
+        with mock.patch.object(tasks, 'process_pdf_with_gemini') as process:
+            response = self.client.post(reverse('core:process-pdf'), {'name': 'upload', 'pdf_file': uploads})
+            process.assert_not_called()
+
+        self.assertEqual(response.status_code, 202)
+        job = ProcessingJob.objects.get(pk=response.json()['job_id'])
+        self.assertEqual(job.status, 'pending')
+        self.assertEqual(job.documents.count(), 2)
+
+        status = self.client.get(reverse('core:job_status', args=[job.id])).json()
+        self.assertEqual(status['status'], 'pending')
+        self.assertEqual(status['total'], 2)
@@ -7,5 +7,18 @@ app_name = 'core'
 urlpatterns = [
     path('', views.ProcessorView.as_view(), name='home'),
     path('process-pdf/', views.ProcessorView.as_view(), name='process-pdf'),
+    path('jobs/', views.submit_job, name='submit_job'),
+    path('jobs/<int:job_id>/status/', views.job_status, name='job_status'),
+    path('jobs/<int:job_id>/events/', views.job_events, name='job_events'),
+    path('jobs/<int:job_id>/results/', views.job_results, name='job_results'),
+    path('jobs/<int:job_id>/search/', views.search_evidence, name='search_job'),
+    path('documents/<int:document_id>/cases/<int:case_index>/reextract/', views.reextract_case_fields,
+         name='reextract_case_fields'),
+    path('documents/<int:document_id>/revisions/', views.result_revisions, name='result_revisions'),
+    path('documents/<int:document_id>/cases/<int:case_index>/evidence/', views.case_evidence, name='case_evidence'),
+    path('documents/<int:document_id>/search/', views.search_evidence, name='search_document'),
+    path('export/<str:export_format>/', views.export_results, name='export_results'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('cache/stats/', views.cache_stats, name='cache_stats'),
     path('test-api/', views.test_gemini, name='test_api'),
 ]
\ No newline at end of file
@@ -0,0 +1,180 @@
+# core/utils.py
+import json
+import logging
+
+from .services.json_repair import JSONRepairParser, parse_json, repair_json
+from .services.metrics import STRUCTURED_REPLIES, timed
+from .services.prompt_registry import DEFAULT_TEMPLATE, get_template
+
+logger = logging.getLogger(__name__)
+
+MEDICAL_REVIEW_PROMPT = get_template(DEFAULT_TEMPLATE).prompt
+
+FIELD_REEXTRACTION_PROMPT = """You previously extracted case {case_number} of this article. Re-check only the fields listed below and provide a confidence rating (1-5, with 5 being most confident) for each. If information is not available, return an empty string for that item and a confidence rating of 1.
+
+Case {case_number} as extracted so far:
+{known}
+
+Fields to extract:
+{fields}
+
+Return only these fields in JSON format:
+{{
+  "{example}": {{"value": "", "confidence": 1}},
+  ...
+}}"""
+
+
+def field_reextraction_prompt(template, case, case_index, field_keys):
+    """Reduced prompt asking for ``field_keys`` of one already extracted case."""
+    labels = template.labels
+    known = []
+    for key, entry in case.items():
+        value = entry.get('value') if isinstance(entry, dict) else entry
+        if key not in field_keys and value not in (None, ''):
+            known.append(f"{key}. {labels.get(key, key)}: {value}")
+    return FIELD_REEXTRACTION_PROMPT.format(
+        case_number=case_index + 1,
+        known='\n'.join(known) or '(nothing yet)',
+        fields='\n'.join(f"{key}. {labels.get(key, key)}" for key in field_keys),
+        example=field_keys[0],
+    )
+
+
+def extract_json_from_text(text):
+    """Return the first JSON value in a model reply as a strict JSON string."""
+    return json.dumps(repair_json(text))
+
+
+NEXT_CASES_INSTRUCTION = 'Request the next cases'
+
+CASE_SERIES_PROMPT = """
+
+If more than {per_turn} cases are identified, extract data for only the first {per_turn} cases and then add the following instruction within the JSON output: "instruction": {{"value": "Request the next cases", "confidence": 5}}. You will then be asked for the remaining cases."""
+
+NEXT_CASES_PROMPT = """Request the next cases. Continue from case {next_case} using the same JSON format, and add the "instruction" entry again if further cases remain."""
+
+
+def pop_next_cases_instruction(data):
+    """Remove any "instruction" entries and report whether more cases were requested.
+
+    The instruction may sit at the top level, inside a case, or be a case of
+    its own; instruction-only cases are dropped.
+    """
+    found = []
+    if isinstance(data, dict):
+        if 'instruction' in data:
+            found.append(data.pop('instruction'))
+        cases = data.get('case_results', [])
+        for case in cases:
+            if isinstance(case, dict) and 'instruction' in case:
+                found.append(case.pop('instruction'))
+        if isinstance(cases, list):
+            data['case_results'] = [case for case in cases if case]
+
+    for instruction in found:
+        value = instruction.get('value', '') if isinstance(instruction, dict) else instruction
+        if NEXT_CASES_INSTRUCTION.lower() in str(value).lower():
+            return True
+    return False
+
+
+def normalize_case_results(data, template=None):
+    return (template or get_template()).normalizer(data)
+
+
+def validate_and_normalize_json(json_str, template=None):
+    return normalize_case_results(repair_json(json_str), template)
+
+
+def parse_extraction(text, missing=None, template=None, structured=False):
+    """Parse one model reply into ``(data, more_cases_requested)``.
+
+    A reply cut off mid-case keeps only the cases that were closed and asks
+    for the rest, instead of throwing away the turn. Required keys of
+    ``template`` (the default template if not given) the model left out are
+    added to the ``missing`` set, if given, before the cases are padded.
+    ``structured`` replies were constrained to the template's schema; they
+    are loaded strictly and only go through the tolerant parser if they do
+    not validate.
+    """
+    template = template or get_template()
+    with timed('parse'):
+        data = _parse_structured(text, template) if structured else None
+        if data is not None:
+            more = pop_next_cases_instruction(data)
+        else:
+            data, more = _parse_reply(text)
+    if not data:
+        return {'case_results': []}, more
+    if missing is not None:
+        missing.update(template.missing_fields(data))
+    with timed('normalize'):
+        return template.normalizer(data), more
+
+
+class CaseStream:
+    """Incremental reader of a streamed reply that hands out cases as they close.
+
+    Text goes to ``feed`` chunk by chunk; ``on_case(case)`` receives each
+    case normalised by ``template`` as soon as its closing brace arrives,
+    long before the reply is complete. These rows are provisional: the
+    full reply is still parsed with ``parse_extraction`` once it ends.
+    """
+
+    def __init__(self, template, on_case):
+        self.template = template
+        self.on_case = on_case
+        self.parser = JSONRepairParser(on_complete=self._closed)
+
+    def feed(self, text):
+        self.parser.feed(text)
+
+    def _closed(self, path, value):
+        # Cases sit at case_results[i], or at [i] when the reply is a bare list
+        if not isinstance(value, dict) or not path or not isinstance(path[-1], int):
+            return
+        if path[:-1] != (() if isinstance(self.parser.value, list) else ('case_results',)):
+            return
+        case = {key: entry for key, entry in value.items() if key != 'instruction'}
+        if case:
+            self.on_case(self.template.normalizer({'case_results': [case]})['case_results'][0])
+
+
+def _parse_structured(text, template):
+    try:
+        data = json.loads(text)
+    except ValueError:
+        problem = 'not strict JSON'
+    else:
+        problem = next(template.schema_validator(data), None)
+    if problem:
+        STRUCTURED_REPLIES.inc(result='fallback')
+        logger.warning(f"Structured reply does not match the {template.label} schema ({problem}), repairing it")
+        return None
+    STRUCTURED_REPLIES.inc(result='valid')
+    return data
+
+
+def _parse_reply(text):
+    data, complete = parse_json(text)
+    if not complete:
+        parser = JSONRepairParser().feed(text)
+        parser.finish()
+        open_cases = {path[-1] for path in parser.open_paths if len(path) == (1 if isinstance(data, list) else 2)}
+    if isinstance(data, list):
+        data = {'case_results': data}
+    if not isinstance(data, dict):
+        raise ValueError("Invalid JSON structure: root must be an object")
+
+    if not complete:
+        cases = data.get('case_results')
+        if isinstance(cases, list):
+            data['case_results'] = [case for i, case in enumerate(cases) if i not in open_cases]
+        pop_next_cases_instruction(data)
+        if not data.get('case_results'):
+            raise ValueError("Response was cut off before any complete case")
+        return data, True
+
+    more = pop_next_cases_instruction(data)
+    return data, more
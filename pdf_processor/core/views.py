@@ -1,48 +1,27 @@
 from django.views.generic import FormView
-from django.http import JsonResponse
-from django.conf import settings
-import google.generativeai as genai
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db import transaction
+from django.db.models import Count
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.views.decorators.http import require_POST
+from django.urls import reverse
 import logging
-import json
-import pandas as pd
-from django.core.paginator import Paginator
+from asgiref.sync import sync_to_async
 from .forms import ProcessingForm
-from .models import PDFDocument, ProcessingJob, ProcessingResult
-import base64
+from .models import DocumentPage, ExtractedCase, PDFDocument, ProcessingJob, ProcessingResult
+from .services import cache_service
+from .services.evidence_service import has_page_index, search_pages, snippet
+from .services.export_service import export_cases
+from .services.llm_service import LLMError, get_llm_client
+from .services.metrics import CONTENT_TYPE, Counter, Gauge, render_metrics, timed
+from .services.progress_service import job_summary, stream_job_events
+from .services.prompt_registry import job_template
+from .services.reextraction_service import areextract_fields
+from .services.results_service import case_rows, column_sort_key, job_columns, page_cases
+from .tasks import enqueue_job
 
 logger = logging.getLogger(__name__)
 
-MEDICAL_REVIEW_PROMPT = """You are a medical reviewer tasked with extracting specific information from case studies or case series related to meningioma patients. Your goal is to extract the following information and provide a confidence rating (1-5, with 5 being most confident) for each item. If information is not available, return an empty string for that item and a confidence rating of 1.
-
-For each case, extract:
-0. Article Name
-1. Document Object Identifier (DOI)
-2. Study author (last name of first author)
-3. Year of publication
-4. Patient age
-5. Patient gender (M/F)
-6. Duration of symptoms (in months)
-7. Tumor location (Cranial or Spinal)
-8. Extent of resection (total or subtotal)
-9. WHO Grade
-10. Meningioma subtype
-11. Adjuvant therapy (y/n)
-12. Symptom assessment
-13. Recurrence (y/n)
-14. Patient status (A/D)
-15. Tumor invasion (y/n)
-
-Return the data in JSON format:
-{
-  "case_results": [
-    {
-      "0": {"value": "", "confidence": 1},
-      "1": {"value": "", "confidence": 1},
-      ...
-    }
-  ]
-}"""
-
 class ProcessorView(FormView):
     template_name = 'processor.html'
     form_class = ProcessingForm
@@ -51,147 +30,337 @@ class ProcessorView(FormView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         try:
-            latest_job = ProcessingJob.objects.latest('created_at')
-            latest_result = ProcessingResult.objects.get(document__job=latest_job)
-            
-            if latest_result.result_data and isinstance(latest_result.result_data, dict):
-                df = pd.DataFrame(latest_result.result_data.get('case_results', []))
-                paginator = Paginator(df.to_dict('records'), 10)
-                page = self.request.GET.get('page', 1)
-                table_data = paginator.get_page(page)
-                
+            latest_job = ProcessingJob.objects.filter(status='completed').latest('created_at')
+            total = ExtractedCase.objects.filter(job=latest_job).count()
+
+            if total:
+                # Keyset pagination: only the requested page of cases and their fields are loaded
+                try:
+                    page = page_cases(
+                        [latest_job], limit=10,
+                        after=self.request.GET.get('after'),
+                        before=self.request.GET.get('before'),
+                        last='last' in self.request.GET,
+                    )
+                except ValueError:
+                    page = page_cases([latest_job], limit=10)
+
                 context.update({
                     'latest_job': latest_job,
-                    'table_data': table_data,
-                    'columns': df.columns.tolist() if not df.empty else [],
+                    'table_data': case_rows(page['cases']),
+                    'next_cursor': page['next'],
+                    'previous_cursor': page['previous'],
+                    'total_cases': total,
+                    'columns': job_columns([latest_job]),
+                    'column_labels': job_template(latest_job).labels,
                     'show_results': True
                 })
-        except (ProcessingJob.DoesNotExist, ProcessingResult.DoesNotExist):
+        except ProcessingJob.DoesNotExist:
             context['show_results'] = False
         return context
 
-    def extract_json_from_text(self, text):
-        text = text.replace('```json\n', '').replace('\n```', '')
-        start_idx = text.find('{')
-        end_idx = text.rfind('}') + 1
-        
-        if start_idx >= 0 and end_idx > start_idx:
-            return text[start_idx:end_idx]
-        raise ValueError("No valid JSON found in response")
-
-    def validate_and_normalize_json(self, json_str):
-        try:
-            data = json.loads(json_str)
-            if 'case_results' not in data:
-                data = {'case_results': [data]}
-                
-            for case in data['case_results']:
-                for i in range(16):
-                    key = str(i)
-                    if key not in case:
-                        case[key] = {"value": "", "confidence": 1}
-                    elif isinstance(case[key], (str, int, float)):
-                        case[key] = {"value": str(case[key]), "confidence": 1}
-            return data
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Invalid JSON format: {str(e)}")
-
-    def process_pdf_with_gemini(self, pdf_doc):
-        try:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            model = genai.GenerativeModel('gemini-1.5-pro')
-            
-            with pdf_doc.file.open('rb') as file:
-                pdf_content = file.read()
-                pdf_base64 = base64.b64encode(pdf_content).decode('utf-8')
-            
-            response = model.generate_content(
-                [{"mime_type": "application/pdf", "data": pdf_base64}, MEDICAL_REVIEW_PROMPT],
-                generation_config={"temperature": 0.1, "top_p": 0.8, "top_k": 40}
-            )
-            
-            try:
-                json_str = self.extract_json_from_text(response.text)
-                parsed_json = self.validate_and_normalize_json(json_str)
-                return {
-                    'success': True,
-                    'parsed_json': parsed_json,
-                    'raw_text': response.text
-                }
-            except (json.JSONDecodeError, ValueError) as e:
-                logger.error(f"JSON parsing error: {e}")
-                return {
-                    'success': False,
-                    'error': f"Failed to parse response as JSON: {str(e)}",
-                    'raw_text': response.text
-                }
-        except Exception as e:
-            logger.error(f"Error in process_pdf_with_gemini: {str(e)}")
-            return {
-                'success': False,
-                'error': str(e),
-                'raw_text': getattr(response, 'text', 'No response text available')
-            }
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        with timed('render'):
+            return response.render()
 
     def form_valid(self, form):
         try:
-            job = form.save()
-            pdf_doc = PDFDocument.objects.create(
-                job=job,
-                file=self.request.FILES['pdf_file']
-            )
-
-            result = self.process_pdf_with_gemini(pdf_doc)
-            print(result)
-            if not result.get('success'):
-                raise ValueError(result.get('error', 'Unknown processing error'))
-
-            parsed_data = result['parsed_json']
-            
-            try:
-                df = pd.json_normalize(parsed_data['case_results'])
-                for col in [str(i) for i in range(16)]:
-                    if col not in df.columns:
-                        df[col] = pd.NA
-
-                ProcessingResult.objects.create(
-                    document=pdf_doc,
-                    result_data=parsed_data
-                )
-
-                job.status = 'completed'
-                job.save()
-
-                return JsonResponse({
-                    'success': True,
-                    'table_html': df.to_html(classes='table table-striped', index=False),
-                    'raw_text': result['raw_text'],
-                    'job_id': job.id
-                })
-
-            except Exception as e:
-                logger.error(f"DataFrame creation error: {str(e)}")
-                return JsonResponse({
-                    'success': False,
-                    'error': f"Error processing results: {str(e)}",
-                    'raw_text': result.get('raw_text', '')
-                })
-
+            return job_created(create_job(form))
         except Exception as e:
             logger.error(f"Error in form_valid: {str(e)}", exc_info=True)
-            if 'job' in locals():
-                job.status = 'failed'
-                job.save()
             return JsonResponse({
                 'success': False,
                 'error': str(e)
             }, status=500)
 
-def test_gemini(request):
+
+def create_job(form):
+    """Save a valid upload form's job and documents and queue it. Returns the job id."""
+    with timed('upload_save'), transaction.atomic():
+        job = form.save()
+        for pdf_file in form.cleaned_data['pdf_file']:
+            PDFDocument.objects.create(job=job, file=pdf_file)
+        return enqueue_job(job)
+
+
+def job_created(job_id):
+    return JsonResponse({
+        'success': True,
+        'job_id': job_id,
+        'status': 'pending',
+        'status_url': reverse('core:job_status', args=[job_id]),
+        'events_url': reverse('core:job_events', args=[job_id])
+    }, status=202)
+
+
+def _submit(request):
+    form = ProcessingForm(request.POST, request.FILES)
+    if not form.is_valid():
+        return None, form.errors.get_json_data()
+    return create_job(form), None
+
+
+@require_POST
+async def submit_job(request):
+    """Async counterpart of the upload form's POST.
+
+    Parsing the multipart body and writing the files are blocking, so they
+    run in a thread; the event loop stays free for other requests.
+    """
+    try:
+        job_id, errors = await sync_to_async(_submit)(request)
+    except Exception as e:
+        logger.error(f"Error in submit_job: {str(e)}", exc_info=True)
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+    if errors:
+        return JsonResponse({'success': False, 'errors': errors}, status=400)
+    return job_created(job_id)
+
+
+def job_status(request, job_id):
+    job = get_object_or_404(ProcessingJob, pk=job_id)
+    data = job_summary(job)
+
+    if job.status == 'completed':
+        # Only the first page of cases; job_results serves the rest from the 'next' cursor
+        page = page_cases([job])
+        rows = case_rows(page['cases'])
+        results = ProcessingResult.objects.filter(
+            document_id__in={case.document_id for case in page['cases']}
+        ).order_by('document_id')
+        data.update({
+            'columns': sorted({key for row in rows for key in row}, key=column_sort_key),
+            'rows': rows,
+            'next': page['next'],
+            'results_url': reverse('core:job_results', args=[job.id]),
+            'raw_text': '\n\n'.join(results.values_list('raw_text', flat=True)),
+        })
+
+    return JsonResponse(data)
+
+
+def job_results(request, job_id):
+    """One page of a job's cases as JSON.
+
+    Query parameters: ``limit``; ``after``/``before`` cursors from the
+    previous response; ``sort`` (a field key, ``<key>.confidence``, or
+    ``-`` prefixed for descending); ``columns`` (comma-separated field keys).
+    Each field carries its value, confidence, the model that produced it
+    and its ``evidence``, the page and span it was found at.
+    """
+    job = get_object_or_404(ProcessingJob, pk=job_id)
+    sort = request.GET.get('sort') or None
+    descending = bool(sort) and sort.startswith('-')
+    columns = [c for c in request.GET.get('columns', '').split(',') if c] or None
+
+    try:
+        page = page_cases(
+            [job],
+            sort=sort.lstrip('-') if sort else None,
+            descending=descending,
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+            limit=request.GET.get('limit', 50),
+        )
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    rows = case_rows(page['cases'], columns=columns, with_model=True, with_evidence=True)
+    template = job_template(job)
+    return JsonResponse({
+        'success': True,
+        'job_id': job.id,
+        'columns': columns or job_columns([job]),
+        'labels': template.labels,
+        'template': template.label,
+        'rows': [
+            {'case_id': case.id, 'document_id': case.document_id, 'case_index': case.case_index, 'fields': fields}
+            for case, fields in zip(page['cases'], rows)
+        ],
+        'next': page['next'],
+        'previous': page['previous'],
+    })
+
+
+def export_results(request, export_format):
+    """Stream the cases of one or more jobs (``?job=1&job=2``) as CSV, XLSX or Parquet.
+
+    ``?normalized=1`` adds the parsed ages, durations, grades and flags.
+    """
+    try:
+        job_ids = [int(job_id) for job_id in request.GET.getlist('job')]
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid job id'}, status=400)
+    jobs = list(ProcessingJob.objects.filter(pk__in=job_ids).order_by('id'))
+    if not jobs or len(jobs) != len(set(job_ids)):
+        raise Http404('No ProcessingJob matches the given query.')
+
+    columns = [c for c in request.GET.get('columns', '').split(',') if c] or None
+    try:
+        chunks, content_type, extension = export_cases(
+            jobs, export_format, columns=columns, normalized=request.GET.get('normalized') in ('1', 'true')
+        )
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    name = f"job_{jobs[0].id}" if len(jobs) == 1 else f"jobs_{jobs[0].id}-{jobs[-1].id}"
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{name}_results.{extension}"'
+    return response
+
+
+def revision_data(revision):
+    return {
+        'version': revision.version,
+        'case_index': revision.case_index,
+        'model': revision.model_name,
+        'changes': revision.changes,
+        'created_at': revision.created_at.isoformat(),
+    }
+
+
+@require_POST
+async def reextract_case_fields(request, document_id, case_index):
+    """Re-extract some fields (``fields=9,6``) of one case of a document."""
+    pdf_doc = await aget_object_or_404(PDFDocument.objects.select_related('job'), pk=document_id)
+    fields = [key for key in request.POST.get('fields', '').split(',') if key]
+    try:
+        revision = await areextract_fields(pdf_doc, case_index, fields)
+    except ProcessingResult.DoesNotExist:
+        raise Http404('Document has no result yet.')
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except LLMError as e:
+        logger.error(f"Re-extraction failed for document {document_id}: {str(e)}")
+        response = JsonResponse({'success': False, 'error': str(e)}, status=429 if e.status == 429 else 502)
+        if e.retry_after:
+            response['Retry-After'] = str(int(e.retry_after))
+        return response
+
+    return JsonResponse({
+        'success': True,
+        'document_id': pdf_doc.id,
+        'fields': {key: change['after'] for key, change in revision.changes.items()},
+        **revision_data(revision),
+    })
+
+
+def result_revisions(request, document_id):
+    """Version history of a document's result."""
+    result = get_object_or_404(ProcessingResult, document_id=document_id)
+    return JsonResponse({
+        'success': True,
+        'document_id': document_id,
+        'version': result.version,
+        'revisions': [revision_data(revision) for revision in result.revisions.all()],
+    })
+
+
+def case_evidence(request, document_id, case_index):
+    """Where each field of one case was found: page, span and the text around it."""
+    case = get_object_or_404(ExtractedCase.objects.select_related('job'), document_id=document_id, case_index=case_index)
+    fields = sorted(case.fields.all(), key=lambda field: column_sort_key(field.field_key))
+    texts = dict(
+        DocumentPage.objects.filter(document_id=document_id, number__in={field.page for field in fields if field.page})
+        .values_list('number', 'text')
+    )
+    labels = job_template(case.job).labels
+
+    def evidence(field):
+        text = texts.get(field.page)
+        if text is None:
+            return None
+        return {
+            'page': field.page,
+            'start': field.span_start,
+            'end': field.span_end,
+            'snippet': snippet(text, field.span_start, field.span_end),
+        }
+
+    return JsonResponse({
+        'success': True,
+        'document_id': document_id,
+        'case_index': case_index,
+        'fields': {
+            field.field_key: {
+                'label': labels.get(field.field_key, ''), 'value': field.value, 'evidence': evidence(field),
+            }
+            for field in fields
+        },
+    })
+
+
+def search_evidence(request, document_id=None, job_id=None):
+    """Pages of a document, or of every document of a job, containing all words of ``?q=``.
+
+    Each match gives the page, the span of the words and a snippet, best
+    matches first; ``limit`` caps them (default 20, at most 100). Answers
+    501 on databases without a page index.
+    """
+    if not has_page_index():
+        return JsonResponse({
+            'success': False, 'error': 'Evidence search needs SQLite with FTS5 or PostgreSQL',
+        }, status=501)
+    if document_id is not None:
+        documents = PDFDocument.objects.filter(pk=document_id)
+    else:
+        documents = PDFDocument.objects.filter(job_id=job_id)
+    if not documents.exists():
+        raise Http404('No PDFDocument matches the given query.')
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'success': False, 'error': 'Missing search text (q)'}, status=400)
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 20)), 100))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid limit'}, status=400)
+
+    return JsonResponse({'success': True, 'query': query, 'matches': search_pages(documents, query, limit)})
+
+
+async def job_events(request, job_id):
+    """Stream a job's progress as server-sent events.
+
+    Needs an ASGI server (``uvicorn pdf_processor.asgi:application``) to
+    stream; under WSGI the events arrive in one response once the job ends.
+    """
+    if not await ProcessingJob.objects.filter(pk=job_id).aexists():
+        raise Http404('No ProcessingJob matches the given query.')
+
+    response = StreamingHttpResponse(stream_job_events(job_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def cache_stats(request):
+    return JsonResponse(cache_service.cache_stats())
+
+
+def metrics(request):
+    """Prometheus scrape endpoint for this process."""
+    jobs = Gauge('pdf_processor_jobs', 'Processing jobs by status.', labels=('status',))
+    for row in ProcessingJob.objects.values('status').annotate(count=Count('id')):
+        jobs.set(row['count'], status=row['status'])
+
+    stats = cache_service.cache_stats()
+    # Workers count lookups into the database; their own process metric is
+    # pdf_processor_cache_lookups, so the totals get a name of their own
+    cache = Counter(
+        'pdf_processor_cache_lookups_recorded', 'Extraction cache lookups of every worker, by result.',
+        labels=('result',)
+    )
+    cache.inc(stats['hits'], result='hit')
+    cache.inc(stats['misses'], result='miss')
+    entries = Gauge('pdf_processor_cache_entries', 'Rows in the extraction cache.')
+    entries.set(stats['entries'])
+    return HttpResponse(render_metrics([jobs, cache, entries]), content_type=CONTENT_TYPE)
+
+
+async def test_gemini(request):
     try:
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        model = genai.GenerativeModel('gemini-1.5-pro')
-        test_response = model.generate_content("Test connection")
+        test_response = await get_llm_client().agenerate("Test connection")
         return JsonResponse({
             'success': True,
             'response': test_response.text
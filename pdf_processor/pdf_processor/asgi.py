@@ -4,4 +4,8 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pdf_processor.settings')
 
-application = get_asgi_application()
\ No newline at end of file
+django_application = get_asgi_application()
+
+from core.asgi import WorkerLifespan  # noqa: E402  (needs the app registry)
+
+application = WorkerLifespan(django_application)
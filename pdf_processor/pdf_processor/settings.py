@@ -29,6 +29,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,6 +81,45 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Gemini API Configuration
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+# LLM backend (core/services/llm_service.py): 'gemini', 'stub' or 'http'
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
+LLM_STUB_LATENCY = float(os.getenv('LLM_STUB_LATENCY', '0'))
+# Spread of the stub's latency as a fraction of it, and share of calls failing with a 503
+LLM_STUB_JITTER = float(os.getenv('LLM_STUB_JITTER', '0'))
+LLM_STUB_ERROR_RATE = float(os.getenv('LLM_STUB_ERROR_RATE', '0'))
+LLM_HTTP_URL = os.getenv('LLM_HTTP_URL', 'http://127.0.0.1:8765')
+LLM_HTTP_TIMEOUT = float(os.getenv('LLM_HTTP_TIMEOUT', '300'))
+# Shared quota for all workers (core/services/rate_limiter.py); 0 disables a bucket
+LLM_REQUESTS_PER_MINUTE = int(os.getenv('LLM_REQUESTS_PER_MINUTE', '60'))
+LLM_TOKENS_PER_MINUTE = int(os.getenv('LLM_TOKENS_PER_MINUTE', '1000000'))
+LLM_PDF_TOKEN_ESTIMATE = int(os.getenv('LLM_PDF_TOKEN_ESTIMATE', '8000'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '5'))
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', '2'))
+LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', '120'))
+# Model routing (core/services/routing_service.py): extract with the fast model
+# and re-extract with the strong one only when fields are missing or below
+# the confidence threshold (1-5)
+MODEL_ROUTING_ENABLED = os.getenv('MODEL_ROUTING_ENABLED', 'true').lower() == 'true'
+LLM_FAST_MODEL = os.getenv('LLM_FAST_MODEL', 'gemini-2.0-flash')
+LLM_STRONG_MODEL = os.getenv('LLM_STRONG_MODEL', 'gemini-1.5-pro')
+MODEL_ROUTING_MIN_CONFIDENCE = int(os.getenv('MODEL_ROUTING_MIN_CONFIDENCE', '3'))
+# Structured output: send the prompt template's JSON schema as the response
+# format and validate replies against it instead of scraping JSON from prose
+LLM_STRUCTURED_OUTPUT = os.getenv('LLM_STRUCTURED_OUTPUT', 'true').lower() == 'true'
+# Streaming: read replies as they are generated and checkpoint each case as
+# soon as it closes, so the first rows show up before the reply is finished
+LLM_STREAMING = os.getenv('LLM_STREAMING', 'false').lower() == 'true'
+# PDFs larger than this go through the Gemini File API instead of inline data
+GEMINI_INLINE_MAX_BYTES = int(os.getenv('GEMINI_INLINE_MAX_BYTES', str(8 * 1024 * 1024)))
+
+# Local text extraction (core/services/pdf_service.py). Only the relevant
+# sections are sent when the text layer scores at least the min confidence.
+PDF_TEXT_EXTRACTION_ENABLED = os.getenv('PDF_TEXT_EXTRACTION_ENABLED', 'true').lower() == 'true'
+PDF_TEXT_MIN_CHARS_PER_PAGE = int(os.getenv('PDF_TEXT_MIN_CHARS_PER_PAGE', '200'))
+PDF_TEXT_MIN_CONFIDENCE = float(os.getenv('PDF_TEXT_MIN_CONFIDENCE', '0.8'))
+
+# Stream every upload to a temporary file rather than buffering it in memory
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
 
 # Add this to your existing settings
 DEFAULT_PROMPT = """You are a medical reviewer tasked with extracting specific information..."""
@@ -113,4 +153,34 @@ LOGGING = {
             'propagate': True,
         },
     },
-}
\ No newline at end of file
+}
+
+# Background job queue (core/tasks.py)
+PROCESSING_WORKER_POLL_INTERVAL = float(os.getenv('PROCESSING_WORKER_POLL_INTERVAL', '2'))
+PROCESSING_JOB_TIMEOUT = int(os.getenv('PROCESSING_JOB_TIMEOUT', str(15 * 60)))
+PROCESSING_MAX_CONCURRENCY = int(os.getenv('PROCESSING_MAX_CONCURRENCY', '8'))
+# Asyncio workers (run_worker --async, or inside the ASGI app with
+# PROCESSING_IN_ASGI): extractions in flight per job, and jobs run at once
+PROCESSING_ASYNC_MAX_CONCURRENCY = int(os.getenv('PROCESSING_ASYNC_MAX_CONCURRENCY', '32'))
+PROCESSING_ASYNC_MAX_JOBS = int(os.getenv('PROCESSING_ASYNC_MAX_JOBS', '4'))
+PROCESSING_IN_ASGI = os.getenv('PROCESSING_IN_ASGI', 'false').lower() == 'true'
+
+# Progress streams (core/services/progress_service.py): seconds between change
+# checks shared by all open streams, and between keep-alive comments
+PROGRESS_POLL_INTERVAL = float(os.getenv('PROGRESS_POLL_INTERVAL', '1'))
+PROGRESS_KEEPALIVE = float(os.getenv('PROGRESS_KEEPALIVE', '15'))
+
+# Case series: cases requested per turn (0 asks for all at once) and a cap on follow-up turns
+CASE_SERIES_CASES_PER_TURN = int(os.getenv('CASE_SERIES_CASES_PER_TURN', '2'))
+CASE_SERIES_MAX_TURNS = int(os.getenv('CASE_SERIES_MAX_TURNS', '20'))
+
+# Duplicate detection (core/services/dedupe_service.py): reuse the result of
+# an earlier upload with the same file, DOI, title or near-identical text
+# (estimated share of word shingles in common, 0-1)
+DEDUPE_ENABLED = os.getenv('DEDUPE_ENABLED', 'true').lower() == 'true'
+DEDUPE_TEXT_THRESHOLD = float(os.getenv('DEDUPE_TEXT_THRESHOLD', '0.9'))
+
+# Extraction result cache (core/services/cache_service.py)
+EXTRACTION_CACHE_ENABLED = os.getenv('EXTRACTION_CACHE_ENABLED', 'true').lower() == 'true'
+EXTRACTION_CACHE_MAX_AGE = int(os.getenv('EXTRACTION_CACHE_MAX_AGE', str(30 * 24 * 60 * 60)))
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv('EXTRACTION_CACHE_MAX_ENTRIES', '10000'))